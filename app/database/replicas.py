@@ -0,0 +1,239 @@
+import hashlib
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from http.cookies import SimpleCookie
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+
+from app.database.database import SessionLocal, engine_options
+from app.utils.cache import TTLCache
+from app.utils.metrics import Counter, register
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated replica URLs; reads go to the primary when empty
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+
+# Replicas further behind than this are skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+
+# How often each replica's lag is measured
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+
+# How long a client's reads stay on the primary after it writes (read-your-writes)
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", str(max(REPLICA_MAX_LAG_SECONDS * 2, 10))))
+
+# The client carries the time of its last write in this cookie (browsers) or header (other clients),
+# so any worker or instance can send its next reads to the primary
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "x-last-write"
+
+# Seconds of lag on a PostgreSQL standby; 0 when it has replayed everything it received,
+# or when the server is not a standby at all
+POSTGRES_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+read_sessions = register(Counter(
+    "db_read_sessions_total", "Read-only sessions by where they were routed", ("target", "reason")
+))
+
+def replica_lag(engine):
+    """Seconds the database behind engine lags the primary (raises if it can't be reached)"""
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            return float(connection.execute(text(POSTGRES_LAG_SQL)).scalar())
+        # SQLite copies have no replication to measure; reachable means usable
+        connection.execute(text("SELECT 1"))
+        return 0.0
+
+class Replica:
+    """A read replica with its last measured lag"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        options = engine_options(url)
+        options["pool_pre_ping"] = True
+        if not url.startswith("sqlite"):
+            options["connect_args"] = {"connect_timeout": 2}
+        self.engine = create_engine(url, **options)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.lag = None
+        self.error = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Measure lag now"""
+        try:
+            self.lag = replica_lag(self.engine)
+            self.error = None
+        except Exception as e:
+            if self.error is None:
+                logger.warning("Replica %s unavailable: %s", self.name, e)
+            self.lag = None
+            self.error = str(e)
+        self.checked_at = time.monotonic()
+
+    def mark_down(self, error: str):
+        """Stop routing reads here until the next successful check"""
+        self.lag = None
+        self.error = error
+        self.checked_at = time.monotonic()
+
+    def usable(self):
+        """Whether the replica is reachable and within REPLICA_MAX_LAG_SECONDS"""
+        # One request re-measures a stale replica; the rest use the last result meanwhile
+        if time.monotonic() - self.checked_at >= REPLICA_LAG_CHECK_SECONDS and self._lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._lock.release()
+        return self.lag is not None and self.lag <= REPLICA_MAX_LAG_SECONDS
+
+    def status(self):
+        return {"name": self.name, "lag_seconds": self.lag, "usable": self.usable(), "error": self.error}
+
+replicas = [Replica(f"replica{index}", url) for index, url in enumerate(REPLICA_DATABASE_URLS, start=1)]
+_next_replica = itertools.count()
+
+# Clients that wrote recently through this worker, keyed by a hash of their Authorization header;
+# covers clients that send back neither the cookie nor the header
+_recent_writers = TTLCache(ttl=REPLICA_STICKY_SECONDS, max_size=100000)
+
+def client_key(authorization):
+    """Stable key for a client's credentials, without keeping the token itself"""
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+def mark_recent_write(key):
+    """Send this client's reads to the primary for REPLICA_STICKY_SECONDS"""
+    if key:
+        _recent_writers.set(key, True)
+
+def wrote_recently(request: Request):
+    """Whether the client committed a write within REPLICA_STICKY_SECONDS"""
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        wrote_at = float(value) if value else None
+    except ValueError:
+        wrote_at = None
+    # Either way round, so a little clock skew between instances doesn't matter; a forged
+    # value can at most send the client's own reads to the primary for the sticky window
+    if wrote_at is not None and abs(time.time() - wrote_at) < REPLICA_STICKY_SECONDS:
+        return True
+    return bool(_recent_writers.get(client_key(request.headers.get("authorization"))))
+
+def choose_replica():
+    """A usable replica, round robin; None when all are down or lagging"""
+    if not replicas:
+        return None
+    start = next(_next_replica)
+    for offset in range(len(replicas)):
+        replica = replicas[(start + offset) % len(replicas)]
+        if replica.usable():
+            return replica
+    return None
+
+def replica_status():
+    """Lag and availability of every replica"""
+    return [replica.status() for replica in replicas]
+
+# Primary sessions note whether they wrote, and mark the client sticky when that commits
+@event.listens_for(SessionLocal, "after_flush")
+def note_flush(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def note_write_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def mark_writer_sticky(session):
+    if session.info.pop("wrote", False):
+        request = session.info.get("request")
+        if request is not None:
+            # Returned to the client by LastWriteMiddleware
+            request.state.wrote_at = time.time()
+            mark_recent_write(client_key(request.headers.get("authorization")))
+
+@event.listens_for(SessionLocal, "after_rollback")
+def forget_rolled_back_writes(session):
+    session.info.pop("wrote", None)
+
+def get_read_db(request: Request):
+    """Session for read-only handlers: a caught-up replica, or the primary
+
+    Clients that wrote within REPLICA_STICKY_SECONDS read from the primary so
+    they see their own changes.
+    """
+    replica = None
+    if not replicas:
+        reason = "no_replicas"
+    elif wrote_recently(request):
+        reason = "recent_write"
+    else:
+        replica = choose_replica()
+        reason = "ok" if replica else "replicas_unavailable"
+
+    read_sessions.inc(target=replica.name if replica else "primary", reason=reason)
+    db = replica.SessionLocal() if replica else SessionLocal()
+    try:
+        yield db
+    except DBAPIError as e:
+        # A replica failing mid-request is skipped until it checks out again
+        if replica and e.connection_invalidated:
+            replica.mark_down(str(e))
+        raise
+    finally:
+        db.close()
+
+def last_write_headers(wrote_at: float):
+    """Response headers handing the client its last write time"""
+    value = f"{wrote_at:.3f}"
+    cookie = SimpleCookie()
+    cookie[LAST_WRITE_COOKIE] = value
+    cookie[LAST_WRITE_COOKIE]["max-age"] = math.ceil(REPLICA_STICKY_SECONDS)
+    cookie[LAST_WRITE_COOKIE]["path"] = "/"
+    cookie[LAST_WRITE_COOKIE]["httponly"] = True
+    # The frontend is served from another site; browsers accept Secure cookies from http://localhost too
+    cookie[LAST_WRITE_COOKIE]["secure"] = True
+    cookie[LAST_WRITE_COOKIE]["samesite"] = "None"
+    return [
+        (b"set-cookie", cookie.output(header="").strip().encode("latin-1")),
+        (LAST_WRITE_HEADER.encode("latin-1"), value.encode("latin-1"))
+    ]
+
+class LastWriteMiddleware:
+    """ASGI middleware returning the commit time of a request that wrote, for get_read_db to honour"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_last_write(message):
+            if message["type"] == "http.response.start":
+                # Written by mark_writer_sticky through request.state
+                wrote_at = scope.get("state", {}).get("wrote_at")
+                if wrote_at:
+                    message = {**message, "headers": list(message.get("headers", [])) + last_write_headers(wrote_at)}
+            await send(message)
+
+        await self.app(scope, receive, send_with_last_write)
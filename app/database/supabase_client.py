@@ -1,6 +1,9 @@
-from supabase import create_client, Client
 from dotenv import load_dotenv
+import asyncio
 import os
+import threading
+
+from app.utils.metrics import instrument_service
 
 # Load environment variables
 load_dotenv()
@@ -9,163 +12,346 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 
-# Create Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+# Async client: connections kept open per worker, seconds to wait on Supabase, and retries
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50"))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+SUPABASE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_CONNECT_TIMEOUT_SECONDS", "3"))
+SUPABASE_RETRIES = int(os.getenv("SUPABASE_RETRIES", "2"))
+
+# Supabase client, created on first use (or replaced, e.g. by benchmarks.local_supabase)
+supabase = None
+_client_lock = threading.Lock()
+
+def get_supabase():
+    """The Supabase client, creating it on first use"""
+    global supabase
+    if supabase is None:
+        with _client_lock:
+            if supabase is None:
+                if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+                    raise RuntimeError("SUPABASE_URL and SUPABASE_ANON_KEY must be set to use Supabase")
+                # Imported here: the supabase package is slow to import and not needed until the first call
+                from supabase import create_client
+                supabase = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    return supabase
+
+def close_supabase():
+    """Release the client's HTTP connections; the next call opens new ones"""
+    global supabase
+    # Only a client that has made requests has connections (the postgrest property would create them)
+    postgrest = getattr(supabase, "_postgrest", None)
+    if postgrest is not None:
+        postgrest.session.close()
+        supabase = None
+
+# Async PostgREST client and the event loop its connections belong to (None for a stand-in)
+async_supabase = None
+_async_loop = None
+
+def get_async_supabase():
+    """The async PostgREST client for the running event loop, creating it on first use
+
+    All requests share one keep-alive connection pool, with timeouts and
+    retried connection attempts; see run() for retrying lost responses.
+    """
+    global async_supabase, _async_loop
+    loop = asyncio.get_running_loop()
+    # A client from another loop (e.g. a previous test client) can't be used or closed from this one
+    if async_supabase is None or (_async_loop is not None and _async_loop is not loop):
+        if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+            raise RuntimeError("SUPABASE_URL and SUPABASE_ANON_KEY must be set to use Supabase")
+        import httpx
+        from postgrest import AsyncPostgrestClient
+
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(SUPABASE_TIMEOUT_SECONDS, connect=SUPABASE_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS, max_keepalive_connections=SUPABASE_MAX_KEEPALIVE
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=SUPABASE_RETRIES)
+        )
+        async_supabase = AsyncPostgrestClient(
+            f"{SUPABASE_URL}/rest/v1",
+            headers={
+                "apikey": SUPABASE_ANON_KEY,
+                "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
+                "Accept": "application/json",
+                "Content-Type": "application/json"
+            },
+            http_client=http_client
+        )
+        _async_loop = loop
+    return async_supabase
+
+async def close_async_supabase():
+    """Close the async client's connections (call from the loop that uses it)"""
+    global async_supabase, _async_loop
+    if _async_loop is not None and _async_loop is asyncio.get_running_loop():
+        await async_supabase.aclose()
+        async_supabase = None
+        _async_loop = None
+
+async def run(query, idempotent: bool = True):
+    """Execute a query builder, retrying idempotent ones when the response is lost
+
+    Failed connection attempts are already retried by the transport; this
+    covers read timeouts and keep-alive connections dropped mid-request, where
+    the request may have reached Supabase, so inserts are not retried.
+    """
+    import httpx
+
+    attempts = SUPABASE_RETRIES + 1 if idempotent else 1
+    for attempt in range(attempts):
+        try:
+            return await query.execute()
+        except (httpx.ReadTimeout, httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError):
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(0.05 * 2 ** attempt)
+
+def first(response):
+    return response.data[0] if response.data else None
+
+@instrument_service("supabase")
+class AsyncSupabaseService:
+    """Async Supabase operations used by request handlers"""
+
+    @staticmethod
+    async def ping():
+        """Cheapest round trip to Supabase: one user ID"""
+        await run(get_async_supabase().table("users").select("id").limit(1))
+
+    # User operations
+    @staticmethod
+    async def get_user_by_email(email: str):
+        """Get user by email"""
+        return first(await run(get_async_supabase().table("users").select("*").eq("email", email)))
+
+    @staticmethod
+    async def get_users_by_phone(phone: str):
+        """Users registered with this phone number"""
+        return (await run(get_async_supabase().table("users").select("*").eq("phone", phone))).data
 
+    @staticmethod
+    async def create_user(user_data: dict):
+        """Create a new user"""
+        return first(await run(get_async_supabase().table("users").insert(user_data), idempotent=False))
+
+    @staticmethod
+    async def update_user(user_id: int, user_data: dict):
+        """Update user data"""
+        return first(await run(get_async_supabase().table("users").update(user_data).eq("id", user_id)))
+
+    # Address operations
+    @staticmethod
+    async def get_addresses(user_id: int):
+        """All addresses of a user"""
+        return (await run(get_async_supabase().table("addresses").select("*").eq("user_id", user_id))).data
+
+    @staticmethod
+    async def get_address(address_id: int, user_id: int):
+        """One of the user's addresses"""
+        return first(await run(
+            get_async_supabase().table("addresses").select("*").eq("id", address_id).eq("user_id", user_id)
+        ))
+
+    @staticmethod
+    async def create_address(address_data: dict):
+        """Create an address"""
+        return first(await run(get_async_supabase().table("addresses").insert(address_data), idempotent=False))
+
+    @staticmethod
+    async def update_address(address_id: int, address_data: dict):
+        """Update an address"""
+        return first(await run(
+            get_async_supabase().table("addresses").update(address_data).eq("id", address_id)
+        ))
+
+    @staticmethod
+    async def save_default_address(address_data: dict, previous_defaults):
+        """Write an address as the default and unset previous_defaults in one upsert
+
+        PostgREST runs the request in one transaction, so if it fails the old
+        default stays in place. previous_defaults are the full rows (an upsert
+        writes every column sent). address_data without an id creates the address.
+        """
+        cleared_ids = {address["id"] for address in previous_defaults}
+        rows = [{**address, "is_default": False} for address in previous_defaults]
+        rows.append({**address_data, "is_default": True})
+        response = await run(
+            get_async_supabase().table("addresses").upsert(rows, on_conflict="id", default_to_null=False),
+            # Creating an address isn't safe to repeat
+            idempotent="id" in address_data
+        )
+        return next(address for address in response.data if address["id"] not in cleared_ids)
+
+    @staticmethod
+    async def delete_address(address_id: int):
+        """Delete an address"""
+        await run(get_async_supabase().table("addresses").delete().eq("id", address_id))
+
+@instrument_service("supabase")
 class SupabaseService:
     """Service class for Supabase operations"""
     
     @staticmethod
-    def get_client() -> Client:
+    def get_client():
         """Get the Supabase client instance"""
-        return supabase
+        return get_supabase()
+
+    @staticmethod
+    def ping():
+        """Cheapest round trip to Supabase: one user ID"""
+        get_supabase().table("users").select("id").limit(1).execute()
     
     # User operations
     @staticmethod
     def get_user_by_email(email: str):
         """Get user by email"""
-        response = supabase.table("users").select("*").eq("email", email).execute()
+        response = get_supabase().table("users").select("*").eq("email", email).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def get_user_by_id(user_id: int):
         """Get user by ID"""
-        response = supabase.table("users").select("*").eq("id", user_id).execute()
+        response = get_supabase().table("users").select("*").eq("id", user_id).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def create_user(user_data: dict):
         """Create a new user"""
-        response = supabase.table("users").insert(user_data).execute()
+        response = get_supabase().table("users").insert(user_data).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def update_user(user_id: int, user_data: dict):
         """Update user data"""
-        response = supabase.table("users").update(user_data).eq("id", user_id).execute()
+        response = get_supabase().table("users").update(user_data).eq("id", user_id).execute()
         return response.data[0] if response.data else None
     
     # Medicine operations
     @staticmethod
     def get_all_medicines(limit: int = 100, offset: int = 0):
         """Get all medicines with pagination"""
-        response = supabase.table("medicines").select("*").range(offset, offset + limit - 1).execute()
+        response = get_supabase().table("medicines").select("*").range(offset, offset + limit - 1).execute()
         return response.data
     
     @staticmethod
     def get_medicine_by_id(medicine_id: int):
         """Get medicine by ID"""
-        response = supabase.table("medicines").select("*").eq("id", medicine_id).execute()
+        response = get_supabase().table("medicines").select("*").eq("id", medicine_id).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def create_medicine(medicine_data: dict):
         """Create a new medicine"""
-        response = supabase.table("medicines").insert(medicine_data).execute()
+        response = get_supabase().table("medicines").insert(medicine_data).execute()
         return response.data[0] if response.data else None
     
     # Category operations
     @staticmethod
     def get_all_categories():
         """Get all categories"""
-        response = supabase.table("categories").select("*").execute()
+        response = get_supabase().table("categories").select("*").execute()
         return response.data
     
     @staticmethod
     def get_medicines_by_category(category_id: int, limit: int = 100, offset: int = 0):
         """Get medicines by category"""
-        response = supabase.table("medicines").select("*").eq("category_id", category_id).range(offset, offset + limit - 1).execute()
+        response = get_supabase().table("medicines").select("*").eq("category_id", category_id).range(offset, offset + limit - 1).execute()
         return response.data
     
     # Cart operations
     @staticmethod
     def get_cart_by_user_id(user_id: int):
         """Get cart by user ID"""
-        response = supabase.table("carts").select("*").eq("user_id", user_id).execute()
+        response = get_supabase().table("carts").select("*").eq("user_id", user_id).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def get_cart_items(cart_id: int):
         """Get cart items by cart ID"""
-        response = supabase.table("cart_items").select("*").eq("cart_id", cart_id).execute()
+        response = get_supabase().table("cart_items").select("*").eq("cart_id", cart_id).execute()
         return response.data
     
     @staticmethod
     def add_cart_item(cart_item_data: dict):
         """Add item to cart"""
-        response = supabase.table("cart_items").insert(cart_item_data).execute()
+        response = get_supabase().table("cart_items").insert(cart_item_data).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def update_cart_item(cart_item_id: int, cart_item_data: dict):
         """Update cart item"""
-        response = supabase.table("cart_items").update(cart_item_data).eq("id", cart_item_id).execute()
+        response = get_supabase().table("cart_items").update(cart_item_data).eq("id", cart_item_id).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def delete_cart_item(cart_item_id: int):
         """Delete cart item"""
-        response = supabase.table("cart_items").delete().eq("id", cart_item_id).execute()
+        response = get_supabase().table("cart_items").delete().eq("id", cart_item_id).execute()
         return response.data[0] if response.data else None
     
     # Order operations
     @staticmethod
     def create_order(order_data: dict):
         """Create a new order"""
-        response = supabase.table("orders").insert(order_data).execute()
+        response = get_supabase().table("orders").insert(order_data).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def add_order_item(order_item_data: dict):
         """Add item to order"""
-        response = supabase.table("order_items").insert(order_item_data).execute()
+        response = get_supabase().table("order_items").insert(order_item_data).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def get_orders_by_user_id(user_id: int):
         """Get orders by user ID"""
-        response = supabase.table("orders").select("*").eq("user_id", user_id).execute()
+        response = get_supabase().table("orders").select("*").eq("user_id", user_id).execute()
         return response.data
     
     @staticmethod
     def get_order_by_id(order_id: int):
         """Get order by ID"""
-        response = supabase.table("orders").select("*").eq("id", order_id).execute()
+        response = get_supabase().table("orders").select("*").eq("id", order_id).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def get_order_items(order_id: int):
         """Get order items by order ID"""
-        response = supabase.table("order_items").select("*").eq("order_id", order_id).execute()
+        response = get_supabase().table("order_items").select("*").eq("order_id", order_id).execute()
         return response.data
     
     @staticmethod
     def update_order_status(order_id: int, status: str):
         """Update order status"""
-        response = supabase.table("orders").update({"status": status}).eq("id", order_id).execute()
+        response = get_supabase().table("orders").update({"status": status}).eq("id", order_id).execute()
         return response.data[0] if response.data else None
     
     # Prescription operations
     @staticmethod
     def get_prescriptions_by_user_id(user_id: int):
         """Get prescriptions by user ID"""
-        response = supabase.table("prescriptions").select("*").eq("user_id", user_id).execute()
+        response = get_supabase().table("prescriptions").select("*").eq("user_id", user_id).execute()
         return response.data
     
     @staticmethod
     def create_prescription(prescription_data: dict):
         """Create a new prescription"""
-        response = supabase.table("prescriptions").insert(prescription_data).execute()
+        response = get_supabase().table("prescriptions").insert(prescription_data).execute()
         return response.data[0] if response.data else None
     
     @staticmethod
     def verify_prescription(prescription_id: int, verified_by: int):
         """Verify a prescription"""
-        response = supabase.table("prescriptions").update({
+        response = get_supabase().table("prescriptions").update({
             "is_verified": True,
             "verified_by": verified_by
         }).eq("id", prescription_id).execute()
         return response.data[0] if response.data else None
 
 # Create a singleton instance
-db_service = SupabaseService() 
\ No newline at end of file
+db_service = SupabaseService()
+async_db_service = AsyncSupabaseService()
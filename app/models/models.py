@@ -1,5 +1,8 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text, Table
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Numeric, Date, DateTime, Text, LargeBinary, Table, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
+import orjson
+import zlib
+from sqlalchemy.sql import expression
 from datetime import datetime
 from app.database.database import Base
 
@@ -29,7 +32,7 @@ class Address(Base):
     __tablename__ = "addresses"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     address_line1 = Column(String)
     address_line2 = Column(String, nullable=True)
     city = Column(String)
@@ -58,12 +61,14 @@ class Medicine(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
-    price = Column(Float)
+    price = Column(Numeric(12, 2))
     stock = Column(Integer, default=0)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     prescription_required = Column(Boolean, default=False)
     manufacturer = Column(String)
     image_url = Column(String, nullable=True)
+    # Bumped on every stock change for optimistic concurrency
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -77,24 +82,39 @@ class Prescription(Base):
     __tablename__ = "prescriptions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     image_path = Column(String)
     is_verified = Column(Boolean, default=False)
     verified_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime, nullable=True)
+    is_expired = Column(Boolean, default=False, server_default=expression.false())
+    verified_at = Column(DateTime, nullable=True)
+    lease_owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="prescriptions", foreign_keys=[user_id])
     verifier = relationship("User", foreign_keys=[verified_by])
+    lease_owner = relationship("User", foreign_keys=[lease_owner_id])
     prescription_medicines = relationship("PrescriptionMedicine", back_populates="prescription")
+    
+    # Verification queue only scans prescriptions awaiting review, oldest first
+    __table_args__ = (
+        Index(
+            "ix_prescriptions_unverified_created_at",
+            "created_at",
+            postgresql_where=text("is_verified = false AND verified_by IS NULL"),
+            sqlite_where=text("is_verified = 0 AND verified_by IS NULL")
+        ),
+    )
 
 # Prescription Medicine model
 class PrescriptionMedicine(Base):
     __tablename__ = "prescription_medicines"
 
     id = Column(Integer, primary_key=True, index=True)
-    prescription_id = Column(Integer, ForeignKey("prescriptions.id"))
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id"), index=True)
     medicine_id = Column(Integer, ForeignKey("medicines.id"))
     dosage = Column(String, nullable=True)
     quantity = Column(Integer)
@@ -131,6 +151,11 @@ class CartItem(Base):
     medicine = relationship("Medicine", back_populates="cart_items")
     prescription = relationship("Prescription", foreign_keys=[prescription_id])
 
+    # One row per medicine in a cart; also serves lookups by cart_id
+    __table_args__ = (
+        UniqueConstraint("cart_id", "medicine_id", name="uq_cart_items_cart_id_medicine_id"),
+    )
+
 # Order model
 class Order(Base):
     __tablename__ = "orders"
@@ -138,11 +163,15 @@ class Order(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     address_id = Column(Integer, ForeignKey("addresses.id"))
-    total_amount = Column(Float)
+    # total_amount = subtotal_amount - discount_amount + tax_amount
+    subtotal_amount = Column(Numeric(12, 2), nullable=False, default=0, server_default=text("0"))
+    discount_amount = Column(Numeric(12, 2), nullable=False, default=0, server_default=text("0"))
+    tax_amount = Column(Numeric(12, 2), nullable=False, default=0, server_default=text("0"))
+    total_amount = Column(Numeric(12, 2))
     status = Column(String, default="pending")  # pending, processing, out_for_delivery, delivered, cancelled
     payment_status = Column(String, default="pending")  # pending, completed, failed
     payment_method = Column(String)
-    delivery_partner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    delivery_partner_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     estimated_delivery_time = Column(DateTime, nullable=True)
@@ -156,15 +185,20 @@ class Order(Base):
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     tracking_updates = relationship("OrderTracking", back_populates="order", cascade="all, delete-orphan")
 
+    # A user's order history, newest first
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at", user_id, created_at.desc()),
+    )
+
 # Order Item model
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
-    medicine_id = Column(Integer, ForeignKey("medicines.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), index=True)
     quantity = Column(Integer)
-    unit_price = Column(Float)
+    unit_price = Column(Numeric(12, 2))
     prescription_id = Column(Integer, ForeignKey("prescriptions.id"), nullable=True)
     
     # Relationships
@@ -186,4 +220,178 @@ class OrderTracking(Base):
     
     # Relationships
     order = relationship("Order", back_populates="tracking_updates")
-    user = relationship("User", foreign_keys=[updated_by]) 
\ No newline at end of file
+    user = relationship("User", foreign_keys=[updated_by])
+
+    # An order's tracking timeline, latest first
+    __table_args__ = (
+        Index("ix_order_tracking_order_id_timestamp", order_id, timestamp.desc()),
+    )
+
+# Archived Order model (cold tier: old delivered and cancelled orders moved out of orders)
+class ArchivedOrder(Base):
+    __tablename__ = "archived_orders"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime, primary_key=True)  # Monthly partition key on PostgreSQL
+    user_id = Column(Integer, nullable=False)
+    address_id = Column(Integer)
+    subtotal_amount = Column(Numeric(12, 2), nullable=False, default=0)
+    discount_amount = Column(Numeric(12, 2), nullable=False, default=0)
+    tax_amount = Column(Numeric(12, 2), nullable=False, default=0)
+    total_amount = Column(Numeric(12, 2))
+    status = Column(String)
+    payment_status = Column(String)
+    payment_method = Column(String)
+    delivery_partner_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime)
+    estimated_delivery_time = Column(DateTime, nullable=True)
+    actual_delivery_time = Column(DateTime, nullable=True)
+    delivery_notes = Column(Text, nullable=True)
+    tracking = Column(LargeBinary)  # zlib-compressed JSON list of the order's tracking updates
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships (read-only; the cold tier has no foreign keys)
+    items = relationship(
+        "ArchivedOrderItem", primaryjoin="ArchivedOrder.id == foreign(ArchivedOrderItem.order_id)", viewonly=True
+    )
+    address = relationship("Address", primaryjoin="foreign(ArchivedOrder.address_id) == Address.id", viewonly=True)
+
+    # A user's archived order history, newest first
+    __table_args__ = (
+        Index("ix_archived_orders_user_id_created_at", user_id, created_at.desc()),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    @property
+    def tracking_updates(self):
+        """Tracking timeline, latest first, as stored when the order was archived"""
+        if not self.tracking:
+            return []
+        return orjson.loads(zlib.decompress(self.tracking))
+
+# Archived Order Item model
+class ArchivedOrderItem(Base):
+    __tablename__ = "archived_order_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_created_at = Column(DateTime, primary_key=True)  # Same partitioning as archived_orders
+    order_id = Column(Integer, nullable=False, index=True)
+    medicine_id = Column(Integer)
+    quantity = Column(Integer)
+    unit_price = Column(Numeric(12, 2))
+    prescription_id = Column(Integer, nullable=True)
+
+    # Relationships
+    medicine = relationship("Medicine", primaryjoin="foreign(ArchivedOrderItem.medicine_id) == Medicine.id", viewonly=True)
+
+    __table_args__ = (
+        {"postgresql_partition_by": "RANGE (order_created_at)"},
+    )
+
+# Stock Movement model (append-only ledger)
+class StockMovement(Base):
+    __tablename__ = "stock_movements"
+
+    id = Column(Integer, primary_key=True, index=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)  # Signed: negative takes stock out
+    reason = Column(String, nullable=False)
+    order_id = Column(Integer, nullable=True)  # Not a foreign key: the order may have been archived
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    notes = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Set once the movement is folded into Medicine.stock
+    rolled_up_at = Column(DateTime, nullable=True)
+    
+    # Relationships
+    medicine = relationship("Medicine")
+    order = relationship("Order", primaryjoin="foreign(StockMovement.order_id) == Order.id", viewonly=True)
+
+    __table_args__ = (
+        Index("ix_stock_movements_medicine_id_created_at", "medicine_id", "created_at"),
+        # Roll-up and pending-balance lookups only scan movements not yet folded in
+        Index(
+            "ix_stock_movements_pending",
+            "medicine_id",
+            postgresql_where=text("rolled_up_at IS NULL"),
+            sqlite_where=text("rolled_up_at IS NULL")
+        ),
+    )
+
+# Stock Counter Shard model (a hot SKU's available stock split over several rows)
+class StockCounterShard(Base):
+    __tablename__ = "stock_counter_shards"
+
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    available = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
+# Idempotency Key model (stored responses for retried requests)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String, nullable=False)
+    # Fingerprint of the request, so a key cannot be reused for a different request
+    request_hash = Column(String, nullable=False)
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_id_key"),
+    )
+
+# Daily Medicine Sales model (analytics rollup, net of cancellations)
+class DailyMedicineSales(Base):
+    __tablename__ = "daily_medicine_sales"
+
+    day = Column(Date, primary_key=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), primary_key=True, index=True)
+    units_sold = Column(Integer, nullable=False, default=0)
+    units_cancelled = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+# Daily Category Sales model (analytics rollup, net of cancellations)
+class DailyCategorySales(Base):
+    __tablename__ = "daily_category_sales"
+
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True, index=True)
+    units_sold = Column(Integer, nullable=False, default=0)
+    units_cancelled = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+# Stock Consumption model (exponentially weighted demand per medicine, for low-stock alerts)
+class StockConsumption(Base):
+    __tablename__ = "stock_consumption"
+
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), primary_key=True)
+    # Units consumed, each decayed by its age; divided by the decay time this is a daily rate
+    decayed_units = Column(Float, nullable=False, default=0)
+    # Time decayed_units was last brought up to date
+    updated_at = Column(DateTime, nullable=False)
+    # Set while the medicine is flagged as running out
+    alerted_at = Column(DateTime, nullable=True, index=True)
+
+# Stock Alert Event model (feed of low-stock and recovered transitions)
+class StockAlertEvent(Base):
+    __tablename__ = "stock_alert_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False, index=True)
+    kind = Column(String, nullable=False)
+    stock = Column(Integer, nullable=False)
+    daily_rate = Column(Float, nullable=False)
+    days_to_stockout = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Job Watermark model (last ledger position a background job has processed)
+class JobWatermark(Base):
+    __tablename__ = "job_watermarks"
+
+    name = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
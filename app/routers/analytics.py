@@ -0,0 +1,178 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+from datetime import datetime, timedelta
+
+from app.database.database import get_db
+from app.models.models import Medicine, Category, DailyMedicineSales, DailyCategorySales, StockAlertEvent
+from app.schemas.analytics_schemas import SalesReport, CategoryReport, DailyReport, InventoryReport, LowStockReport, StockAlertFeed
+from app.utils.auth import get_pharmacy_admin
+from app.utils.stock_alerts import STOCK_ALERT_HORIZON_DAYS, low_stock_items
+from app.models.models import User
+
+router = APIRouter()
+
+# Longest window a report can cover
+MAX_REPORT_DAYS = 366
+
+def report_window(days: int):
+    """First and last day (UTC) of a window ending today"""
+    end_day = datetime.utcnow().date()
+    return end_day - timedelta(days=days - 1), end_day
+
+def sales_columns(model):
+    return (
+        func.sum(model.units_sold).label("units_sold"),
+        func.sum(model.units_cancelled).label("units_cancelled"),
+        func.sum(model.revenue).label("revenue")
+    )
+
+@router.get("/top-sellers", response_model=SalesReport)
+def get_top_sellers(
+    days: int = Query(7, ge=1, le=MAX_REPORT_DAYS),
+    limit: int = Query(10, ge=1, le=100),
+    category_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Best-selling medicines by units sold over the last days (pharmacy admin only)"""
+    start_day, end_day = report_window(days)
+
+    # Aggregate the rollup rows in the window, then attach names for the top rows only
+    totals = db.query(DailyMedicineSales.medicine_id, *sales_columns(DailyMedicineSales)).filter(
+        DailyMedicineSales.day >= start_day,
+        DailyMedicineSales.day <= end_day
+    )
+    if category_id is not None:
+        totals = totals.join(Medicine, DailyMedicineSales.medicine_id == Medicine.id).filter(
+            Medicine.category_id == category_id
+        )
+    totals = totals.group_by(DailyMedicineSales.medicine_id).subquery()
+
+    rows = db.query(
+        totals.c.medicine_id, Medicine.name, Medicine.category_id,
+        totals.c.units_sold, totals.c.units_cancelled, totals.c.revenue
+    ).join(Medicine, totals.c.medicine_id == Medicine.id).filter(
+        totals.c.units_sold > 0
+    ).order_by(totals.c.units_sold.desc(), totals.c.medicine_id).limit(limit).all()
+
+    return {"start_day": start_day, "end_day": end_day, "items": [row._asdict() for row in rows]}
+
+@router.get("/categories", response_model=CategoryReport)
+def get_category_sales(
+    days: int = Query(7, ge=1, le=MAX_REPORT_DAYS),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Sales per category over the last days, highest revenue first (pharmacy admin only)"""
+    start_day, end_day = report_window(days)
+
+    rows = db.query(DailyCategorySales.category_id, Category.name, *sales_columns(DailyCategorySales)).join(
+        Category, DailyCategorySales.category_id == Category.id
+    ).filter(
+        DailyCategorySales.day >= start_day,
+        DailyCategorySales.day <= end_day
+    ).group_by(DailyCategorySales.category_id, Category.name).order_by(
+        func.sum(DailyCategorySales.revenue).desc()
+    ).all()
+
+    return {"start_day": start_day, "end_day": end_day, "items": [row._asdict() for row in rows]}
+
+@router.get("/daily", response_model=DailyReport)
+def get_daily_sales(
+    days: int = Query(30, ge=1, le=MAX_REPORT_DAYS),
+    medicine_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Sales per day over the last days, for one medicine or the whole catalog (pharmacy admin only)"""
+    start_day, end_day = report_window(days)
+
+    # Category rows cover the whole catalog in fewer rows than medicine rows
+    model = DailyMedicineSales if medicine_id is not None else DailyCategorySales
+    rows = db.query(model.day, *sales_columns(model)).filter(
+        model.day >= start_day,
+        model.day <= end_day
+    )
+    if medicine_id is not None:
+        rows = rows.filter(DailyMedicineSales.medicine_id == medicine_id)
+    rows = rows.group_by(model.day).order_by(model.day).all()
+
+    return {
+        "start_day": start_day,
+        "end_day": end_day,
+        "medicine_id": medicine_id,
+        "items": [row._asdict() for row in rows]
+    }
+
+@router.get("/inventory", response_model=InventoryReport)
+def get_inventory_cover(
+    days: int = Query(14, ge=1, le=MAX_REPORT_DAYS),
+    max_days_of_cover: Optional[float] = Query(None, gt=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Medicines closest to stocking out at their recent sales velocity (pharmacy admin only)"""
+    start_day, end_day = report_window(days)
+
+    # Velocity is the average daily units sold over the window
+    velocity = db.query(
+        DailyMedicineSales.medicine_id,
+        (func.sum(DailyMedicineSales.units_sold) * 1.0 / days).label("daily_velocity")
+    ).filter(
+        DailyMedicineSales.day >= start_day,
+        DailyMedicineSales.day <= end_day
+    ).group_by(DailyMedicineSales.medicine_id).having(
+        func.sum(DailyMedicineSales.units_sold) > 0
+    ).subquery()
+
+    # Stock is as of the last stock roll-up
+    days_of_cover = (Medicine.stock / velocity.c.daily_velocity).label("days_of_cover")
+    rows = db.query(
+        Medicine.id.label("medicine_id"), Medicine.name, Medicine.stock, velocity.c.daily_velocity, days_of_cover
+    ).join(velocity, velocity.c.medicine_id == Medicine.id)
+    if max_days_of_cover is not None:
+        rows = rows.filter(days_of_cover <= max_days_of_cover)
+    rows = rows.order_by(days_of_cover, Medicine.id).limit(limit).all()
+
+    return {"start_day": start_day, "end_day": end_day, "items": [row._asdict() for row in rows]}
+
+@router.get("/low-stock", response_model=LowStockReport)
+def get_low_stock(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Medicines flagged as running out within the alert horizon, soonest first (pharmacy admin only)"""
+    # Projections are refreshed to now; the alert job decides what is flagged
+    items = [
+        {
+            "medicine_id": consumption.medicine_id,
+            "name": name,
+            "stock": available,
+            "daily_rate": rate,
+            "days_to_stockout": days,
+            "alerted_at": consumption.alerted_at
+        }
+        for consumption, name, available, rate, days in low_stock_items(db, datetime.utcnow(), alerted_only=True)
+    ]
+    items.sort(key=lambda item: (item["days_to_stockout"] is None, item["days_to_stockout"] or 0))
+
+    return {"horizon_days": STOCK_ALERT_HORIZON_DAYS, "items": items}
+
+@router.get("/low-stock/events", response_model=StockAlertFeed)
+def get_low_stock_events(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    medicine_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Low-stock and recovered events after a cursor, oldest first (pharmacy admin only)"""
+    events = db.query(StockAlertEvent).filter(StockAlertEvent.id > after_id)
+    if medicine_id is not None:
+        events = events.filter(StockAlertEvent.medicine_id == medicine_id)
+    events = events.order_by(StockAlertEvent.id).limit(limit).all()
+
+    return {"items": events, "next_after_id": events[-1].id if events else after_id}
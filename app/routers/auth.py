@@ -2,24 +2,27 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import List
 from datetime import timedelta
+import asyncio
 
-from app.database.supabase_client import db_service
+from app.database.supabase_client import async_db_service
 from app.schemas.user_schemas import UserCreate, User as UserSchema, UserLogin, Token, Address as AddressSchema, AddressCreate, PhoneVerification
+from app.utils.rate_limit import limit
 from app.utils.auth import authenticate_user, create_access_token, get_password_hash, get_current_active_user, ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter()
 
-@router.post("/register", response_model=UserSchema)
-def register_user(user: UserCreate):
+@router.post("/register", response_model=UserSchema, dependencies=[Depends(limit("login"))])
+async def register_user(user: UserCreate):
     """Register a new user"""
-    # Check if email already exists
-    db_user = db_service.get_user_by_email(user.email)
+    # Check if email or phone already exists (both lookups at once)
+    db_user, phone_users = await asyncio.gather(
+        async_db_service.get_user_by_email(user.email),
+        async_db_service.get_users_by_phone(user.phone)
+    )
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Check if phone already exists
-    phone_check_response = db_service.get_client().table("users").select("*").eq("phone", user.phone).execute()
-    if phone_check_response.data:
+    if phone_users:
         raise HTTPException(status_code=400, detail="Phone number already registered")
     
     # Check if passwords match
@@ -27,7 +30,7 @@ def register_user(user: UserCreate):
         raise HTTPException(status_code=400, detail="Passwords do not match")
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
     user_data = {
         "email": user.email,
         "phone": user.phone,
@@ -38,14 +41,14 @@ def register_user(user: UserCreate):
         "is_delivery_partner": False
     }
     
-    new_user = db_service.create_user(user_data)
+    new_user = await async_db_service.create_user(user_data)
     
     return UserSchema(**new_user)
 
-@router.post("/login", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+@router.post("/login", response_model=Token, dependencies=[Depends(limit("login"))])
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login and get access token"""
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -61,12 +64,12 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserSchema)
-def get_current_user_profile(current_user = Depends(get_current_active_user)):
+async def get_current_user_profile(current_user = Depends(get_current_active_user)):
     """Get current user profile"""
     return UserSchema(**current_user)
 
 @router.put("/profile", response_model=UserSchema)
-def update_user_profile(
+async def update_user_profile(
     user_data: UserSchema, 
     current_user = Depends(get_current_active_user)
 ):
@@ -77,12 +80,12 @@ def update_user_profile(
         "phone": user_data.phone
     }
     
-    updated_user = db_service.update_user(current_user["id"], update_data)
+    updated_user = await async_db_service.update_user(current_user["id"], update_data)
     
     return UserSchema(**updated_user)
 
 @router.post("/verify-phone", response_model=UserSchema)
-def verify_phone_number(
+async def verify_phone_number(
     verification: PhoneVerification,
     current_user = Depends(get_current_active_user)
 ):
@@ -91,35 +94,26 @@ def verify_phone_number(
     # For this example, we'll just update the user's phone number
     
     # Check if phone already exists for another user
-    phone_check_response = db_service.get_client().table("users").select("*").eq("phone", verification.phone).execute()
-    if phone_check_response.data:
-        for user in phone_check_response.data:
-            if user["id"] != current_user["id"]:
-                raise HTTPException(status_code=400, detail="Phone number already registered by another user")
+    for user in await async_db_service.get_users_by_phone(verification.phone):
+        if user["id"] != current_user["id"]:
+            raise HTTPException(status_code=400, detail="Phone number already registered by another user")
     
     # Update phone
-    updated_user = db_service.update_user(current_user["id"], {"phone": verification.phone})
+    updated_user = await async_db_service.update_user(current_user["id"], {"phone": verification.phone})
     
     return UserSchema(**updated_user)
 
 @router.get("/addresses", response_model=List[AddressSchema])
-def get_user_addresses(current_user = Depends(get_current_active_user)):
+async def get_user_addresses(current_user = Depends(get_current_active_user)):
     """Get all addresses for current user"""
-    addresses_response = db_service.get_client().table("addresses").select("*").eq("user_id", current_user["id"]).execute()
-    return [AddressSchema(**addr) for addr in addresses_response.data]
+    return [AddressSchema(**addr) for addr in await async_db_service.get_addresses(current_user["id"])]
 
 @router.post("/addresses", response_model=AddressSchema)
-def add_user_address(
+async def add_user_address(
     address: AddressCreate,
     current_user = Depends(get_current_active_user)
 ):
     """Add new address for current user"""
-    # If this is set as default, unset other default addresses
-    if address.is_default:
-        addresses_response = db_service.get_client().table("addresses").select("*").eq("user_id", current_user["id"]).eq("is_default", True).execute()
-        for addr in addresses_response.data:
-            db_service.get_client().table("addresses").update({"is_default": False}).eq("id", addr["id"]).execute()
-    
     # Create new address
     address_data = {
         "user_id": current_user["id"],
@@ -131,31 +125,33 @@ def add_user_address(
         "is_default": address.is_default
     }
     
-    new_address_response = db_service.get_client().table("addresses").insert(address_data).execute()
-    new_address = new_address_response.data[0] if new_address_response.data else None
+    # A new default replaces the old one in the same request
+    previous_defaults = []
+    if address.is_default:
+        addresses = await async_db_service.get_addresses(current_user["id"])
+        previous_defaults = [addr for addr in addresses if addr["is_default"]]
+    
+    if previous_defaults:
+        new_address = await async_db_service.save_default_address(address_data, previous_defaults)
+    else:
+        new_address = await async_db_service.create_address(address_data)
     
     return AddressSchema(**new_address)
 
 @router.put("/addresses/{address_id}", response_model=AddressSchema)
-def update_user_address(
+async def update_user_address(
     address_id: int,
     address: AddressCreate,
     current_user = Depends(get_current_active_user)
 ):
     """Update user address"""
-    # Get address
-    address_response = db_service.get_client().table("addresses").select("*").eq("id", address_id).eq("user_id", current_user["id"]).execute()
-    db_address = address_response.data[0] if address_response.data else None
+    # Get the user's addresses: this one, and any default it replaces
+    addresses = await async_db_service.get_addresses(current_user["id"])
+    db_address = next((addr for addr in addresses if addr["id"] == address_id), None)
     
     if not db_address:
         raise HTTPException(status_code=404, detail="Address not found")
     
-    # If this is set as default, unset other default addresses
-    if address.is_default and not db_address["is_default"]:
-        addresses_response = db_service.get_client().table("addresses").select("*").eq("user_id", current_user["id"]).eq("is_default", True).execute()
-        for addr in addresses_response.data:
-            db_service.get_client().table("addresses").update({"is_default": False}).eq("id", addr["id"]).execute()
-    
     # Update address
     address_data = {
         "address_line1": address.address_line1,
@@ -166,25 +162,33 @@ def update_user_address(
         "is_default": address.is_default
     }
     
-    updated_address_response = db_service.get_client().table("addresses").update(address_data).eq("id", address_id).execute()
-    updated_address = updated_address_response.data[0] if updated_address_response.data else None
+    # A new default replaces the old one in the same request
+    previous_defaults = []
+    if address.is_default:
+        previous_defaults = [addr for addr in addresses if addr["is_default"] and addr["id"] != address_id]
+    
+    if previous_defaults:
+        updated_address = await async_db_service.save_default_address(
+            {"id": address_id, "user_id": current_user["id"], **address_data}, previous_defaults
+        )
+    else:
+        updated_address = await async_db_service.update_address(address_id, address_data)
     
     return AddressSchema(**updated_address)
 
 @router.delete("/addresses/{address_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_address(
+async def delete_user_address(
     address_id: int,
     current_user = Depends(get_current_active_user)
 ):
     """Delete user address"""
     # Get address
-    address_response = db_service.get_client().table("addresses").select("*").eq("id", address_id).eq("user_id", current_user["id"]).execute()
-    db_address = address_response.data[0] if address_response.data else None
+    db_address = await async_db_service.get_address(address_id, current_user["id"])
     
     if not db_address:
         raise HTTPException(status_code=404, detail="Address not found")
     
     # Delete address
-    db_service.get_client().table("addresses").delete().eq("id", address_id).execute()
+    await async_db_service.delete_address(address_id)
     
     return None 
\ No newline at end of file
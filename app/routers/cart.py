@@ -1,15 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 from datetime import datetime
 
 from app.database.database import get_db
-from app.models.models import Cart, CartItem, Medicine, Prescription, User
-from app.schemas.cart_schemas import Cart as CartSchema, CartItemCreate, CartItem as CartItemSchema, CartUpdateItem, PrescriptionValidation
+from app.models.models import Cart, CartItem, Medicine, User
+from app.schemas.cart_schemas import CartSummary, CartItemCreate, CartItem as CartItemSchema, CartUpdateItem, PrescriptionValidation
 from app.utils.auth import get_current_active_user
+from app.utils.entitlements import check_prescription_coverage
+from app.utils.expand import parse_expand
+from app.utils.money import price_breakdown
 
 router = APIRouter()
 
+# Nested objects cart items can include with ?expand=
+CART_EXPAND_FIELDS = ["medicine"]
+
 def get_or_create_cart(db: Session, user_id: int):
     """Get user's cart or create a new one if it doesn't exist"""
     cart = db.query(Cart).filter(Cart.user_id == user_id).first()
@@ -22,28 +30,59 @@ def get_or_create_cart(db: Session, user_id: int):
     
     return cart
 
-def calculate_cart_total(cart: Cart):
-    """Calculate total price of items in cart"""
-    total = 0
-    for item in cart.items:
-        total += item.medicine.price * item.quantity
+def cart_totals(db: Session, cart_id: int):
+    """Price breakdown of a cart, summed by the database in exact decimals"""
+    subtotal = db.query(
+        func.sum(CartItem.quantity * Medicine.price)
+    ).join(Medicine, Medicine.id == CartItem.medicine_id).filter(CartItem.cart_id == cart_id).scalar()
     
-    return total
+    return price_breakdown(subtotal)
 
-@router.get("", response_model=CartSchema)
+@router.get("", response_model=CartSummary, response_model_exclude_unset=True)
 def get_user_cart(
+    expand: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get user's cart with prescription validation"""
-    # Get or create cart
-    cart = get_or_create_cart(db, current_user.id)
+    """Get user's cart with prescription validation (?expand=medicine for full medicine details)"""
+    expand_fields = parse_expand(expand, CART_EXPAND_FIELDS)
     
-    # Calculate total
-    cart_dict = CartSchema.from_orm(cart).dict()
-    cart_dict["total"] = calculate_cart_total(cart)
+    # Load items and their medicines together
+    medicine_loader = selectinload(Cart.items).joinedload(CartItem.medicine)
+    if "medicine" in expand_fields:
+        medicine_loader = medicine_loader.joinedload(Medicine.category)
     
-    return cart_dict
+    cart = db.query(Cart).options(medicine_loader).filter(Cart.user_id == current_user.id).first()
+    if not cart:
+        cart = get_or_create_cart(db, current_user.id)
+    
+    items = []
+    for item in cart.items:
+        summary = {
+            "id": item.id,
+            "medicine_id": item.medicine_id,
+            "quantity": item.quantity,
+            "prescription_id": item.prescription_id,
+            "name": item.medicine.name,
+            "price": item.medicine.price,
+            "image_url": item.medicine.image_url,
+            "stock": item.medicine.stock,
+            "requires_prescription": item.medicine.prescription_required
+        }
+        if "medicine" in expand_fields:
+            summary["medicine"] = item.medicine
+        items.append(summary)
+    
+    totals = cart_totals(db, cart.id)
+    return {
+        "id": cart.id,
+        "user_id": cart.user_id,
+        "updated_at": cart.updated_at,
+        "items_count": len(items),
+        **totals,
+        "total": totals["total_amount"],
+        "items": items
+    }
 
 @router.post("/items", response_model=CartItemSchema)
 def add_medicine_to_cart(
@@ -67,36 +106,25 @@ def add_medicine_to_cart(
             detail="This medicine requires a prescription. Please provide a prescription ID."
         )
     
-    # If prescription provided, validate it
-    if item.prescription_id:
-        prescription = db.query(Prescription).filter(
-            Prescription.id == item.prescription_id,
-            Prescription.user_id == current_user.id,
-            Prescription.is_verified == True
-        ).first()
-        
-        if not prescription:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid or unverified prescription"
-            )
-        
-        # Check if prescription is expired
-        if prescription.expires_at and prescription.expires_at < datetime.utcnow():
-            raise HTTPException(
-                status_code=400,
-                detail="Prescription has expired"
-            )
-    
     # Check if medicine is already in cart
     existing_item = db.query(CartItem).filter(
         CartItem.cart_id == cart.id,
         CartItem.medicine_id == item.medicine_id
     ).first()
     
+    # If prescription provided, check it covers the total quantity in cart
+    if item.prescription_id:
+        quantity = item.quantity + (existing_item.quantity if existing_item else 0)
+        check_prescription_coverage(db, current_user.id, medicine.id, quantity, item.prescription_id)
+    
+    # Mark cart as active
+    cart.updated_at = datetime.utcnow()
+    
     if existing_item:
         # Update quantity
         existing_item.quantity += item.quantity
+        if item.prescription_id:
+            existing_item.prescription_id = item.prescription_id
         db.commit()
         db.refresh(existing_item)
         return existing_item
@@ -110,7 +138,15 @@ def add_medicine_to_cart(
     )
     
     db.add(db_item)
-    db.commit()
+    # A concurrent request may have added the same medicine first (one row per medicine per cart)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This medicine was just added to your cart; please retry"
+        )
     db.refresh(db_item)
     
     return db_item
@@ -137,8 +173,15 @@ def update_cart_item(
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
+    # Check if prescription covers the new quantity
+    if cart_item.prescription_id:
+        check_prescription_coverage(
+            db, current_user.id, cart_item.medicine_id, item_update.quantity, cart_item.prescription_id
+        )
+    
     # Update quantity
     cart_item.quantity = item_update.quantity
+    cart.updated_at = datetime.utcnow()
     
     db.commit()
     db.refresh(cart_item)
@@ -168,6 +211,7 @@ def remove_medicine_from_cart(
     
     # Delete cart item
     db.delete(cart_item)
+    cart.updated_at = datetime.utcnow()
     db.commit()
     
     return None
@@ -210,28 +254,14 @@ def validate_prescription_for_medicine(
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
-    # Validate prescription
-    prescription = db.query(Prescription).filter(
-        Prescription.id == validation.prescription_id,
-        Prescription.user_id == current_user.id,
-        Prescription.is_verified == True
-    ).first()
-    
-    if not prescription:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid or unverified prescription"
-        )
-    
-    # Check if prescription is expired
-    if prescription.expires_at and prescription.expires_at < datetime.utcnow():
-        raise HTTPException(
-            status_code=400,
-            detail="Prescription has expired"
-        )
+    # Validate prescription covers this medicine and quantity
+    check_prescription_coverage(
+        db, current_user.id, cart_item.medicine_id, cart_item.quantity, validation.prescription_id
+    )
     
     # Update cart item with prescription
     cart_item.prescription_id = validation.prescription_id
+    cart.updated_at = datetime.utcnow()
     
     db.commit()
     db.refresh(cart_item)
@@ -3,7 +3,8 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from app.database.database import get_db
-from app.models.models import Category
+from app.database.replicas import get_read_db
+from app.models.models import Category, Medicine
 from app.schemas.medicine_schemas import Category as CategorySchema, CategoryCreate
 from app.utils.auth import get_current_active_user, get_pharmacy_admin
 from app.models.models import User
@@ -14,7 +15,7 @@ router = APIRouter()
 def get_all_categories(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all medicine categories"""
     categories = db.query(Category).offset(skip).limit(limit).all()
@@ -47,7 +48,7 @@ def create_category(
 @router.get("/{category_id}", response_model=CategorySchema)
 def get_category(
     category_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get category by ID"""
     category = db.query(Category).filter(Category.id == category_id).first()
@@ -96,7 +97,10 @@ def delete_category(
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Check if category has medicines
-    if db_category.medicines:
+    has_medicines = db.query(
+        db.query(Medicine.id).filter(Medicine.category_id == category_id).exists()
+    ).scalar()
+    if has_medicines:
         raise HTTPException(
             status_code=400, 
             detail="Cannot delete category with associated medicines. Remove medicines first."
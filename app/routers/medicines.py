@@ -1,25 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, update, tuple_, case, func
+from datetime import datetime
+import io
+import os
 
 from app.database.database import get_db
-from app.models.models import Medicine, Category
-from app.schemas.medicine_schemas import Medicine as MedicineSchema, MedicineCreate, MedicineUpdate, StockUpdate
+from app.database.replicas import get_read_db
+from app.models.models import Medicine, Category, StockMovement
+from app.schemas.medicine_schemas import Medicine as MedicineSchema, MedicineCreate, MedicineUpdate, StockUpdate, StockBulkUpdate, StockBulkResult, PriceBulkUpdate, PriceBulkResult, StockLedger, CatalogImportResult
 from app.utils.auth import get_current_active_user, get_pharmacy_admin
 from app.models.models import User
 from app.utils.file_upload import save_medicine_image
+from app.utils.catalog_io import detect_format, import_catalog, export_catalog
+from app.utils.stock_ledger import RESTOCK, ADJUSTMENT, lock_available_stock, pending_stock, record_movements, set_stock, spread_over_shards
+from app.utils.single_flight import SingleFlight
+from app.utils.rate_limit import limit
 
 router = APIRouter()
 
+# Concurrent requests for the same medicine share one query
+medicine_lookups = SingleFlight("medicine")
+
+# Stock updates accepted per bulk request, and applied per UPDATE statement
+MAX_BULK_STOCK_ITEMS = int(os.getenv("MAX_BULK_STOCK_ITEMS", "50000"))
+STOCK_BULK_BATCH_SIZE = int(os.getenv("STOCK_BULK_BATCH_SIZE", "1000"))
+
+# Price updates accepted per bulk request, and applied per UPDATE statement
+MAX_BULK_PRICE_ITEMS = int(os.getenv("MAX_BULK_PRICE_ITEMS", "50000"))
+PRICE_BULK_BATCH_SIZE = int(os.getenv("PRICE_BULK_BATCH_SIZE", "1000"))
+
 @router.get("", response_model=List[MedicineSchema])
 def get_all_medicines(
     skip: int = 0, 
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all medicines with pagination"""
-    medicines = db.query(Medicine).offset(skip).limit(limit).all()
+    medicines = db.query(Medicine).options(joinedload(Medicine.category)).offset(skip).limit(limit).all()
     return medicines
 
 @router.post("", response_model=MedicineSchema)
@@ -57,13 +77,269 @@ async def create_medicine(
     
     return db_medicine
 
+@router.get("/search", response_model=List[MedicineSchema], dependencies=[Depends(limit("search"))])
+def search_medicines(
+    q: Optional[str] = None,
+    category: Optional[int] = None,
+    prescription_required: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
+    """Search medicines with filters"""
+    # Build query
+    query = db.query(Medicine).options(joinedload(Medicine.category))
+    
+    # Apply filters
+    filters = []
+    
+    if q:
+        filters.append(or_(
+            Medicine.name.ilike(f"%{q}%"),
+            Medicine.description.ilike(f"%{q}%"),
+            Medicine.manufacturer.ilike(f"%{q}%")
+        ))
+    
+    if category:
+        filters.append(Medicine.category_id == category)
+    
+    if prescription_required is not None:
+        filters.append(Medicine.prescription_required == prescription_required)
+    
+    if min_price is not None:
+        filters.append(Medicine.price >= min_price)
+    
+    if max_price is not None:
+        filters.append(Medicine.price <= max_price)
+    
+    # Apply filters to query
+    if filters:
+        query = query.filter(and_(*filters))
+    
+    # Get results with pagination
+    medicines = query.offset(skip).limit(limit).all()
+    
+    return medicines
+
+@router.patch("/stock", response_model=StockBulkResult, response_model_exclude_unset=True)
+def bulk_update_stock(
+    bulk_update: StockBulkUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Set or adjust stock for many medicines at once (pharmacy admin only)"""
+    if len(bulk_update.items) > MAX_BULK_STOCK_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_STOCK_ITEMS} stock updates can be sent at once"
+        )
+    
+    result = {"updated": 0, "unchanged": 0, "failed": 0, "changes": [], "errors": []}
+    
+    # Only the first update per medicine is applied
+    items = []
+    seen = set()
+    for item in bulk_update.items:
+        if item.medicine_id in seen:
+            result["errors"].append({"medicine_id": item.medicine_id, "error": "Duplicate medicine_id in request"})
+            continue
+        seen.add(item.medicine_id)
+        items.append(item)
+    
+    for start in range(0, len(items), STOCK_BULK_BATCH_SIZE):
+        apply_stock_batch(db, items[start:start + STOCK_BULK_BATCH_SIZE], result, user_id=current_user.id)
+    
+    result["failed"] = len(result["errors"])
+    return result
+
+def apply_stock_batch(db: Session, items, result, user_id: int = None):
+    """Apply one batch of stock updates with a single UPDATE guarded by each row's version"""
+    # Lock the rows in ID order like set_stock(), so no checkout reserves against
+    # the balance we read; then load their versions in one query
+    available = lock_available_stock(db, [item.medicine_id for item in items])
+    current = dict(db.query(Medicine.id, Medicine.version).filter(Medicine.id.in_(list(available))).all())
+    
+    # Work out the new available stock levels
+    new_stock = {}
+    for item in items:
+        if item.medicine_id not in current:
+            result["errors"].append({"medicine_id": item.medicine_id, "error": "Medicine not found"})
+            continue
+        version = current[item.medicine_id]
+        stock = available[item.medicine_id]
+        if item.expected_version is not None and item.expected_version != version:
+            result["errors"].append({
+                "medicine_id": item.medicine_id,
+                "error": f"Version mismatch: expected {item.expected_version}",
+                "version": version
+            })
+            continue
+        target = item.stock if item.stock is not None else stock + item.delta
+        if target < 0:
+            result["errors"].append({
+                "medicine_id": item.medicine_id,
+                "error": f"Stock cannot go below zero (current {stock}, delta {item.delta})",
+                "version": version
+            })
+            continue
+        if target == stock:
+            result["unchanged"] += 1
+            continue
+        new_stock[item.medicine_id] = (stock, target)
+    
+    if not new_stock:
+        db.commit()
+        return
+    
+    # Update every row in one statement; the rows are locked, so the versions
+    # we read still hold and the guard only matters where locks are unsupported
+    rows = db.execute(
+        update(Medicine)
+        .where(tuple_(Medicine.id, Medicine.version).in_(
+            [(medicine_id, current[medicine_id]) for medicine_id in new_stock]
+        ))
+        .values(
+            stock=Medicine.stock + case(
+                {medicine_id: target - stock for medicine_id, (stock, target) in new_stock.items()},
+                value=Medicine.id
+            ),
+            version=Medicine.version + 1,
+            updated_at=datetime.utcnow()
+        )
+        .returning(Medicine.id, Medicine.version)
+        .execution_options(synchronize_session=False)
+    ).all()
+    updated = dict(rows)
+    spread_over_shards(db, {medicine_id: target for medicine_id, (_, target) in new_stock.items() if medicine_id in updated})
+    
+    # Record the applied differences in the ledger
+    record_movements(db, [
+        {
+            "medicine_id": medicine_id,
+            "quantity": target - stock,
+            "reason": RESTOCK if target > stock else ADJUSTMENT,
+            "created_by": user_id,
+            "notes": "Bulk stock update"
+        }
+        for medicine_id, (stock, target) in new_stock.items() if medicine_id in updated
+    ], applied=True)
+    db.commit()
+    
+    for medicine_id, (stock, target) in new_stock.items():
+        if medicine_id in updated:
+            result["changes"].append({
+                "medicine_id": medicine_id,
+                "previous_stock": stock,
+                "stock": target,
+                "version": updated[medicine_id]
+            })
+        else:
+            result["errors"].append({"medicine_id": medicine_id, "error": "Stock changed concurrently"})
+    result["updated"] += len(updated)
+
+@router.patch("/prices", response_model=PriceBulkResult)
+def bulk_update_prices(
+    bulk_update: PriceBulkUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Reprice many medicines at once, by explicit prices or a percentage (pharmacy admin only)"""
+    if bulk_update.percent is not None:
+        # One statement; the database rounds each new price to the cent
+        factor = 1 + bulk_update.percent / 100
+        statement = update(Medicine).values(
+            price=func.round(Medicine.price * factor, 2),
+            updated_at=datetime.utcnow()
+        )
+        if bulk_update.category_id is not None:
+            statement = statement.where(Medicine.category_id == bulk_update.category_id)
+        updated = db.execute(statement.execution_options(synchronize_session=False)).rowcount
+        db.commit()
+        return {"updated": updated}
+    
+    if len(bulk_update.items) > MAX_BULK_PRICE_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_PRICE_ITEMS} price updates can be sent at once"
+        )
+    
+    # The last price sent for a medicine wins
+    prices = {item.medicine_id: item.price for item in bulk_update.items}
+    medicine_ids = list(prices)
+    
+    # One UPDATE per batch, with each row's new price picked by a CASE on its id
+    updated_ids = set()
+    for start in range(0, len(medicine_ids), PRICE_BULK_BATCH_SIZE):
+        batch = medicine_ids[start:start + PRICE_BULK_BATCH_SIZE]
+        rows = db.execute(
+            update(Medicine)
+            .where(Medicine.id.in_(batch))
+            .values(
+                price=case({medicine_id: prices[medicine_id] for medicine_id in batch}, value=Medicine.id),
+                updated_at=datetime.utcnow()
+            )
+            .returning(Medicine.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        updated_ids.update(rows)
+    db.commit()
+    
+    return {
+        "updated": len(updated_ids),
+        "not_found": [medicine_id for medicine_id in medicine_ids if medicine_id not in updated_ids]
+    }
+
+@router.post("/import", response_model=CatalogImportResult, dependencies=[Depends(limit("upload"))])
+def import_medicines(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv or jsonl; inferred from the file name if omitted"),
+    dry_run: bool = False,
+    create_categories: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Bulk import medicines from CSV or JSON Lines (pharmacy admin only)"""
+    try:
+        catalog_format = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Stream the upload line by line instead of reading it into memory
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        return import_catalog(db, lines, catalog_format, dry_run=dry_run, create_categories=create_categories)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Catalog file must be UTF-8 encoded")
+    finally:
+        lines.detach()
+
+@router.get("/export")
+def export_medicines(
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Stream the whole catalog as CSV or JSON Lines (pharmacy admin only)"""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_catalog(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=medicines.{format}"}
+    )
+
 @router.get("/{medicine_id}", response_model=MedicineSchema)
 def get_medicine(
     medicine_id: int,
     db: Session = Depends(get_db)
 ):
     """Get medicine by ID"""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+    def load():
+        medicine = db.query(Medicine).options(joinedload(Medicine.category)).filter(Medicine.id == medicine_id).first()
+        # Shared with the other waiting requests as a response model, not a session-bound row
+        return MedicineSchema.model_validate(medicine) if medicine else None
+
+    medicine = medicine_lookups.do(medicine_id, load)
     if not medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
@@ -90,9 +366,15 @@ async def update_medicine(
             raise HTTPException(status_code=404, detail="Category not found")
     
     # Update medicine fields if provided
-    for field, value in medicine_update.dict(exclude_unset=True).items():
+    update_data = medicine_update.dict(exclude_unset=True)
+    stock = update_data.pop("stock", None)
+    for field, value in update_data.items():
         setattr(db_medicine, field, value)
     
+    # Stock changes go through the ledger
+    if stock is not None:
+        set_stock(db, db_medicine, stock, user_id=current_user.id)
+    
     # Save image if provided
     if image:
         image_path = await save_medicine_image(image)
@@ -121,52 +403,6 @@ def delete_medicine(
     
     return None
 
-@router.get("/search", response_model=List[MedicineSchema])
-def search_medicines(
-    q: Optional[str] = None,
-    category: Optional[int] = None,
-    prescription_required: Optional[bool] = None,
-    min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
-):
-    """Search medicines with filters"""
-    # Build query
-    query = db.query(Medicine)
-    
-    # Apply filters
-    filters = []
-    
-    if q:
-        filters.append(or_(
-            Medicine.name.ilike(f"%{q}%"),
-            Medicine.description.ilike(f"%{q}%"),
-            Medicine.manufacturer.ilike(f"%{q}%")
-        ))
-    
-    if category:
-        filters.append(Medicine.category_id == category)
-    
-    if prescription_required is not None:
-        filters.append(Medicine.prescription_required == prescription_required)
-    
-    if min_price is not None:
-        filters.append(Medicine.price >= min_price)
-    
-    if max_price is not None:
-        filters.append(Medicine.price <= max_price)
-    
-    # Apply filters to query
-    if filters:
-        query = query.filter(and_(*filters))
-    
-    # Get results with pagination
-    medicines = query.offset(skip).limit(limit).all()
-    
-    return medicines
-
 @router.get("/{medicine_id}/alternatives", response_model=List[MedicineSchema])
 def get_alternative_medicines(
     medicine_id: int,
@@ -179,7 +415,7 @@ def get_alternative_medicines(
         raise HTTPException(status_code=404, detail="Medicine not found")
     
     # Get alternatives from same category
-    alternatives = db.query(Medicine).filter(
+    alternatives = db.query(Medicine).options(joinedload(Medicine.category)).filter(
         Medicine.category_id == medicine.category_id,
         Medicine.id != medicine.id
     ).all()
@@ -199,10 +435,37 @@ def update_medicine_stock(
     if not db_medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
-    # Update stock
-    db_medicine.stock = stock_update.stock
+    # Update stock, recording the difference in the ledger
+    set_stock(db, db_medicine, stock_update.stock, user_id=current_user.id)
     
     db.commit()
     db.refresh(db_medicine)
     
-    return db_medicine 
\ No newline at end of file
+    return db_medicine
+
+@router.get("/{medicine_id}/stock-movements", response_model=StockLedger)
+def get_stock_movements(
+    medicine_id: int,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Stock balance and movement history, newest first (pharmacy admin only)"""
+    # Get medicine
+    db_medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+    if not db_medicine:
+        raise HTTPException(status_code=404, detail="Medicine not found")
+    
+    pending = pending_stock(db, [medicine_id]).get(medicine_id, 0)
+    movements = db.query(StockMovement).filter(
+        StockMovement.medicine_id == medicine_id
+    ).order_by(StockMovement.created_at.desc(), StockMovement.id.desc()).offset(skip).limit(limit).all()
+    
+    return {
+        "medicine_id": medicine_id,
+        "stock": db_medicine.stock,
+        "pending": pending,
+        "available": db_medicine.stock + pending,
+        "movements": movements
+    }
@@ -1,26 +1,113 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Header, Response
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy import update, insert, tuple_, func
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 from app.database.database import get_db
-from app.models.models import Order, OrderItem, OrderTracking, Cart, CartItem, Medicine, Address, User
-from app.schemas.order_schemas import Order as OrderSchema, OrderCreate, OrderStatusUpdate, DeliveryProof, OrderTracking as OrderTrackingSchema
+from app.database.replicas import get_read_db
+from app.models.models import Order, OrderItem, OrderTracking, ArchivedOrder, ArchivedOrderItem, Cart, CartItem, Medicine, Address, User
+from app.schemas.order_schemas import Order as OrderSchema, OrderSummary, OrderCreate, OrderStatusUpdate, OrderStatusBulkUpdate, OrderStatusBulkResult, OrderCancel, OrderCancelRequest, DeliveryProof, OrderTracking as OrderTrackingSchema
 from app.utils.auth import get_current_active_user, get_pharmacy_admin, get_delivery_partner
 from app.utils.file_upload import save_delivery_proof
-from app.routers.cart import calculate_cart_total
+from app.utils.rate_limit import limit
+from app.utils.expand import parse_expand
+from app.utils.entitlements import load_entitlements, check_prescription_coverage, invalidate_entitlements
+from app.utils.order_status import PENDING, PROCESSING, DELIVERED, OUT_FOR_DELIVERY, CANCELLED, validate_status, validate_status_transition, get_transition_error
+from app.utils.order_archive import user_order_page
+from app.utils.idempotency import begin_idempotent_request, complete_idempotent_request
+from app.utils.stock_ledger import RESERVATION, take_stock, record_movements, release_order_stock
+from app.routers.cart import cart_totals
 
 router = APIRouter()
 
+# Maximum number of orders in one bulk status update
+MAX_BULK_STATUS_ORDERS = 1000
+
+# Statuses a customer can still cancel from
+CUSTOMER_CANCELLABLE_STATUSES = [PENDING, PROCESSING]
+
+# Nested objects the order list can include with ?expand=
+ORDER_EXPAND_FIELDS = ["items", "tracking_updates", "address"]
+
+def order_response_options():
+    """Eager loads for returning a full order (items with medicines, tracking, address)"""
+    return [
+        selectinload(Order.items).joinedload(OrderItem.medicine).joinedload(Medicine.category),
+        selectinload(Order.tracking_updates),
+        joinedload(Order.address)
+    ]
+
+def load_order(db: Session, order_id: int):
+    """Get an order with everything OrderSchema serializes"""
+    return db.query(Order).options(*order_response_options()).filter(Order.id == order_id).first()
+
+def load_archived_order(db: Session, order_id: int):
+    """Get an archived order with everything OrderSchema serializes"""
+    return db.query(ArchivedOrder).options(
+        selectinload(ArchivedOrder.items).joinedload(ArchivedOrderItem.medicine).joinedload(Medicine.category),
+        joinedload(ArchivedOrder.address)
+    ).filter(ArchivedOrder.id == order_id).first()
+
+def order_summary(order: Order, items_count: int, expand_fields):
+    """Build an order list entry with only the requested nested objects"""
+    summary = {
+        "id": order.id,
+        "user_id": order.user_id,
+        "address_id": order.address_id,
+        "subtotal_amount": order.subtotal_amount,
+        "discount_amount": order.discount_amount,
+        "tax_amount": order.tax_amount,
+        "total_amount": order.total_amount,
+        "status": order.status,
+        "payment_status": order.payment_status,
+        "payment_method": order.payment_method,
+        "created_at": order.created_at,
+        "estimated_delivery_time": order.estimated_delivery_time,
+        "actual_delivery_time": order.actual_delivery_time,
+        "items_count": items_count
+    }
+    
+    if "items" in expand_fields:
+        summary["items"] = [
+            {
+                "id": item.id,
+                "medicine_id": item.medicine_id,
+                "medicine_name": item.medicine.name if item.medicine else None,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "prescription_id": item.prescription_id
+            }
+            for item in order.items
+        ]
+    
+    if "tracking_updates" in expand_fields:
+        summary["tracking_updates"] = order.tracking_updates
+    
+    if "address" in expand_fields:
+        summary["address"] = order.address
+    
+    return summary
+
 @router.post("", response_model=OrderSchema)
 def create_order(
     order_data: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create order from cart with delivery details"""
-    # Get user's cart
-    cart = db.query(Cart).filter(Cart.user_id == current_user.id).first()
+    # A retried request with the same Idempotency-Key gets the original response
+    idempotency_record = None
+    if idempotency_key:
+        idempotency_record, replay = begin_idempotent_request(db, current_user.id, idempotency_key, order_data)
+        if replay:
+            return replay
+    
+    # Get user's cart with items and medicines
+    cart = db.query(Cart).options(
+        selectinload(Cart.items).joinedload(CartItem.medicine)
+    ).filter(Cart.user_id == current_user.id).first()
     if not cart or not cart.items:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
@@ -33,14 +120,28 @@ def create_order(
     if not address:
         raise HTTPException(status_code=404, detail="Address not found")
     
-    # Calculate total amount
-    total_amount = calculate_cart_total(cart)
+    # Check prescriptions still cover every prescription item, against a fresh index
+    entitlements = load_entitlements(db, current_user.id)
+    for cart_item in cart.items:
+        if cart_item.medicine.prescription_required and not cart_item.prescription_id:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{cart_item.medicine.name} requires a prescription"
+            )
+        if cart_item.prescription_id:
+            check_prescription_coverage(
+                db, current_user.id, cart_item.medicine_id, cart_item.quantity,
+                cart_item.prescription_id, entitlements=entitlements
+            )
+    
+    # Subtotal, discount, tax and total, computed in exact decimals
+    totals = cart_totals(db, cart.id)
     
     # Create order
     new_order = Order(
         user_id=current_user.id,
         address_id=order_data.address_id,
-        total_amount=total_amount,
+        **totals,
         payment_method=order_data.payment_method,
         delivery_notes=order_data.delivery_notes,
         estimated_delivery_time=datetime.utcnow() + timedelta(minutes=30)  # Default 30 min delivery
@@ -49,15 +150,19 @@ def create_order(
     db.add(new_order)
     db.flush()  # Get order ID without committing
     
+    # Take the stock under row locks, so no other checkout reserves the same units before we commit
+    short = take_stock(db, {cart_item.medicine_id: cart_item.quantity for cart_item in cart.items})
+    
     # Create order items from cart items
+    reservations = []
     for cart_item in cart.items:
         # Check if medicine is in stock
-        medicine = db.query(Medicine).filter(Medicine.id == cart_item.medicine_id).first()
-        if medicine.stock < cart_item.quantity:
+        medicine = cart_item.medicine
+        if medicine.id in short:
             db.rollback()
             raise HTTPException(
                 status_code=400,
-                detail=f"Not enough stock for {medicine.name}. Available: {medicine.stock}"
+                detail=f"Not enough stock for {medicine.name}. Available: {max(short[medicine.id], 0)}"
             )
         
         # Create order item
@@ -69,15 +174,23 @@ def create_order(
             prescription_id=cart_item.prescription_id
         )
         
-        # Update medicine stock
-        medicine.stock -= cart_item.quantity
+        # Reserve stock in the ledger; the roll-up applies it to the medicine later
+        reservations.append({
+            "medicine_id": medicine.id,
+            "quantity": -cart_item.quantity,
+            "reason": RESERVATION,
+            "order_id": new_order.id,
+            "created_by": current_user.id
+        })
         
         db.add(order_item)
     
+    record_movements(db, reservations)
+    
     # Create initial order tracking
     tracking = OrderTracking(
         order_id=new_order.id,
-        status="pending",
+        status=PENDING,
         updated_by=current_user.id,
         notes="Order placed"
     )
@@ -87,25 +200,241 @@ def create_order(
     # Clear cart
     db.query(CartItem).filter(CartItem.cart_id == cart.id).delete()
     
+    # Store the response with the order, so a retry never creates a second one
+    if idempotency_record:
+        db.flush()
+        body = OrderSchema.model_validate(load_order(db, new_order.id)).model_dump_json()
+        complete_idempotent_request(idempotency_record, status.HTTP_200_OK, body)
+    
     # Commit all changes
     db.commit()
-    db.refresh(new_order)
     
-    return new_order
+    # Prescription quantities were consumed by this order
+    invalidate_entitlements(current_user.id)
+    
+    if idempotency_record:
+        return Response(content=body, media_type="application/json")
+    return load_order(db, new_order.id)
 
-@router.get("", response_model=List[OrderSchema])
+@router.get("", response_model=List[OrderSummary], response_model_exclude_unset=True)
 def get_user_orders(
     skip: int = 0,
     limit: int = 100,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get user's orders with delivery status (?expand=items,tracking_updates,address for nested objects)"""
+    expand_fields = parse_expand(expand, ORDER_EXPAND_FIELDS)
+    
+    # Which orders make up this page, from the live tables and the archive
+    page = user_order_page(db, current_user.id, skip, limit)
+    if not page:
+        return []
+    
+    orders = {}
+    items_counts = {}
+    for model, item_model, archived in ((Order, OrderItem, False), (ArchivedOrder, ArchivedOrderItem, True)):
+        order_ids = [order_id for order_id, is_archived in page if is_archived == archived]
+        if not order_ids:
+            continue
+        
+        # Load only the nested objects that were asked for
+        query = db.query(model).filter(model.id.in_(order_ids))
+        if "items" in expand_fields:
+            query = query.options(
+                selectinload(model.items).joinedload(item_model.medicine).load_only(Medicine.name)
+            )
+        if "tracking_updates" in expand_fields and not archived:
+            query = query.options(selectinload(Order.tracking_updates))
+        if "address" in expand_fields:
+            query = query.options(joinedload(model.address))
+        orders.update(((archived, order.id), order) for order in query.all())
+        
+        # Count items for the tier's share of the page in one query
+        items_counts.update(((archived, order_id), count) for order_id, count in db.query(
+            item_model.order_id, func.count(item_model.id)
+        ).filter(item_model.order_id.in_(order_ids)).group_by(item_model.order_id).all())
+    
+    return [
+        order_summary(orders[key], items_counts.get(key, 0), expand_fields)
+        for key in ((archived, order_id) for order_id, archived in page) if key in orders
+    ]
+
+def transition_orders(
+    db: Session,
+    order_ids: List[int],
+    new_status: str,
+    current_user,
+    notes: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    allowed_from: Optional[List[str]] = None
+):
+    """Move orders to new_status in one transaction and return per-order results
+    
+    Orders are updated with a single statement and tracked with a single
+    insert; cancelled orders release their stock in one ledger insert.
+    Pass owner_id to restrict the update to one customer's orders.
+    """
+    # Load current statuses in one query
+    query = db.query(Order.id, Order.status, Order.user_id).filter(Order.id.in_(order_ids))
+    if owner_id is not None:
+        query = query.filter(Order.user_id == owner_id)
+    current = {order_id: (order_status, user_id) for order_id, order_status, user_id in query.all()}
+    current_statuses = {order_id: order_status for order_id, (order_status, _) in current.items()}
+    
+    # Validate each transition against the state machine
+    errors = {}
+    transitions = []
+    for order_id in order_ids:
+        if order_id not in current_statuses:
+            errors[order_id] = "Order not found"
+            continue
+        error = get_transition_error(current_statuses[order_id], new_status)
+        if not error and allowed_from is not None and current_statuses[order_id] not in allowed_from:
+            error = f"Orders that are {current_statuses[order_id]} can no longer be changed to {new_status}"
+        if error:
+            errors[order_id] = error
+        else:
+            transitions.append((order_id, current_statuses[order_id]))
+    
+    updated_ids = set()
+    if transitions:
+        now = datetime.utcnow()
+        values = {"status": new_status, "updated_at": now}
+        
+        # If status is "out_for_delivery", assign delivery partner
+        if new_status == OUT_FOR_DELIVERY and current_user.is_delivery_partner:
+            values["delivery_partner_id"] = current_user.id
+        
+        # If status is "delivered", set actual delivery time
+        if new_status == DELIVERED:
+            values["actual_delivery_time"] = now
+        
+        # Update all orders in one statement; matching on the status we read
+        # skips orders that another request moved in the meantime
+        result = db.execute(
+            update(Order)
+            .where(tuple_(Order.id, Order.status).in_(transitions))
+            .values(**values)
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated_ids = set(result.scalars().all())
+        
+        # Create order tracking for every updated order in one insert
+        if updated_ids:
+            db.execute(insert(OrderTracking), [
+                {
+                    "order_id": order_id,
+                    "status": new_status,
+                    "timestamp": now,
+                    "updated_by": current_user.id,
+                    "notes": notes
+                }
+                for order_id, _ in transitions if order_id in updated_ids
+            ])
+        
+        # Return cancelled items to stock in the same transaction
+        if new_status == CANCELLED:
+            release_order_stock(db, updated_ids, user_id=current_user.id)
+        
+        db.commit()
+        
+        # Prescription quantities held by cancelled orders are free again
+        if new_status == CANCELLED:
+            for user_id in {current[order_id][1] for order_id in updated_ids}:
+                invalidate_entitlements(user_id)
+    
+    # Build per-order results in request order
+    results = []
+    for order_id in order_ids:
+        previous_status = current_statuses.get(order_id)
+        if order_id in updated_ids:
+            results.append(OrderStatusBulkResult(
+                order_id=order_id,
+                success=True,
+                previous_status=previous_status,
+                status=new_status
+            ))
+        else:
+            results.append(OrderStatusBulkResult(
+                order_id=order_id,
+                success=False,
+                previous_status=previous_status,
+                status=previous_status,
+                error=errors.get(order_id, "Order status changed concurrently")
+            ))
+    
+    return results
+
+def unique_order_ids(order_ids: List[int]):
+    """Remove duplicate IDs, keeping request order, and enforce the bulk limit"""
+    order_ids = list(dict.fromkeys(order_ids))
+    if len(order_ids) > MAX_BULK_STATUS_ORDERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_STATUS_ORDERS} orders can be updated at once"
+        )
+    return order_ids
+
+def cancel_scope(current_user, reason: Optional[str]):
+    """Customers may cancel their own orders until they leave the pharmacy; admins any order"""
+    if current_user.is_pharmacy_admin:
+        return {"notes": reason or "Cancelled by pharmacy"}
+    return {
+        "notes": reason or "Cancelled by customer",
+        "owner_id": current_user.id,
+        "allowed_from": CUSTOMER_CANCELLABLE_STATUSES
+    }
+
+@router.patch("/status", response_model=List[OrderStatusBulkResult])
+def bulk_update_order_status(
+    bulk_update: OrderStatusBulkUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Move many orders to a new status in one transaction (pharmacy/delivery partner)"""
+    # Check if user is authorized to update order status
+    if not (current_user.is_pharmacy_admin or current_user.is_delivery_partner):
+        raise HTTPException(status_code=403, detail="Not authorized to update order status")
+    
+    validate_status(bulk_update.status)
+    
+    order_ids = unique_order_ids(bulk_update.order_ids)
+    if not order_ids:
+        return []
+    
+    return transition_orders(db, order_ids, bulk_update.status, current_user, notes=bulk_update.notes)
+
+@router.post("/cancel", response_model=List[OrderStatusBulkResult])
+def cancel_orders(
+    cancel_request: OrderCancelRequest,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get user's orders with delivery status"""
-    orders = db.query(Order).filter(Order.user_id == current_user.id).order_by(
-        Order.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    """Cancel many orders at once and return their items to stock"""
+    order_ids = unique_order_ids(cancel_request.order_ids)
+    if not order_ids:
+        return []
     
-    return orders
+    return transition_orders(db, order_ids, CANCELLED, current_user, **cancel_scope(current_user, cancel_request.reason))
+
+@router.post("/{order_id}/cancel", response_model=OrderSchema)
+def cancel_order(
+    order_id: int,
+    cancel_request: Optional[OrderCancel] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Cancel an order and return its items to stock"""
+    reason = cancel_request.reason if cancel_request else None
+    result = transition_orders(db, [order_id], CANCELLED, current_user, **cancel_scope(current_user, reason))[0]
+    if not result.success:
+        status_code = 404 if result.previous_status is None else 400
+        raise HTTPException(status_code=status_code, detail=result.error)
+    
+    return load_order(db, order_id)
 
 @router.get("/{order_id}", response_model=OrderSchema)
 def get_order(
@@ -114,8 +443,8 @@ def get_order(
     current_user: User = Depends(get_current_active_user)
 ):
     """Get specific order details"""
-    # Get order
-    order = db.query(Order).filter(Order.id == order_id).first()
+    # Get order, from the archive if it has been moved there
+    order = load_order(db, order_id) or load_archived_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -137,45 +466,29 @@ def update_order_status(
     if not (current_user.is_pharmacy_admin or current_user.is_delivery_partner):
         raise HTTPException(status_code=403, detail="Not authorized to update order status")
     
-    # Get order
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    # Update order status
-    order.status = status_update.status
-    
-    # If status is "out_for_delivery", assign delivery partner
-    if status_update.status == "out_for_delivery" and current_user.is_delivery_partner:
-        order.delivery_partner_id = current_user.id
-    
-    # If status is "delivered", set actual delivery time
-    if status_update.status == "delivered":
-        order.actual_delivery_time = datetime.utcnow()
-    
-    # Create order tracking
-    tracking = OrderTracking(
-        order_id=order.id,
-        status=status_update.status,
-        updated_by=current_user.id,
-        notes=status_update.notes
-    )
+    validate_status(status_update.status)
     
-    db.add(tracking)
-    db.commit()
-    db.refresh(order)
+    # Go through the guarded update so concurrent changes, such as two
+    # cancels, cannot both apply and release the order's stock twice
+    result = transition_orders(db, [order_id], status_update.status, current_user, notes=status_update.notes)[0]
+    if not result.success:
+        status_code = 404 if result.previous_status is None else 400
+        raise HTTPException(status_code=status_code, detail=result.error)
     
-    return order
+    return load_order(db, order_id)
 
 @router.get("/{order_id}/track", response_model=List[OrderTrackingSchema])
 def track_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Real-time order tracking"""
     # Get order
     order = db.query(Order).filter(Order.id == order_id).first()
+    if not order:
+        # Archived orders keep their final timeline
+        order = db.query(ArchivedOrder).filter(ArchivedOrder.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -183,6 +496,9 @@ def track_order(
     if order.user_id != current_user.id and not (current_user.is_pharmacy_admin or current_user.is_delivery_partner):
         raise HTTPException(status_code=403, detail="Not authorized to track this order")
     
+    if isinstance(order, ArchivedOrder):
+        return order.tracking_updates
+    
     # Get tracking updates
     tracking_updates = db.query(OrderTracking).filter(
         OrderTracking.order_id == order_id
@@ -190,7 +506,7 @@ def track_order(
     
     return tracking_updates
 
-@router.post("/{order_id}/delivery-proof", response_model=OrderSchema)
+@router.post("/{order_id}/delivery-proof", response_model=OrderSchema, dependencies=[Depends(limit("upload"))])
 async def upload_delivery_proof(
     order_id: int,
     delivery_notes: Optional[str] = None,
@@ -208,17 +524,20 @@ async def upload_delivery_proof(
     if order.delivery_partner_id != current_user.id:
         raise HTTPException(status_code=403, detail="This order is not assigned to you")
     
+    # Check the order can be marked delivered
+    validate_status_transition(order.status, DELIVERED)
+    
     # Save proof image
     image_path = await save_delivery_proof(proof_image)
     
     # Update order status
-    order.status = "delivered"
+    order.status = DELIVERED
     order.actual_delivery_time = datetime.utcnow()
     
     # Create order tracking
     tracking = OrderTracking(
         order_id=order.id,
-        status="delivered",
+        status=DELIVERED,
         updated_by=current_user.id,
         notes=f"Delivery confirmed with proof. {delivery_notes or ''}",
         location=image_path  # Using location field to store image path
@@ -226,6 +545,5 @@ async def upload_delivery_proof(
     
     db.add(tracking)
     db.commit()
-    db.refresh(order)
     
-    return order 
\ No newline at end of file
+    return load_order(db, order.id) 
\ No newline at end of file
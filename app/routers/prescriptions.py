@@ -1,18 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_, func
 from typing import List
 from datetime import datetime, timedelta
+import os
 
 from app.database.database import get_db
 from app.models.models import Prescription, PrescriptionMedicine, Medicine
-from app.schemas.prescription_schemas import Prescription as PrescriptionSchema, PrescriptionUpdate, PrescriptionMedicine as PrescriptionMedicineSchema, PrescriptionMedicineCreate
+from app.schemas.prescription_schemas import Prescription as PrescriptionSchema, PrescriptionUpdate, PrescriptionMedicine as PrescriptionMedicineSchema, PrescriptionMedicineCreate, PrescriptionQueueStats
 from app.utils.auth import get_current_active_user, get_pharmacy_admin
 from app.models.models import User
 from app.utils.file_upload import save_prescription
+from app.utils.rate_limit import limit
+from app.utils.entitlements import invalidate_entitlements
 
 router = APIRouter()
 
-@router.post("/upload", response_model=PrescriptionSchema)
+# How long a pharmacist holds a claimed prescription before it returns to the queue
+PRESCRIPTION_LEASE_MINUTES = int(os.getenv("PRESCRIPTION_LEASE_MINUTES", "10"))
+
+def awaiting_review():
+    """Filter for prescriptions no pharmacist has reviewed yet"""
+    return [Prescription.is_verified == False, Prescription.verified_by == None]
+
+@router.post("/upload", response_model=PrescriptionSchema, dependencies=[Depends(limit("upload"))])
 async def upload_prescription(
     prescription_file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -43,12 +54,93 @@ def get_user_prescriptions(
     current_user: User = Depends(get_current_active_user)
 ):
     """Get user's prescriptions"""
-    prescriptions = db.query(Prescription).filter(
+    prescriptions = db.query(Prescription).options(
+        selectinload(Prescription.prescription_medicines)
+    ).filter(
         Prescription.user_id == current_user.id
     ).offset(skip).limit(limit).all()
     
     return prescriptions
 
+@router.post("/queue/claim", response_model=List[PrescriptionSchema])
+def claim_prescriptions(
+    batch_size: int = Query(1, ge=1, le=20),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Lease the oldest unreviewed prescriptions for verification (pharmacist only)"""
+    now = datetime.utcnow()
+    
+    # Lock free rows only, so concurrent pharmacists never receive the same prescription
+    prescriptions = db.query(Prescription).filter(
+        *awaiting_review(),
+        or_(Prescription.lease_expires_at == None, Prescription.lease_expires_at < now)
+    ).order_by(Prescription.created_at).limit(batch_size).with_for_update(skip_locked=True).all()
+    
+    # Lease them to this pharmacist
+    lease_expires_at = now + timedelta(minutes=PRESCRIPTION_LEASE_MINUTES)
+    for prescription in prescriptions:
+        prescription.lease_owner_id = current_user.id
+        prescription.lease_expires_at = lease_expires_at
+    
+    db.commit()
+    
+    return prescriptions
+
+@router.post("/queue/{prescription_id}/release", status_code=status.HTTP_204_NO_CONTENT)
+def release_prescription(
+    prescription_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Return a claimed prescription to the queue (pharmacist only)"""
+    # Get prescription
+    prescription = db.query(Prescription).filter(Prescription.id == prescription_id).first()
+    if not prescription:
+        raise HTTPException(status_code=404, detail="Prescription not found")
+    
+    if prescription.lease_owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="This prescription is not leased to you")
+    
+    # Clear lease
+    prescription.lease_owner_id = None
+    prescription.lease_expires_at = None
+    
+    db.commit()
+    
+    return None
+
+@router.get("/queue/stats", response_model=PrescriptionQueueStats)
+def get_prescription_queue_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_pharmacy_admin)
+):
+    """Get verification queue depth and review throughput (pharmacist only)"""
+    now = datetime.utcnow()
+    
+    # Queue depth
+    pending, leased, oldest_created_at = db.query(
+        func.count(Prescription.id),
+        func.count(Prescription.id).filter(Prescription.lease_expires_at >= now),
+        func.min(Prescription.created_at)
+    ).filter(*awaiting_review()).one()
+    
+    # Reviews completed in the last hour, per pharmacist
+    reviewed_by_pharmacist = dict(db.query(
+        Prescription.verified_by,
+        func.count(Prescription.id)
+    ).filter(
+        Prescription.verified_at >= now - timedelta(hours=1)
+    ).group_by(Prescription.verified_by).all())
+    
+    return {
+        "pending": pending,
+        "leased": leased,
+        "oldest_pending_seconds": (now - oldest_created_at).total_seconds() if oldest_created_at else None,
+        "reviewed_last_hour": sum(reviewed_by_pharmacist.values()),
+        "reviewed_last_hour_by_pharmacist": reviewed_by_pharmacist
+    }
+
 @router.get("/{prescription_id}", response_model=PrescriptionSchema)
 def get_prescription(
     prescription_id: int,
@@ -80,9 +172,23 @@ def verify_prescription(
     if not prescription:
         raise HTTPException(status_code=404, detail="Prescription not found")
     
+    # Check if another pharmacist is working on it
+    if (
+        prescription.lease_owner_id
+        and prescription.lease_owner_id != current_user.id
+        and prescription.lease_expires_at
+        and prescription.lease_expires_at > datetime.utcnow()
+    ):
+        raise HTTPException(status_code=409, detail="Prescription is being reviewed by another pharmacist")
+    
     # Update prescription
     prescription.is_verified = verification.is_verified
     prescription.verified_by = current_user.id
+    prescription.verified_at = datetime.utcnow()
+    
+    # Release lease
+    prescription.lease_owner_id = None
+    prescription.lease_expires_at = None
     
     # Set expiry date if not provided (default 30 days)
     if verification.expires_at:
@@ -93,6 +199,9 @@ def verify_prescription(
     db.commit()
     db.refresh(prescription)
     
+    # Rebuild the owner's entitlements on next use
+    invalidate_entitlements(prescription.user_id)
+    
     return prescription
 
 @router.post("/{prescription_id}/medicines", response_model=PrescriptionMedicineSchema)
@@ -125,6 +234,9 @@ def add_medicine_to_prescription(
     db.commit()
     db.refresh(db_prescription_medicine)
     
+    # Rebuild the owner's entitlements on next use
+    invalidate_entitlements(prescription.user_id)
+    
     return db_prescription_medicine
 
 @router.get("/{prescription_id}/medicines", response_model=List[PrescriptionMedicineSchema])
@@ -0,0 +1,83 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import date, datetime
+from app.utils.money import Money
+
+# Sales Schemas (read from the daily rollups, net of cancellations)
+class SalesTotals(BaseModel):
+    units_sold: int
+    units_cancelled: int
+    revenue: Money
+
+class TopSeller(SalesTotals):
+    medicine_id: int
+    name: str
+    category_id: Optional[int] = None
+
+class CategorySales(SalesTotals):
+    category_id: int
+    name: str
+
+class DailySales(SalesTotals):
+    day: date
+
+class SalesReport(BaseModel):
+    start_day: date
+    end_day: date
+    items: List[TopSeller]
+
+class CategoryReport(BaseModel):
+    start_day: date
+    end_day: date
+    items: List[CategorySales]
+
+class DailyReport(BaseModel):
+    start_day: date
+    end_day: date
+    medicine_id: Optional[int] = None
+    items: List[DailySales]
+
+# Inventory Schemas
+class InventoryCover(BaseModel):
+    medicine_id: int
+    name: str
+    stock: int
+    # Average units sold per day over the window
+    daily_velocity: float
+    days_of_cover: float
+
+class InventoryReport(BaseModel):
+    start_day: date
+    end_day: date
+    items: List[InventoryCover]
+
+# Low-Stock Alert Schemas
+class LowStockItem(BaseModel):
+    medicine_id: int
+    name: str
+    stock: int
+    # Exponentially weighted units sold per day
+    daily_rate: float
+    days_to_stockout: Optional[float] = None
+    alerted_at: Optional[datetime] = None
+
+class LowStockReport(BaseModel):
+    horizon_days: float
+    items: List[LowStockItem]
+
+class StockAlertEvent(BaseModel):
+    id: int
+    medicine_id: int
+    kind: str
+    stock: int
+    daily_rate: float
+    days_to_stockout: Optional[float] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class StockAlertFeed(BaseModel):
+    items: List[StockAlertEvent]
+    # Pass as after_id to fetch the next events
+    next_after_id: int
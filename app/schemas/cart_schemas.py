@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
 from app.schemas.medicine_schemas import Medicine
+from app.utils.money import Money
 
 # Cart Item Schemas
 class CartItemBase(BaseModel):
@@ -32,11 +33,38 @@ class Cart(CartBase):
     created_at: datetime
     updated_at: datetime
     items: List[CartItem] = []
-    total: Optional[float] = None
+    total: Optional[Money] = None
 
     class Config:
         from_attributes = True
 
+# Cart Item Summary Schema (medicine fields flattened; full medicine only when expanded)
+class CartItemSummary(BaseModel):
+    id: int
+    medicine_id: int
+    quantity: int
+    prescription_id: Optional[int] = None
+    name: str
+    price: Money
+    image_url: Optional[str] = None
+    stock: int
+    requires_prescription: bool
+    medicine: Optional[Medicine] = None
+
+# Cart Summary Schema
+class CartSummary(BaseModel):
+    id: int
+    user_id: int
+    updated_at: datetime
+    items_count: int
+    subtotal_amount: Money
+    discount_amount: Money
+    tax_amount: Money
+    # Same as total_amount; kept for existing clients
+    total: Money
+    total_amount: Money
+    items: List[CartItemSummary] = []
+
 # Cart Add Item Schema
 class CartAddItem(BaseModel):
     medicine_id: int
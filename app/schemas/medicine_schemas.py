@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List
 from datetime import datetime
+from decimal import Decimal
+from app.utils.money import Money
 
 # Category Schemas
 class CategoryBase(BaseModel):
@@ -12,7 +14,7 @@ class CategoryCreate(CategoryBase):
 
 class Category(CategoryBase):
     id: int
-    created_at: datetime
+    created_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -21,7 +23,7 @@ class Category(CategoryBase):
 class MedicineBase(BaseModel):
     name: str
     description: Optional[str] = None
-    price: float
+    price: Money = Field(ge=0)
     stock: int
     category_id: int
     prescription_required: bool = False
@@ -34,7 +36,7 @@ class MedicineCreate(MedicineBase):
 class MedicineUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
-    price: Optional[float] = None
+    price: Optional[Money] = Field(None, ge=0)
     stock: Optional[int] = None
     category_id: Optional[int] = None
     prescription_required: Optional[bool] = None
@@ -44,8 +46,66 @@ class MedicineUpdate(BaseModel):
 class StockUpdate(BaseModel):
     stock: int
 
+# Bulk Stock Update Schemas
+class StockBulkItem(BaseModel):
+    medicine_id: int
+    stock: Optional[int] = Field(None, ge=0)
+    delta: Optional[int] = None
+    expected_version: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_stock_or_delta(self):
+        if (self.stock is None) == (self.delta is None):
+            raise ValueError("Provide exactly one of stock or delta")
+        return self
+
+class StockBulkUpdate(BaseModel):
+    items: List[StockBulkItem]
+
+class StockChange(BaseModel):
+    medicine_id: int
+    previous_stock: int
+    stock: int
+    version: int
+
+class StockUpdateError(BaseModel):
+    medicine_id: int
+    error: str
+    version: Optional[int] = None
+
+class StockBulkResult(BaseModel):
+    updated: int
+    unchanged: int
+    failed: int
+    changes: List[StockChange] = []
+    errors: List[StockUpdateError] = []
+
+# Bulk Price Update Schemas
+class PriceBulkItem(BaseModel):
+    medicine_id: int
+    price: Money = Field(ge=0)
+
+class PriceBulkUpdate(BaseModel):
+    items: Optional[List[PriceBulkItem]] = None
+    # Percentage change applied to every medicine, or to one category's
+    percent: Optional[Decimal] = Field(None, gt=-100)
+    category_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_items_or_percent(self):
+        if (self.items is None) == (self.percent is None):
+            raise ValueError("Provide exactly one of items or percent")
+        if self.items is not None and self.category_id is not None:
+            raise ValueError("category_id only applies to percent updates")
+        return self
+
+class PriceBulkResult(BaseModel):
+    updated: int
+    not_found: List[int] = []
+
 class Medicine(MedicineBase):
     id: int
+    version: int = 1
     created_at: datetime
     updated_at: datetime
     category: Category
@@ -53,6 +113,54 @@ class Medicine(MedicineBase):
     class Config:
         from_attributes = True
 
+# Stock Ledger Schemas
+class StockMovement(BaseModel):
+    id: int
+    medicine_id: int
+    quantity: int
+    reason: str
+    order_id: Optional[int] = None
+    created_by: Optional[int] = None
+    notes: Optional[str] = None
+    created_at: datetime
+    rolled_up_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class StockLedger(BaseModel):
+    medicine_id: int
+    stock: int
+    pending: int
+    available: int
+    movements: List[StockMovement] = []
+
+# Catalog Import Schemas
+class MedicineImportRow(BaseModel):
+    id: Optional[int] = None
+    name: str
+    description: Optional[str] = None
+    price: Money = Field(ge=0)
+    stock: int = Field(ge=0)
+    category_id: Optional[int] = None
+    category: Optional[str] = None
+    prescription_required: bool = False
+    manufacturer: str
+    image_url: Optional[str] = None
+
+class CatalogImportError(BaseModel):
+    line: int
+    error: str
+
+class CatalogImportResult(BaseModel):
+    rows: int
+    created: int
+    upserted: int
+    failed: int
+    categories_created: int = 0
+    dry_run: bool = False
+    errors: List[CatalogImportError] = []
+
 # Medicine Search Query Params
 class MedicineSearchParams(BaseModel):
     q: Optional[str] = None
@@ -3,12 +3,13 @@ from typing import Optional, List
 from datetime import datetime
 from app.schemas.medicine_schemas import Medicine
 from app.schemas.user_schemas import Address
+from app.utils.money import Money, ZERO
 
 # Order Item Schemas
 class OrderItemBase(BaseModel):
     medicine_id: int
     quantity: int
-    unit_price: float
+    unit_price: Money
     prescription_id: Optional[int] = None
 
 class OrderItemCreate(OrderItemBase):
@@ -53,7 +54,10 @@ class OrderCreate(OrderBase):
 class Order(OrderBase):
     id: int
     user_id: int
-    total_amount: float
+    subtotal_amount: Money = ZERO
+    discount_amount: Money = ZERO
+    tax_amount: Money = ZERO
+    total_amount: Money
     status: str
     payment_status: str
     delivery_partner_id: Optional[int] = None
@@ -68,11 +72,64 @@ class Order(OrderBase):
     class Config:
         from_attributes = True
 
+# Order Item Summary Schema (medicine name only, no nested medicine)
+class OrderItemSummary(BaseModel):
+    id: int
+    medicine_id: int
+    medicine_name: Optional[str] = None
+    quantity: int
+    unit_price: Money
+    prescription_id: Optional[int] = None
+
+# Order Summary Schema for list endpoints; nested objects only when expanded
+class OrderSummary(BaseModel):
+    id: int
+    user_id: int
+    address_id: int
+    subtotal_amount: Money = ZERO
+    discount_amount: Money = ZERO
+    tax_amount: Money = ZERO
+    total_amount: Money
+    status: str
+    payment_status: str
+    payment_method: str
+    created_at: datetime
+    estimated_delivery_time: Optional[datetime] = None
+    actual_delivery_time: Optional[datetime] = None
+    items_count: int = 0
+    items: Optional[List[OrderItemSummary]] = None
+    tracking_updates: Optional[List[OrderTracking]] = None
+    address: Optional[Address] = None
+
+    class Config:
+        from_attributes = True
+
 # Order Status Update Schema
 class OrderStatusUpdate(BaseModel):
     status: str
     notes: Optional[str] = None
 
+# Bulk Order Status Update Schemas
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[int]
+    status: str
+    notes: Optional[str] = None
+
+class OrderStatusBulkResult(BaseModel):
+    order_id: int
+    success: bool
+    previous_status: Optional[str] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+# Order Cancellation Schemas
+class OrderCancel(BaseModel):
+    reason: Optional[str] = None
+
+class OrderCancelRequest(BaseModel):
+    order_ids: List[int]
+    reason: Optional[str] = None
+
 # Emergency Delivery Schema
 class EmergencyDelivery(BaseModel):
     address_id: int
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # Prescription Medicine Schemas
@@ -38,7 +38,19 @@ class Prescription(PrescriptionBase):
     verified_by: Optional[int] = None
     created_at: datetime
     expires_at: Optional[datetime] = None
+    is_expired: bool = False
+    verified_at: Optional[datetime] = None
+    lease_owner_id: Optional[int] = None
+    lease_expires_at: Optional[datetime] = None
     prescription_medicines: List[PrescriptionMedicine] = []
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+# Verification Queue Stats Schema
+class PrescriptionQueueStats(BaseModel):
+    pending: int
+    leased: int
+    oldest_pending_seconds: Optional[float] = None
+    reviewed_last_hour: int
+    reviewed_last_hour_by_pharmacist: Dict[int, int] = {}
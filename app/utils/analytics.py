@@ -0,0 +1,172 @@
+"""Sales rollups maintained from order events.
+
+Order reservations and cancellations in the stock ledger are added to the
+daily_medicine_sales and daily_category_sales tables as the stock roll-up
+folds them in, so reports never scan order history.
+
+Usage (rebuild the rollups from existing orders, e.g. after first deploying them):
+    python -m app.utils.analytics rebuild
+"""
+from collections import defaultdict
+import argparse
+import json
+import sys
+
+from sqlalchemy import case, delete, func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal
+from app.models.models import (
+    Medicine, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, StockMovement, DailyMedicineSales, DailyCategorySales
+)
+from app.utils.money import ZERO
+from app.utils.order_status import CANCELLED
+
+SALES_COLUMNS = ["units_sold", "units_cancelled", "revenue"]
+
+def upsert_increments(db: Session, model, rows):
+    """Add each row's sales columns to the existing rollup row, creating it if needed"""
+    if not rows:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    table = model.__table__
+    statement = dialect_insert(table).values(rows)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key.columns],
+        set_={column: table.c[column] + statement.excluded[column] for column in SALES_COLUMNS}
+    ))
+
+def record_order_events(db: Session, events, sign: int = 1):
+    """Add order events to the daily rollups (caller commits)
+
+    events are (medicine_id, order_id, quantity) tuples from the stock
+    ledger: a negative quantity is a sale, a positive one a cancellation.
+    Both are booked on the day the order was placed. sign=-1 takes the
+    events back out.
+    """
+    if not events:
+        return
+
+    order_ids = {order_id for _, order_id, _ in events}
+    medicine_ids = {medicine_id for medicine_id, _, _ in events}
+
+    # Price and order day of each line, and each medicine's category, in two queries
+    lines = {
+        (order_id, medicine_id): (unit_price, created_at.date())
+        for order_id, medicine_id, unit_price, created_at in db.query(
+            OrderItem.order_id, OrderItem.medicine_id, OrderItem.unit_price, Order.created_at
+        ).join(Order, OrderItem.order_id == Order.id).filter(OrderItem.order_id.in_(order_ids)).all()
+    }
+    categories = dict(db.query(Medicine.id, Medicine.category_id).filter(Medicine.id.in_(medicine_ids)).all())
+
+    medicine_totals = defaultdict(lambda: {"units_sold": 0, "units_cancelled": 0, "revenue": ZERO})
+    category_totals = defaultdict(lambda: {"units_sold": 0, "units_cancelled": 0, "revenue": ZERO})
+    for medicine_id, order_id, quantity in events:
+        line = lines.get((order_id, medicine_id))
+        if not line:
+            continue
+        unit_price, day = line
+
+        totals = [medicine_totals[(day, medicine_id)]]
+        if categories.get(medicine_id) is not None:
+            totals.append(category_totals[(day, categories[medicine_id])])
+        for total in totals:
+            total["units_sold"] -= sign * quantity
+            total["revenue"] -= sign * quantity * unit_price
+            if quantity > 0:
+                total["units_cancelled"] += sign * quantity
+
+    upsert_increments(db, DailyMedicineSales, [
+        {"day": day, "medicine_id": medicine_id, **total}
+        for (day, medicine_id), total in medicine_totals.items()
+    ])
+    upsert_increments(db, DailyCategorySales, [
+        {"day": day, "category_id": category_id, **total}
+        for (day, category_id), total in category_totals.items()
+    ])
+
+def rebuild_sales_rollups(db: Session):
+    """Recompute the rollups from all orders, archived ones included; return rows written
+
+    Order events still waiting for the stock roll-up are already reflected
+    in the orders, so they are taken back out here and added again when the
+    roll-up reaches them. Holding the roll-up lock keeps the two from
+    interleaving.
+    """
+    from app.utils.background import leader_lock
+    from app.utils.stock_ledger import STOCK_ROLLUP_LOCK_ID, ORDER_EVENT_REASONS
+
+    # One snapshot for the rebuild, so orders placed meanwhile are seen by neither query
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+    with leader_lock(STOCK_ROLLUP_LOCK_ID) as is_leader:
+        if not is_leader:
+            raise RuntimeError("The stock roll-up is running; try again shortly")
+
+        # Order lines from the live tables and the archive
+        lines = union_all(*[
+            select(
+                order_model.created_at, order_model.status,
+                item_model.medicine_id, item_model.quantity, item_model.unit_price
+            ).join(order_model, item_model.order_id == order_model.id)
+            for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+        ]).subquery()
+
+        day = func.date(lines.c.created_at)
+        cancelled = lines.c.status == CANCELLED
+        sales = [
+            func.sum(case((cancelled, 0), else_=lines.c.quantity)),
+            func.sum(case((cancelled, lines.c.quantity), else_=0)),
+            func.sum(case((cancelled, 0), else_=lines.c.quantity * lines.c.unit_price))
+        ]
+
+        db.execute(delete(DailyMedicineSales))
+        db.execute(delete(DailyCategorySales))
+        db.execute(insert(DailyMedicineSales).from_select(
+            ["day", "medicine_id", *SALES_COLUMNS],
+            select(day, lines.c.medicine_id, *sales)
+            .group_by(day, lines.c.medicine_id)
+        ))
+        db.execute(insert(DailyCategorySales).from_select(
+            ["day", "category_id", *SALES_COLUMNS],
+            select(day, Medicine.category_id, *sales)
+            .join(Medicine, lines.c.medicine_id == Medicine.id)
+            .where(Medicine.category_id != None)
+            .group_by(day, Medicine.category_id)
+        ))
+
+        pending = db.query(StockMovement.medicine_id, StockMovement.order_id, StockMovement.quantity).filter(
+            StockMovement.rolled_up_at == None,
+            StockMovement.order_id != None,
+            StockMovement.reason.in_(ORDER_EVENT_REASONS)
+        ).all()
+        record_order_events(db, pending, sign=-1)
+        db.commit()
+
+    return {
+        "daily_medicine_sales": db.query(func.count()).select_from(DailyMedicineSales).scalar(),
+        "daily_category_sales": db.query(func.count()).select_from(DailyCategorySales).scalar(),
+        "pending_order_events": len(pending)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="Recompute the sales rollups from all orders")
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(json.dumps(rebuild_sales_rollups(db), indent=2))
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
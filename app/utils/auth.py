@@ -1,11 +1,12 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
+import asyncio
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.database.supabase_client import db_service
+from app.database.supabase_client import async_db_service
 from app.schemas.user_schemas import TokenData
+from app.utils.single_flight import SingleFlight
 import os
 from dotenv import load_dotenv
 
@@ -17,22 +18,38 @@ SECRET_KEY = os.getenv("SECRET_KEY", "quickcommerce_secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Password hashing context, built on first use (passlib and bcrypt are slow to import)"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Concurrent lookups of the same user (e.g. one token used by parallel requests) share one Supabase call
+user_lookups = SingleFlight("user_by_email")
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+class CurrentUser(dict):
+    """User row from Supabase, readable as user["email"] or user.email"""
+    
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
 def verify_password(plain_password, hashed_password):
     """Verify password against hashed password"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     """Hash a password"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -42,21 +59,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_user_by_email(email: str):
+def token_subject(token: str):
+    """Subject (email) of a validly signed, unexpired access token, or None"""
+    from jose import JWTError, jwt
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+async def get_user_by_email(email: str):
     """Get user by email"""
-    return db_service.get_user_by_email(email)
+    return await user_lookups.do_async(email, lambda: async_db_service.get_user_by_email(email))
 
-def authenticate_user(email: str, password: str):
+async def authenticate_user(email: str, password: str):
     """Authenticate user with email and password"""
-    user = get_user_by_email(email)
+    user = await get_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user["hashed_password"]):
+    # bcrypt takes tens of milliseconds; keep it off the event loop
+    if not await asyncio.to_thread(verify_password, password, user["hashed_password"]):
         return False
     return user
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """Get current user from JWT token"""
+    from jose import JWTError, jwt
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -70,10 +97,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = get_user_by_email(email=token_data.email)
+    user = await get_user_by_email(email=token_data.email)
     if user is None:
         raise credentials_exception
-    return user
+    return CurrentUser(user)
 
 async def get_current_active_user(current_user = Depends(get_current_user)):
     """Get current active user"""
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.database.database import engine, SessionLocal
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Set to "false" to keep this process from running periodic jobs
+BACKGROUND_TASKS_ENABLED = os.getenv("BACKGROUND_TASKS_ENABLED", "true").lower() == "true"
+
+# On shutdown, seconds to let a job that is mid-run finish before the worker exits without it
+BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS", "20"))
+
+@contextmanager
+def leader_lock(lock_id: int):
+    """Yield True if this process holds the job's leader lock, False if another does"""
+    if engine.dialect.name == "postgresql":
+        # Session-level advisory lock on a dedicated connection, so the job's own commits keep it
+        with engine.connect() as connection:
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": lock_id}
+            ).scalar()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
+                    connection.commit()
+        return
+
+    if fcntl is None:
+        yield True
+        return
+
+    # Local databases: an exclusive file lock shared by the workers on this host
+    lock_path = os.path.join(tempfile.gettempdir(), f"quickcommerce-job-{lock_id}.lock")
+    with open(lock_path, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class PeriodicTask:
+    """A job run every interval seconds by whichever worker holds its leader lock"""
+
+    def __init__(self, name: str, job, interval_seconds: float, lock_id: int):
+        self.name = name
+        self.job = job
+        self.interval_seconds = interval_seconds
+        self.lock_id = lock_id
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at = None
+        self.last_report = None
+        self.last_error = None
+        self.task = None
+        self.current_run = None
+
+    def run_once(self):
+        """Run the job in a new session if this worker is leader; return its report"""
+        with leader_lock(self.lock_id) as is_leader:
+            if not is_leader:
+                return None
+
+            started = time.monotonic()
+            db = SessionLocal()
+            try:
+                report = self.job(db) or {}
+            finally:
+                db.close()
+
+            report["duration_seconds"] = round(time.monotonic() - started, 3)
+            return report
+
+    async def run_forever(self):
+        """Run the job every interval until cancelled"""
+        while True:
+            try:
+                # The run happens in a thread, which cancelling can't stop; shutdown waits for it instead
+                self.current_run = asyncio.ensure_future(asyncio.to_thread(self.run_once))
+                report = await asyncio.shield(self.current_run)
+                if report is not None:
+                    self.runs += 1
+                    self.last_run_at = datetime.utcnow()
+                    self.last_report = report
+                    self.last_error = None
+                    logger.info("Periodic task %s finished: %s", self.name, report)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.exception("Periodic task %s failed", self.name)
+            await asyncio.sleep(self.interval_seconds)
+
+# Registered periodic tasks
+periodic_tasks = []
+
+def register_periodic_task(name: str, job, interval_seconds: float, lock_id: int):
+    """Register a job to run in the background; job(db) returns a report dict"""
+    task = PeriodicTask(name, job, interval_seconds, lock_id)
+    periodic_tasks.append(task)
+    return task
+
+def start_background_tasks():
+    """Start all registered periodic tasks on the running event loop"""
+    if not BACKGROUND_TASKS_ENABLED:
+        return
+    for task in periodic_tasks:
+        if task.task is None:
+            task.task = asyncio.create_task(task.run_forever(), name=task.name)
+
+async def stop_background_tasks():
+    """Stop the periodic tasks, letting runs in progress finish within BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS"""
+    running = [task.task for task in periodic_tasks if task.task is not None]
+    for running_task in running:
+        running_task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+
+    # Jobs that were mid-run commit their batch rather than being cut off with the connection pool
+    in_progress = [task for task in periodic_tasks if task.current_run is not None and not task.current_run.done()]
+    if in_progress:
+        logger.info("Waiting for %s to finish", ", ".join(task.name for task in in_progress))
+        _, unfinished = await asyncio.wait(
+            [task.current_run for task in in_progress], timeout=BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS
+        )
+        if unfinished:
+            logger.warning(
+                "Shutting down while %s still running",
+                ", ".join(task.name for task in in_progress if task.current_run in unfinished)
+            )
+
+    for task in periodic_tasks:
+        task.task = None
+        task.current_run = None
@@ -0,0 +1,55 @@
+import threading
+import time
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire after ttl seconds"""
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get a cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        """Cache a value"""
+        with self._lock:
+            if len(self._data) >= self.max_size and key not in self._data:
+                self._evict()
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key):
+        """Drop a cached value"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_many(self, keys):
+        """Drop several cached values"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        """Drop all cached values"""
+        with self._lock:
+            self._data.clear()
+
+    def _evict(self):
+        """Remove expired entries, or the oldest one if none have expired"""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in expired:
+            del self._data[key]
+        if not expired and self._data:
+            del self._data[next(iter(self._data))]
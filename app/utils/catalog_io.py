@@ -0,0 +1,355 @@
+"""Bulk catalog import and export (CSV and JSON Lines).
+
+Usage:
+    python -m app.utils.catalog_io import catalog.csv [--dry-run] [--create-categories]
+    python -m app.utils.catalog_io export --format jsonl --output catalog.jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal
+from app.models.models import Medicine, Category
+from app.schemas.medicine_schemas import MedicineImportRow
+from app.utils.stock_ledger import set_stock_levels
+
+# Import settings
+IMPORT_BATCH_SIZE = int(os.getenv("CATALOG_IMPORT_BATCH_SIZE", "1000"))
+# Per-row errors returned in the result; the rest are only counted
+MAX_REPORTED_ERRORS = int(os.getenv("CATALOG_MAX_REPORTED_ERRORS", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("CATALOG_EXPORT_BATCH_SIZE", "2000"))
+
+CATALOG_FORMATS = ["csv", "jsonl"]
+EXPORT_COLUMNS = [
+    "id", "name", "description", "price", "stock", "category_id", "category",
+    "prescription_required", "manufacturer", "image_url"
+]
+# Columns an upsert overwrites on an existing medicine; stock changes go through the ledger instead
+UPSERT_COLUMNS = [
+    "name", "description", "price", "category_id", "prescription_required",
+    "manufacturer", "image_url", "updated_at"
+]
+
+def detect_format(filename: str = None, format: str = None):
+    """Catalog format from an explicit value or the file extension"""
+    if format:
+        if format not in CATALOG_FORMATS:
+            raise ValueError(f"Unsupported format '{format}'. Use one of: {', '.join(CATALOG_FORMATS)}")
+        return format
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    raise ValueError("Cannot tell the catalog format from the file name; pass csv or jsonl explicitly")
+
+def read_csv(lines):
+    """Yield (line, row, error) from CSV text lines; blank cells are treated as missing"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}, None
+
+def read_jsonl(lines):
+    """Yield (line, row, error) from JSON Lines text lines"""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, row, None
+
+def read_catalog(lines, format: str):
+    return read_csv(lines) if format == "csv" else read_jsonl(lines)
+
+def validation_message(error: ValidationError):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}" for item in error.errors()
+    )
+
+def upsert_statement(dialect_name: str, rows):
+    """Multi-row INSERT ... ON CONFLICT (id) DO UPDATE for rows that carry an ID"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise ValueError(f"Catalog upserts are not supported on {dialect_name}")
+
+    statement = dialect_insert(Medicine.__table__).values(rows)
+    set_ = {column: statement.excluded[column] for column in UPSERT_COLUMNS}
+    set_["version"] = Medicine.__table__.c.version + 1
+    return statement.on_conflict_do_update(index_elements=[Medicine.__table__.c.id], set_=set_)
+
+class CatalogImport:
+    """Validates catalog rows in batches and upserts each batch in one statement"""
+
+    def __init__(self, db: Session, batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False, create_categories: bool = False):
+        self.db = db
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.create_categories = create_categories
+        self.dialect_name = db.get_bind().dialect.name
+
+        self.load_categories()
+
+        self.rows = 0
+        self.created = 0
+        self.upserted = 0
+        self.failed = 0
+        self.categories_created = 0
+        self.errors = []
+        self.explicit_ids = False
+
+    def load_categories(self):
+        """Resolve categories from memory instead of a lookup per row"""
+        categories = self.db.query(Category.id, Category.name).all()
+        self.category_ids = {category_id for category_id, _ in categories}
+        self.category_names = {name.lower(): category_id for category_id, name in categories if name}
+
+    def add_error(self, line: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def run(self, records):
+        """Import (line, row, error) records; return the result summary"""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+        # Rows imported with explicit IDs bypass the PostgreSQL sequence
+        if self.explicit_ids and not self.dry_run and self.dialect_name == "postgresql":
+            self.db.execute(text(
+                "SELECT setval(pg_get_serial_sequence('medicines', 'id'), "
+                "GREATEST((SELECT MAX(id) FROM medicines), 1))"
+            ))
+            self.db.commit()
+
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "upserted": self.upserted,
+            "failed": self.failed,
+            "categories_created": self.categories_created,
+            "dry_run": self.dry_run,
+            "errors": self.errors
+        }
+
+    def validate_batch(self, batch):
+        """Validate rows and resolve categories; return valid (line, MedicineImportRow) pairs"""
+        valid = []
+        for line, row, error in batch:
+            self.rows += 1
+            if error:
+                self.add_error(line, error)
+                continue
+            try:
+                medicine = MedicineImportRow.model_validate(row)
+            except ValidationError as e:
+                self.add_error(line, validation_message(e))
+                continue
+
+            if medicine.category_id is not None:
+                if medicine.category_id not in self.category_ids:
+                    self.add_error(line, f"Category {medicine.category_id} not found")
+                    continue
+            elif not medicine.category:
+                self.add_error(line, "category or category_id is required")
+                continue
+            elif medicine.category.lower() not in self.category_names and not self.create_categories:
+                self.add_error(line, f"Category '{medicine.category}' not found")
+                continue
+
+            valid.append((line, medicine))
+        return valid
+
+    def ensure_categories(self, valid):
+        """Create the batch's unknown categories in one statement (on a dry run, only count them)"""
+        missing = {}
+        for _, medicine in valid:
+            if medicine.category_id is None and medicine.category.lower() not in self.category_names:
+                missing.setdefault(medicine.category.lower(), medicine.category)
+        if not missing:
+            return
+
+        if self.dry_run:
+            # Known from here on, so later batches don't count them again
+            for key in missing:
+                self.category_names[key] = None
+            self.categories_created += len(missing)
+            return
+
+        created = self.db.execute(
+            insert(Category).returning(Category.id, Category.name),
+            [{"name": name} for name in missing.values()]
+        ).all()
+        for category_id, name in created:
+            self.category_ids.add(category_id)
+            self.category_names[name.lower()] = category_id
+        self.categories_created += len(created)
+
+    def import_batch(self, batch):
+        valid = self.validate_batch(batch)
+        if not valid:
+            return
+
+        new_medicines = []
+        upsert_medicines = {}
+        superseded = []
+        for line, medicine in valid:
+            if medicine.id is None:
+                new_medicines.append(medicine)
+                continue
+            # One statement cannot touch the same row twice; the last row for an ID wins
+            if medicine.id in upsert_medicines:
+                previous_line, _ = upsert_medicines[medicine.id]
+                superseded.append((previous_line, f"Duplicate id {medicine.id}; superseded by line {line}"))
+            upsert_medicines[medicine.id] = (line, medicine)
+
+        if self.dry_run:
+            self.ensure_categories(valid)
+        else:
+            now = datetime.utcnow()
+            try:
+                self.ensure_categories(valid)
+                new_rows = [self.row_values(medicine, now) for medicine in new_medicines]
+                upsert_rows = [self.row_values(medicine, now) for _, medicine in upsert_medicines.values()]
+                if new_rows:
+                    for values in new_rows:
+                        del values["id"]
+                    self.db.execute(insert(Medicine.__table__).values(new_rows))
+                if upsert_rows:
+                    # Existing medicines get their stock under the ledger's row locks
+                    set_stock_levels(
+                        self.db, {values["id"]: values["stock"] for values in upsert_rows}, notes="Catalog import"
+                    )
+                    self.db.execute(upsert_statement(self.dialect_name, upsert_rows))
+                self.db.commit()
+            except SQLAlchemyError as e:
+                self.db.rollback()
+                # Categories created for this batch were rolled back too
+                self.load_categories()
+                message = f"Batch rejected by the database: {getattr(e, 'orig', e)}"
+                for line, _ in valid:
+                    self.add_error(line, message)
+                return
+            if upsert_rows:
+                self.explicit_ids = True
+
+        # Only once the batch is in, so a rejected batch reports each row once
+        for line, error in superseded:
+            self.add_error(line, error)
+        self.created += len(new_medicines)
+        self.upserted += len(upsert_medicines)
+
+    def row_values(self, medicine, now: datetime):
+        """Column values for a validated row, with its category resolved to an ID"""
+        values = medicine.model_dump(exclude={"category"})
+        if values["category_id"] is None:
+            values["category_id"] = self.category_names[medicine.category.lower()]
+        values["updated_at"] = now
+        values["created_at"] = now
+        return values
+
+def import_catalog(
+    db: Session,
+    lines,
+    format: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    dry_run: bool = False,
+    create_categories: bool = False
+):
+    """Stream CSV or JSON Lines text lines into the catalog; return counts and per-row errors"""
+    catalog_import = CatalogImport(db, batch_size=batch_size, dry_run=dry_run, create_categories=create_categories)
+    return catalog_import.run(read_catalog(lines, format))
+
+def export_catalog(format: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield the catalog as encoded CSV or JSON Lines chunks, one per batch"""
+    # The export outlives the request's session, so it uses its own
+    db = SessionLocal()
+    try:
+        columns = [getattr(Medicine, column) for column in EXPORT_COLUMNS if column != "category"]
+        statement = select(*columns, Category.name.label("category")).outerjoin(
+            Category, Medicine.category_id == Category.id
+        ).order_by(Medicine.id).execution_options(yield_per=batch_size)
+
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+            writer.writeheader()
+            yield buffer.getvalue().encode()
+
+        for partition in db.execute(statement).mappings().partitions():
+            if format == "csv":
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+                writer.writerows(partition)
+                yield buffer.getvalue().encode()
+            else:
+                yield b"".join(orjson.dumps(dict(row), default=float) + b"\n" for row in partition)
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import a CSV or JSON Lines catalog file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=CATALOG_FORMATS)
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    import_parser.add_argument("--dry-run", action="store_true", help="Validate only")
+    import_parser.add_argument("--create-categories", action="store_true", help="Create unknown categories by name")
+
+    export_parser = commands.add_parser("export", help="Export the catalog")
+    export_parser.add_argument("--format", choices=CATALOG_FORMATS, default="csv")
+    export_parser.add_argument("--output", help="File to write (default: stdout)")
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        format = detect_format(args.path, args.format)
+        db = SessionLocal()
+        try:
+            with open(args.path, encoding="utf-8-sig", newline="") as f:
+                result = import_catalog(
+                    db, f, format, batch_size=args.batch_size,
+                    dry_run=args.dry_run, create_categories=args.create_categories
+                )
+        finally:
+            db.close()
+        print(json.dumps(result, indent=2))
+        return 1 if result["failed"] else 0
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export_catalog(args.format):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+import os
+
+from fastapi import HTTPException
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.models.models import Prescription, PrescriptionMedicine, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from app.utils.cache import TTLCache
+from app.utils.order_status import CANCELLED
+
+# How long a user's entitlement index is reused before being rebuilt
+ENTITLEMENT_CACHE_SECONDS = float(os.getenv("ENTITLEMENT_CACHE_SECONDS", "300"))
+
+_entitlement_cache = TTLCache(ttl=ENTITLEMENT_CACHE_SECONDS)
+
+@dataclass
+class PrescriptionGrant:
+    """Quantity of one medicine granted, and still available, on one prescription"""
+    prescription_id: int
+    granted_quantity: int
+    remaining_quantity: int
+    expires_at: Optional[datetime] = None
+
+    def is_expired(self, now: datetime):
+        return self.expires_at is not None and self.expires_at < now
+
+    def is_exhausted(self):
+        return self.remaining_quantity <= 0
+
+    def is_usable(self, now: datetime):
+        return not self.is_expired(now) and not self.is_exhausted()
+
+@dataclass
+class Entitlement:
+    """Everything a user's verified prescriptions allow for one medicine"""
+    medicine_id: int
+    grants: Dict[int, PrescriptionGrant] = field(default_factory=dict)
+
+    def remaining_quantity(self, now: datetime):
+        return sum(
+            grant.remaining_quantity for grant in self.grants.values()
+            if grant.is_usable(now)
+        )
+
+    def expires_at(self, now: datetime):
+        expiries = [
+            grant.expires_at for grant in self.grants.values()
+            if grant.is_usable(now)
+        ]
+        if not expiries or None in expiries:
+            return None
+        return max(expiries)
+
+def build_entitlements(db: Session, user_id: int):
+    """Materialize medicine_id -> Entitlement from the user's verified prescriptions"""
+    now = datetime.utcnow()
+
+    # Quantities granted per prescription and medicine
+    granted = db.query(
+        PrescriptionMedicine.prescription_id,
+        PrescriptionMedicine.medicine_id,
+        func.sum(PrescriptionMedicine.quantity),
+        Prescription.expires_at
+    ).join(
+        Prescription, Prescription.id == PrescriptionMedicine.prescription_id
+    ).filter(
+        Prescription.user_id == user_id,
+        Prescription.is_verified == True,
+        or_(Prescription.expires_at == None, Prescription.expires_at >= now)
+    ).group_by(
+        PrescriptionMedicine.prescription_id,
+        PrescriptionMedicine.medicine_id,
+        Prescription.expires_at
+    ).all()
+
+    if not granted:
+        return {}
+
+    # Quantities already ordered against those prescriptions
+    prescription_ids = {prescription_id for prescription_id, _, _, _ in granted}
+    used = dict(
+        ((prescription_id, medicine_id), quantity)
+        for prescription_id, medicine_id, quantity in db.query(
+            OrderItem.prescription_id,
+            OrderItem.medicine_id,
+            func.sum(OrderItem.quantity)
+        ).join(
+            Order, Order.id == OrderItem.order_id
+        ).filter(
+            Order.user_id == user_id,
+            Order.status != CANCELLED,
+            OrderItem.prescription_id.in_(prescription_ids)
+        ).group_by(
+            OrderItem.prescription_id,
+            OrderItem.medicine_id
+        ).all()
+    )
+    # Archived orders used their prescriptions too
+    for prescription_id, medicine_id, quantity in db.query(
+        ArchivedOrderItem.prescription_id,
+        ArchivedOrderItem.medicine_id,
+        func.sum(ArchivedOrderItem.quantity)
+    ).join(
+        ArchivedOrder, ArchivedOrder.id == ArchivedOrderItem.order_id
+    ).filter(
+        ArchivedOrder.user_id == user_id,
+        ArchivedOrder.status != CANCELLED,
+        ArchivedOrderItem.prescription_id.in_(prescription_ids)
+    ).group_by(
+        ArchivedOrderItem.prescription_id,
+        ArchivedOrderItem.medicine_id
+    ).all():
+        used[(prescription_id, medicine_id)] = (used.get((prescription_id, medicine_id)) or 0) + (quantity or 0)
+
+    # Used-up grants stay in the index so coverage errors can say so
+    entitlements = {}
+    for prescription_id, medicine_id, quantity, expires_at in granted:
+        entitlement = entitlements.setdefault(medicine_id, Entitlement(medicine_id=medicine_id))
+        entitlement.grants[prescription_id] = PrescriptionGrant(
+            prescription_id=prescription_id,
+            granted_quantity=quantity or 0,
+            remaining_quantity=(quantity or 0) - (used.get((prescription_id, medicine_id)) or 0),
+            expires_at=expires_at
+        )
+
+    return entitlements
+
+def load_entitlements(db: Session, user_id: int):
+    """Rebuild and cache the user's entitlement index"""
+    entitlements = build_entitlements(db, user_id)
+    _entitlement_cache.set(user_id, entitlements)
+    return entitlements
+
+def get_entitlements(db: Session, user_id: int):
+    """Get the user's entitlement index, building it if not cached"""
+    entitlements = _entitlement_cache.get(user_id)
+    if entitlements is None:
+        entitlements = load_entitlements(db, user_id)
+    return entitlements
+
+def invalidate_entitlements(user_id: int):
+    """Drop the user's cached entitlement index"""
+    _entitlement_cache.invalidate(user_id)
+
+def find_coverage_error(entitlements, medicine_id: int, quantity: int, prescription_id: int):
+    """Return why the prescription does not cover quantity of the medicine, or None"""
+    now = datetime.utcnow()
+    entitlement = entitlements.get(medicine_id)
+    grant = entitlement.grants.get(prescription_id) if entitlement else None
+
+    if grant is None:
+        return "Prescription is not verified or does not cover this medicine"
+
+    if grant.is_expired(now):
+        return "Prescription has expired"
+
+    if grant.is_exhausted():
+        ordered = grant.granted_quantity - grant.remaining_quantity
+        return f"Prescription quantity exhausted (ordered {ordered} of {grant.granted_quantity})"
+
+    if grant.remaining_quantity < quantity:
+        return f"Prescription only covers {grant.remaining_quantity} more of this medicine"
+
+    return None
+
+def check_prescription_coverage(
+    db: Session,
+    user_id: int,
+    medicine_id: int,
+    quantity: int,
+    prescription_id: int,
+    entitlements=None
+):
+    """Raise unless the user's prescription covers quantity of the medicine"""
+    if entitlements is not None:
+        error = find_coverage_error(entitlements, medicine_id, quantity, prescription_id)
+    else:
+        error = find_coverage_error(get_entitlements(db, user_id), medicine_id, quantity, prescription_id)
+
+        # The cached index may predate a verification made through another worker
+        if error:
+            entitlements = load_entitlements(db, user_id)
+            error = find_coverage_error(entitlements, medicine_id, quantity, prescription_id)
+
+    if error:
+        raise HTTPException(status_code=400, detail=error)
@@ -0,0 +1,17 @@
+from typing import Optional
+from fastapi import HTTPException
+
+def parse_expand(expand: Optional[str], allowed):
+    """Parse a comma-separated ?expand= value into a set of allowed field names"""
+    if not expand:
+        return set()
+    
+    fields = {field.strip() for field in expand.split(",") if field.strip()}
+    unknown = fields - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot expand {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}"
+        )
+    
+    return fields
@@ -1,7 +1,6 @@
 import os
 import uuid
 from fastapi import UploadFile, HTTPException
-from PIL import Image
 import io
 
 # Upload directories
@@ -10,10 +9,6 @@ PRESCRIPTION_DIR = os.path.join(UPLOAD_DIR, "prescriptions")
 DELIVERY_PROOF_DIR = os.path.join(UPLOAD_DIR, "delivery_proofs")
 MEDICINE_IMAGES_DIR = os.path.join(UPLOAD_DIR, "medicines")
 
-# Create directories if they don't exist
-for directory in [PRESCRIPTION_DIR, DELIVERY_PROOF_DIR, MEDICINE_IMAGES_DIR]:
-    os.makedirs(directory, exist_ok=True)
-
 async def save_upload_file(upload_file: UploadFile, directory: str):
     """Save an uploaded file to the specified directory"""
     if not upload_file.filename:
@@ -31,14 +26,16 @@ async def save_upload_file(upload_file: UploadFile, directory: str):
     # Save file
     contents = await upload_file.read()
     
-    # Validate image file
+    # Validate image file (Pillow is imported on first upload, not at startup)
+    from PIL import Image
     try:
         image = Image.open(io.BytesIO(contents))
         image.verify()  # Verify it's a valid image
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid image file")
     
-    # Write file
+    # Write file, creating the directory on first upload
+    os.makedirs(directory, exist_ok=True)
     with open(file_path, "wb") as f:
         f.write(contents)
     
@@ -0,0 +1,133 @@
+"""Liveness and readiness checks.
+
+Liveness only shows the process is serving requests. Readiness pings the
+database (SELECT 1) and Supabase, and looks at the connection pool and the
+background jobs. Each ping runs at most once per HEALTH_CACHE_SECONDS per
+worker, with a HEALTH_CHECK_TIMEOUT_SECONDS limit, so frequent probes add
+almost no database load. When every pooled connection is in use the
+database ping is skipped rather than queued behind requests, and the worker
+reports not ready.
+"""
+import asyncio
+import inspect
+import os
+import time
+
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from app.database.database import engine
+from app.database.replicas import replica_status
+from app.database.supabase_client import async_db_service
+from app.utils.background import BACKGROUND_TASKS_ENABLED, periodic_tasks
+
+# Seconds a check result is reused before the next probe runs it again
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+
+# Seconds a ping may take before the dependency counts as down
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "2"))
+
+# Share of pooled connections in use at which the worker stops reporting ready
+HEALTH_POOL_SATURATION = float(os.getenv("HEALTH_POOL_SATURATION", "1.0"))
+
+STARTED_AT = time.time()
+
+def ping_database():
+    """SELECT 1 on the primary, cut off by the server after the check timeout"""
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            connection.execute(text(f"SET LOCAL statement_timeout = {int(HEALTH_CHECK_TIMEOUT_SECONDS * 1000)}"))
+        connection.execute(text("SELECT 1"))
+
+async def ping_supabase():
+    await async_db_service.ping()
+
+class CachedCheck:
+    """A dependency ping run at most once per HEALTH_CACHE_SECONDS, shared by concurrent probes"""
+
+    def __init__(self, name: str, ping):
+        self.name = name
+        self.ping = ping
+        self.result = None
+        self.checked_at = 0.0
+        self.running = None
+
+    async def run(self):
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(self.ping):
+                await self.ping()
+            else:
+                await asyncio.to_thread(self.ping)
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    async def get(self):
+        if self.result is not None and time.monotonic() - self.checked_at < HEALTH_CACHE_SECONDS:
+            return self.result
+        # A ping still running from an earlier probe is awaited again, not started twice
+        if self.running is None or self.running.done():
+            self.running = asyncio.ensure_future(self.run())
+        try:
+            self.result = await asyncio.wait_for(asyncio.shield(self.running), HEALTH_CHECK_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.result = {"ok": False, "error": f"No response within {HEALTH_CHECK_TIMEOUT_SECONDS}s"}
+        self.checked_at = time.monotonic()
+        return self.result
+
+database_check = CachedCheck("database", ping_database)
+supabase_check = CachedCheck("supabase", ping_supabase)
+
+def pool_status():
+    """Connections in use against the pool's capacity"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"ok": True, "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None}
+    # A negative max_overflow means the pool may grow without limit
+    capacity = pool.size() + pool._max_overflow if pool._max_overflow >= 0 else None
+    checked_out = pool.checkedout()
+    saturation = round(checked_out / capacity, 3) if capacity else 0.0
+    return {
+        "ok": saturation < HEALTH_POOL_SATURATION,
+        "checked_out": checked_out,
+        "capacity": capacity,
+        "saturation": saturation
+    }
+
+def background_status():
+    """Each periodic task's loop is running, with its last results in this worker"""
+    tasks = {}
+    for task in periodic_tasks:
+        alive = task.task is not None and not task.task.done()
+        tasks[task.name] = {
+            "ok": alive or not BACKGROUND_TASKS_ENABLED,
+            "running": alive,
+            "runs": task.runs,
+            "failures": task.failures,
+            "last_run_at": task.last_run_at.isoformat() if task.last_run_at else None,
+            "last_error": task.last_error
+        }
+    return {"ok": all(task["ok"] for task in tasks.values()), "enabled": BACKGROUND_TASKS_ENABLED, "tasks": tasks}
+
+def liveness():
+    return {"status": "alive", "pid": os.getpid(), "uptime_seconds": round(time.time() - STARTED_AT, 1)}
+
+async def readiness():
+    """(ready, report) for the readiness probe"""
+    pool = pool_status()
+    if pool["ok"]:
+        database = await database_check.get()
+    else:
+        # Every connection is busy serving requests; don't queue a ping behind them
+        database = {"ok": False, "error": "Connection pool saturated"}
+    checks = {
+        "database": database,
+        "supabase": await supabase_check.get(),
+        "pool": pool,
+        "background_tasks": background_status()
+    }
+    ready = all(check["ok"] for check in checks.values())
+    # Reads fall back to the primary when replicas are down, so they are reported but not required
+    checks["replicas"] = await asyncio.to_thread(replica_status)
+    return ready, {"status": "ready" if ready else "not_ready", **checks}
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+import hashlib
+import os
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.models import IdempotencyKey
+
+# How long a stored response is replayed for a retried request
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Response header marking a replayed response
+IDEMPOTENCY_REPLAYED_HEADER = "Idempotent-Replayed"
+
+def request_fingerprint(payload: BaseModel):
+    """Hash of the request body, to detect a key reused for a different request"""
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+def stored_response(record: IdempotencyKey):
+    """Replay a stored response"""
+    return Response(
+        content=record.response_body,
+        status_code=record.response_status,
+        media_type="application/json",
+        headers={IDEMPOTENCY_REPLAYED_HEADER: "true"}
+    )
+
+def find_stored_response(db: Session, user_id: int, key: str, fingerprint: str):
+    """Stored response for this user's key, or None if the request should run"""
+    record = db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key
+    ).first()
+    if not record:
+        return None
+
+    # Expired keys no longer protect anything; start over
+    if record.expires_at < datetime.utcnow():
+        db.delete(record)
+        db.flush()
+        return None
+
+    if record.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request"
+        )
+
+    return stored_response(record)
+
+def begin_idempotent_request(db: Session, user_id: int, key: str, payload: BaseModel):
+    """Claim an Idempotency-Key for this request
+
+    Returns (record, None) when the request should run; the caller stores
+    its response with complete_idempotent_request() before committing, so
+    the key and the result are saved atomically. Returns (None, response)
+    when the request already ran and its response should be replayed.
+    """
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+        )
+
+    fingerprint = request_fingerprint(payload)
+    replay = find_stored_response(db, user_id, key, fingerprint)
+    if replay:
+        return None, replay
+
+    now = datetime.utcnow()
+    record = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=fingerprint,
+        created_at=now,
+        expires_at=now + timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+    )
+    db.add(record)
+
+    # A concurrent request with the same key waits here until the first one
+    # finishes, then fails on the unique constraint and replays its response
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        replay = find_stored_response(db, user_id, key, fingerprint)
+        if replay:
+            return None, replay
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is already in progress"
+        )
+
+    return record, None
+
+def complete_idempotent_request(record: IdempotencyKey, status_code: int, body: str):
+    """Store the response to replay for retries (caller commits)"""
+    record.response_status = status_code
+    record.response_body = body
+
+def delete_expired_idempotency_keys(db: Session, now: datetime, batch_size: int, max_batches: int):
+    """Delete expired keys in chunks; return rows deleted"""
+    deleted = 0
+    for _ in range(max_batches):
+        key_ids = [
+            key_id for (key_id,) in db.query(IdempotencyKey.id).filter(
+                IdempotencyKey.expires_at < now
+            ).order_by(IdempotencyKey.id).limit(batch_size).all()
+        ]
+        if not key_ids:
+            break
+
+        deleted += db.query(IdempotencyKey).filter(
+            IdempotencyKey.id.in_(key_ids)
+        ).delete(synchronize_session=False)
+
+        db.commit()
+
+    return deleted
@@ -0,0 +1,237 @@
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statements-per-request buckets
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+def _format_labels(label_names, label_values, extra=None):
+    """Render Prometheus labels, e.g. {route="/orders",le="0.5"}"""
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, description: str, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative histogram with labels"""
+
+    def __init__(self, name: str, description: str, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', bound))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+# Registered metrics, rendered in this order
+registry = []
+
+def register(metric):
+    """Add a metric to the /metrics output"""
+    registry.append(metric)
+    return metric
+
+def render_metrics():
+    """Render all registered metrics in Prometheus text format"""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Request metrics
+request_duration = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+))
+request_db_statements = register(Histogram(
+    "http_request_db_statements", "SQL statements executed per request", ("route",), buckets=COUNT_BUCKETS
+))
+db_statements = register(Counter(
+    "db_statements_total", "SQL statements executed", ("route",)
+))
+db_statement_seconds = register(Counter(
+    "db_statement_seconds_total", "Time spent executing SQL statements", ("route",)
+))
+external_call_duration = register(Histogram(
+    "external_call_duration_seconds", "Latency of calls to external services", ("service", "operation")
+))
+
+class RequestStats:
+    """Work done while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.external_time = {}
+
+_request_stats = ContextVar("request_stats", default=None)
+
+def get_request_stats():
+    """Stats for the request being handled, or None outside a request"""
+    return _request_stats.get()
+
+def instrument_engine(engine):
+    """Count and time every SQL statement run through the engine"""
+
+    # The start time lives on the statement's execution context, so a statement
+    # that raises leaves nothing behind on the pooled connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_start_time = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_start_time", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_count += 1
+            stats.db_time += duration
+
+def record_external_call(service: str, operation: str, duration: float):
+    """Record time spent calling an external service"""
+    external_call_duration.observe(duration, service=service, operation=operation)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.external_time[service] = stats.external_time.get(service, 0.0) + duration
+
+def instrument_service(service: str):
+    """Class decorator that times every static method as a call to an external service"""
+    def decorate(cls):
+        for name, attribute in list(vars(cls).items()):
+            if isinstance(attribute, staticmethod) and not name.startswith("_") and name != "get_client":
+                setattr(cls, name, staticmethod(_timed(service, name, attribute.__func__)))
+        return cls
+    return decorate
+
+def _timed(service: str, operation: str, func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                record_external_call(service, operation, time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_external_call(service, operation, time.perf_counter() - started)
+    return wrapper
+
+def server_timing(stats: RequestStats, total: float):
+    """Build a Server-Timing header value from request stats"""
+    entries = [
+        f"app;dur={total * 1000:.1f}",
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_count} queries"'
+    ]
+    for service, duration in stats.external_time.items():
+        entries.append(f"{service};dur={duration * 1000:.1f}")
+    return ", ".join(entries)
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, SQL and external call time"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                total = time.perf_counter() - stats.started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(stats, total).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            duration = time.perf_counter() - stats.started
+            request_duration.observe(duration, method=scope["method"], route=route_path, status=status_code)
+            request_db_statements.observe(stats.db_count, route=route_path)
+            db_statements.inc(stats.db_count, route=route_path)
+            db_statement_seconds.inc(stats.db_time, route=route_path)
@@ -0,0 +1,39 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Annotated
+import os
+
+from pydantic import Field, PlainSerializer
+
+# Money is exact to the cent in the database and in Python; JSON carries it as a number
+Money = Annotated[
+    Decimal,
+    Field(decimal_places=2),
+    PlainSerializer(float, return_type=float, when_used="json")
+]
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+# Tax charged on the discounted subtotal, e.g. 0.05 for 5%
+TAX_RATE = Decimal(os.getenv("TAX_RATE", "0"))
+
+def to_money(value):
+    """Round an amount to the cent (half up), accepting Decimal, int, float or None"""
+    if value is None:
+        return ZERO
+    if not isinstance(value, Decimal):
+        # Floats go through str so 0.1 becomes 0.1, not 0.1000000000000000055...
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def price_breakdown(subtotal, discount=ZERO):
+    """Subtotal, discount, tax and total for an order or cart"""
+    subtotal = to_money(subtotal)
+    discount = min(to_money(discount), subtotal)
+    tax = to_money((subtotal - discount) * TAX_RATE)
+    return {
+        "subtotal_amount": subtotal,
+        "discount_amount": discount,
+        "tax_amount": tax,
+        "total_amount": subtotal - discount + tax
+    }
@@ -0,0 +1,182 @@
+"""Archival of old orders into the cold tier.
+
+Delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are moved
+from orders, order_items and order_tracking into archived_orders and
+archived_order_items, with each order's tracking timeline stored as one
+compressed blob. On PostgreSQL the archive tables are partitioned by month of
+order creation, so old months can be detached or dropped as a whole. The hot
+tables keep only recent and active orders; order history reads both tiers.
+
+Usage (archive now instead of waiting for the background job):
+    python -m app.utils.order_archive run
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import sys
+import zlib
+
+import orjson
+from sqlalchemy import delete, insert, literal, select, text, union_all
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.models import Order, OrderItem, OrderTracking, ArchivedOrder, ArchivedOrderItem, StockMovement
+from app.utils.background import register_periodic_task
+from app.utils.order_status import DELIVERED, CANCELLED
+
+# Archival settings
+ORDER_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ORDER_ARCHIVE_INTERVAL_SECONDS", "3600"))
+ORDER_ARCHIVE_AFTER_DAYS = float(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "90"))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", "500"))
+ORDER_ARCHIVE_MAX_BATCHES = int(os.getenv("ORDER_ARCHIVE_MAX_BATCHES", "20"))
+
+# Only orders that can no longer change are archived
+ARCHIVABLE_STATUSES = [DELIVERED, CANCELLED]
+
+# Advisory lock ID so only one worker archives at a time
+ORDER_ARCHIVE_LOCK_ID = 710004
+
+# Order columns copied to archived_orders as they are
+ARCHIVED_ORDER_COLUMNS = [
+    "id", "created_at", "user_id", "address_id", "subtotal_amount", "discount_amount", "tax_amount",
+    "total_amount", "status", "payment_status", "payment_method", "delivery_partner_id", "updated_at",
+    "estimated_delivery_time", "actual_delivery_time", "delivery_notes"
+]
+
+def month_start(moment: datetime):
+    return datetime(moment.year, moment.month, 1)
+
+def next_month(start: datetime):
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+def ensure_archive_partitions(db: Session, months):
+    """Create the monthly archive partitions for these months (PostgreSQL only)"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for start in sorted(months):
+        end = next_month(start)
+        for table in (ArchivedOrder.__tablename__, ArchivedOrderItem.__tablename__):
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table}_y{start.year}m{start.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+
+def compress_tracking(updates):
+    """zlib-compressed JSON of a tracking timeline, latest first"""
+    timeline = sorted(updates, key=lambda update: update.timestamp or datetime.min, reverse=True)
+    return zlib.compress(orjson.dumps([
+        {
+            "id": update.id,
+            "order_id": update.order_id,
+            "status": update.status,
+            "location": update.location,
+            "timestamp": update.timestamp,
+            "updated_by": update.updated_by,
+            "notes": update.notes
+        }
+        for update in timeline
+    ]))
+
+def archive_orders(db: Session, now: datetime = None):
+    """Move old delivered and cancelled orders to the cold tier in chunks; return rows moved"""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=ORDER_ARCHIVE_AFTER_DAYS)
+    orders_archived = 0
+    items_archived = 0
+    tracking_archived = 0
+
+    # Orders whose ledger movements are not rolled up yet are still needed by the roll-up
+    pending_movements = select(StockMovement.id).where(
+        StockMovement.order_id == Order.id,
+        StockMovement.rolled_up_at == None
+    ).exists()
+
+    for _ in range(ORDER_ARCHIVE_MAX_BATCHES):
+        order_ids = [
+            order_id for (order_id,) in db.query(Order.id).filter(
+                Order.status.in_(ARCHIVABLE_STATUSES),
+                Order.created_at < cutoff,
+                ~pending_movements
+            ).order_by(Order.id).limit(ORDER_ARCHIVE_BATCH_SIZE).with_for_update(skip_locked=True).all()
+        ]
+        if not order_ids:
+            break
+
+        orders = db.query(Order).options(
+            selectinload(Order.items), selectinload(Order.tracking_updates)
+        ).filter(Order.id.in_(order_ids)).all()
+        ensure_archive_partitions(db, {month_start(order.created_at) for order in orders})
+
+        db.execute(insert(ArchivedOrder), [
+            {
+                **{column: getattr(order, column) for column in ARCHIVED_ORDER_COLUMNS},
+                "tracking": compress_tracking(order.tracking_updates),
+                "archived_at": now
+            }
+            for order in orders
+        ])
+        items = [
+            {
+                "id": item.id,
+                "order_created_at": order.created_at,
+                "order_id": order.id,
+                "medicine_id": item.medicine_id,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "prescription_id": item.prescription_id
+            }
+            for order in orders for item in order.items
+        ]
+        if items:
+            db.execute(insert(ArchivedOrderItem), items)
+
+        tracking_archived += db.execute(
+            delete(OrderTracking).where(OrderTracking.order_id.in_(order_ids))
+        ).rowcount
+        items_archived += db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids))).rowcount
+        orders_archived += db.execute(delete(Order).where(Order.id.in_(order_ids))).rowcount
+        db.commit()
+        # The deleted rows are gone; don't let the session flush them again
+        db.expunge_all()
+
+    return {
+        "orders_archived": orders_archived,
+        "order_items_archived": items_archived,
+        "tracking_updates_archived": tracking_archived
+    }
+
+def user_order_page(db: Session, user_id: int, skip: int, limit: int):
+    """(order id, archived) for one page of a user's orders across both tiers, newest first"""
+    # Each tier contributes at most skip + limit rows, read from its (user_id, created_at) index
+    tiers = [
+        select(model.id, model.created_at, literal(archived).label("archived"))
+        .where(model.user_id == user_id)
+        .order_by(model.created_at.desc())
+        .limit(skip + limit)
+        .subquery()
+        for model, archived in ((Order, False), (ArchivedOrder, True))
+    ]
+    orders = union_all(*[select(tier) for tier in tiers]).subquery()
+    return db.execute(
+        select(orders.c.id, orders.c.archived)
+        .order_by(orders.c.created_at.desc(), orders.c.id.desc())
+        .offset(skip)
+        .limit(limit)
+    ).all()
+
+order_archive_task = register_periodic_task(
+    "order_archive", archive_orders, ORDER_ARCHIVE_INTERVAL_SECONDS, ORDER_ARCHIVE_LOCK_ID
+)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("run", help="Archive eligible orders now")
+    parser.parse_args()
+
+    print(json.dumps(order_archive_task.run_once(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
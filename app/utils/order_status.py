@@ -0,0 +1,40 @@
+from fastapi import HTTPException
+
+# Order statuses
+PENDING = "pending"
+PROCESSING = "processing"
+OUT_FOR_DELIVERY = "out_for_delivery"
+DELIVERED = "delivered"
+CANCELLED = "cancelled"
+
+ORDER_STATUSES = [PENDING, PROCESSING, OUT_FOR_DELIVERY, DELIVERED, CANCELLED]
+
+# Allowed transitions: current status -> statuses it may move to
+ORDER_STATUS_TRANSITIONS = {
+    PENDING: {PROCESSING, CANCELLED},
+    PROCESSING: {OUT_FOR_DELIVERY, CANCELLED},
+    OUT_FOR_DELIVERY: {DELIVERED, CANCELLED},
+    DELIVERED: set(),
+    CANCELLED: set(),
+}
+
+def validate_status(status: str):
+    """Ensure status is a known order status"""
+    if status not in ORDER_STATUS_TRANSITIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown order status '{status}'. Allowed: {', '.join(ORDER_STATUSES)}"
+        )
+
+def get_transition_error(current_status: str, new_status: str):
+    """Return why current_status cannot move to new_status, or None if it can"""
+    if new_status not in ORDER_STATUS_TRANSITIONS.get(current_status, set()):
+        return f"Cannot change order status from '{current_status}' to '{new_status}'"
+    return None
+
+def validate_status_transition(current_status: str, new_status: str):
+    """Raise if the order cannot move from current_status to new_status"""
+    validate_status(new_status)
+    error = get_transition_error(current_status, new_status)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
@@ -0,0 +1,154 @@
+import logging
+import os
+import re
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from app.database.database import engine
+from app.database.replicas import replicas
+
+logger = logging.getLogger(__name__)
+
+# Development settings
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "false").lower() == "true"
+# Identical statement shapes per request before it is reported as N+1
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+# Statements allowed per request (0 disables the budget)
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "0"))
+# Fail requests that exceed the budget instead of only logging them
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_whitespace = re.compile(r"\s+")
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r"\b\d+(?:\.\d+)?\b")
+_placeholder_list = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)")
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request or block runs more SQL statements than its budget"""
+
+def statement_shape(statement: str):
+    """Normalize a SQL statement so repeated lookups with different values compare equal"""
+    shape = _whitespace.sub(" ", statement).strip()
+    shape = _string_literal.sub("?", shape)
+    shape = _number_literal.sub("?", shape)
+    return _placeholder_list.sub("(?)", shape)
+
+def describe_repeats(shapes):
+    """Summarize the most repeated statement shapes"""
+    repeated = sorted(shapes.items(), key=lambda item: item[1], reverse=True)[:3]
+    return "; ".join(f"{count}x {shape[:120]}" for shape, count in repeated)
+
+def app_stack():
+    """Format the application frames of the current call stack"""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(APP_DIR) and not frame.filename.endswith("query_debug.py")
+    ]
+    return "".join(traceback.format_list(frames))
+
+class QueryTracker:
+    """Statements executed while handling one request"""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.total = 0
+        self.shapes = {}
+
+    @property
+    def route(self):
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(route, 'path', self.scope['path'])}"
+
+    def record(self, statement: str):
+        self.total += 1
+        shape = statement_shape(statement)
+        count = self.shapes.get(shape, 0) + 1
+        self.shapes[shape] = count
+
+        # Report each repeated shape once, with the code that triggered it
+        if count == QUERY_REPEAT_THRESHOLD:
+            logger.warning(
+                "Possible N+1 in %s: statement ran %d times\n  %s\n%s",
+                self.route, count, shape, app_stack()
+            )
+
+    def over_budget(self):
+        return QUERY_BUDGET and self.total > QUERY_BUDGET
+
+    def budget_message(self):
+        return (
+            f"{self.route} ran {self.total} SQL statements (budget {QUERY_BUDGET}). "
+            f"Most repeated: {describe_repeats(self.shapes)}"
+        )
+
+_tracker = ContextVar("query_tracker", default=None)
+
+# Statement lists of the query_budget() blocks enclosing the current context. Tasks
+# and threadpool calls started inside a block inherit it; other requests don't.
+_budget_blocks = ContextVar("query_budget_blocks", default=())
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.record(statement)
+    for block in _budget_blocks.get():
+        block.append(statement)
+
+def install_query_counter(bind=None):
+    """Count statements run through the engine (default: the primary and every replica) for query_budget() and debug mode"""
+    binds = [bind] if bind is not None else [engine] + [replica.engine for replica in replicas]
+    for bind in binds:
+        if not event.contains(bind, "before_cursor_execute", _before_cursor_execute):
+            event.listen(bind, "before_cursor_execute", _before_cursor_execute)
+
+@contextmanager
+def query_budget(max_statements: int):
+    """Fail if the block runs more than max_statements SQL statements, e.g. around a test request"""
+    install_query_counter()
+    statements = []
+    token = _budget_blocks.set(_budget_blocks.get() + (statements,))
+    try:
+        yield statements
+    finally:
+        _budget_blocks.reset(token)
+
+    if len(statements) > max_statements:
+        shapes = {}
+        for statement in statements:
+            shape = statement_shape(statement)
+            shapes[shape] = shapes.get(shape, 0) + 1
+        raise QueryBudgetExceeded(
+            f"Ran {len(statements)} SQL statements (budget {max_statements}). "
+            f"Most repeated: {describe_repeats(shapes)}"
+        )
+
+class QueryDebugMiddleware:
+    """ASGI middleware reporting N+1 patterns and requests over the query budget"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracker = QueryTracker(scope)
+        token = _tracker.set(tracker)
+
+        async def send_checked(message):
+            if message["type"] == "http.response.start" and tracker.over_budget():
+                if QUERY_BUDGET_STRICT:
+                    raise QueryBudgetExceeded(tracker.budget_message())
+                logger.warning(tracker.budget_message())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_checked)
+        finally:
+            _tracker.reset(token)
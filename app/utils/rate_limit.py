@@ -0,0 +1,315 @@
+"""Rate limiting and admission control for expensive endpoints.
+
+Each limited route has a policy with two parts:
+
+- A token bucket per client: the user of a valid access token, or the peer
+  IP address otherwise. Login and registration ignore credentials and use the
+  peer IP plus the submitted username, with a looser bucket for the IP as a
+  whole. Each bucket allows rate requests per second on average, up to burst
+  at once. Over the limit the request gets 429 with Retry-After.
+- Admission control: at most max_in_flight requests of the route run at once
+  in a worker, and at most max_in_flight_per_client for one client. Requests
+  are also turned away while the database pool is nearly exhausted
+  (ADMISSION_POOL_SATURATION), so a burst on one route can't starve the rest.
+  These get 503 with Retry-After.
+
+Buckets live in worker memory by default. Set RATE_LIMIT_BACKEND=sqlite to
+share them between the workers on a host through a SQLite file (a stand-in
+for a shared store such as Redis). In-flight counts are always per worker,
+since they protect that worker's own connection pool.
+
+The peer IP is the connection's address, or X-Forwarded-For when the
+connection comes from a proxy in FORWARDED_ALLOW_IPS.
+
+Use as a route dependency:
+    @router.post("/login", dependencies=[Depends(limit("login"))])
+"""
+import asyncio
+import hashlib
+import itertools
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from fastapi import HTTPException, Request
+
+from app.database.database import WORKER_CONNECTIONS
+from app.utils.auth import token_subject
+from app.utils.health import pool_status
+from app.utils.metrics import Counter, register
+from app.utils.server import available_cores
+
+logger = logging.getLogger(__name__)
+
+# Set to "false" to turn off rate limiting and admission control
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# Where token buckets are kept: "memory" (per worker) or "sqlite" (shared by the workers on a host)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv(
+    "RATE_LIMIT_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "quickcommerce-rate-limits.db")
+)
+
+# Clients tracked in memory before idle buckets are dropped
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+
+# Share of pooled database connections in use at which limited routes are turned away
+ADMISSION_POOL_SATURATION = float(os.getenv("ADMISSION_POOL_SATURATION", "0.9"))
+
+# Login and registration: bcrypt costs tens of milliseconds of CPU per attempt
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", "10"))
+LOGIN_BURST = int(os.getenv("LOGIN_BURST", "5"))
+LOGIN_MAX_IN_FLIGHT = int(os.getenv("LOGIN_MAX_IN_FLIGHT", str(available_cores() * 2)))
+# All usernames tried from one IP address together
+LOGIN_IP_RATE_PER_MINUTE = float(os.getenv("LOGIN_IP_RATE_PER_MINUTE", "60"))
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+
+# Search: pattern matching over the catalog holds a database connection for the whole query
+SEARCH_RATE_PER_SECOND = float(os.getenv("SEARCH_RATE_PER_SECOND", "5"))
+SEARCH_BURST = int(os.getenv("SEARCH_BURST", "20"))
+SEARCH_MAX_IN_FLIGHT = int(os.getenv("SEARCH_MAX_IN_FLIGHT", str(max(1, WORKER_CONNECTIONS // 2))))
+
+# Uploads: image processing and disk writes
+UPLOAD_RATE_PER_MINUTE = float(os.getenv("UPLOAD_RATE_PER_MINUTE", "20"))
+UPLOAD_BURST = int(os.getenv("UPLOAD_BURST", "5"))
+UPLOAD_MAX_IN_FLIGHT = int(os.getenv("UPLOAD_MAX_IN_FLIGHT", "8"))
+
+rate_limit_rejections = register(Counter(
+    "rate_limit_rejections_total", "Requests turned away by rate limiting or admission control", ("route", "reason")
+))
+
+class Policy:
+    """Limits for one group of routes
+
+    With ip_rate set, requests are counted by peer IP and submitted username
+    (for routes that take credentials rather than check them), and by the IP
+    alone at ip_rate and ip_burst.
+    """
+
+    def __init__(
+        self, name: str, rate: float, burst: int, max_in_flight: int, max_in_flight_per_client: int,
+        ip_rate: float = None, ip_burst: int = None
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_client = max_in_flight_per_client
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+
+POLICIES = {
+    "login": Policy(
+        "login", LOGIN_RATE_PER_MINUTE / 60, LOGIN_BURST, LOGIN_MAX_IN_FLIGHT, 2,
+        ip_rate=LOGIN_IP_RATE_PER_MINUTE / 60, ip_burst=LOGIN_IP_BURST
+    ),
+    "search": Policy("search", SEARCH_RATE_PER_SECOND, SEARCH_BURST, SEARCH_MAX_IN_FLIGHT, 4),
+    "upload": Policy("upload", UPLOAD_RATE_PER_MINUTE / 60, UPLOAD_BURST, UPLOAD_MAX_IN_FLIGHT, 2)
+}
+
+def refill(tokens: float, updated_at: float, now: float, rate: float, burst: int):
+    """Tokens in a bucket after refilling since updated_at"""
+    return min(burst, tokens + (now - updated_at) * rate)
+
+class MemoryBuckets:
+    """Token buckets in this worker's memory"""
+
+    def __init__(self, max_clients: int):
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate: float, burst: int):
+        """Take a token; return 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = refill(tokens, updated_at, now, rate, burst)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            if len(self._buckets) >= self.max_clients and key not in self._buckets:
+                self._drop_full(now, rate, burst)
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def _drop_full(self, now: float, rate: float, burst: int):
+        """Forget clients whose buckets have refilled (they behave as new), or the oldest if none have"""
+        full = [
+            key for key, (tokens, updated_at) in self._buckets.items()
+            if refill(tokens, updated_at, now, rate, burst) >= burst
+        ]
+        for key in full:
+            del self._buckets[key]
+        if not full and self._buckets:
+            del self._buckets[next(iter(self._buckets))]
+
+class SqliteBuckets:
+    """Token buckets in a SQLite file shared by the workers on this host"""
+
+    # Every this many requests, a worker deletes buckets idle for an hour (long since refilled)
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._requests = itertools.count(1)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, rate: float, burst: int):
+        """Take a token; return 0 if allowed, else seconds until one is available"""
+        # Wall-clock time, since the workers' monotonic clocks don't agree
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = refill(*row, now, rate, burst) if row else burst
+                allowed = tokens >= 1
+                connection.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, tokens - 1 if allowed else tokens, now)
+                )
+                if next(self._requests) % self.PRUNE_EVERY == 0:
+                    connection.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (now - 3600,))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            # A broken limiter shouldn't take the endpoints down with it
+            logger.warning("Rate limit store unavailable, allowing request: %s", e)
+            return 0
+        return 0 if allowed else (1 - tokens) / rate
+
+buckets = SqliteBuckets(RATE_LIMIT_SQLITE_PATH) if RATE_LIMIT_BACKEND == "sqlite" else MemoryBuckets(RATE_LIMIT_MAX_CLIENTS)
+
+class Admission:
+    """Requests of one policy running in this worker, in total and per client"""
+
+    def __init__(self, policy: Policy):
+        self.policy = policy
+        self.in_flight = 0
+        self.per_client = {}
+        self._lock = threading.Lock()
+
+    def enter(self, key):
+        """Admit a request; return None, or the reason it was turned away"""
+        with self._lock:
+            if self.in_flight >= self.policy.max_in_flight:
+                return "too_many_in_flight"
+            if self.per_client.get(key, 0) >= self.policy.max_in_flight_per_client:
+                return "client_in_flight"
+            self.in_flight += 1
+            self.per_client[key] = self.per_client.get(key, 0) + 1
+            return None
+
+    def leave(self, key):
+        with self._lock:
+            self.in_flight -= 1
+            remaining = self.per_client[key] - 1
+            if remaining:
+                self.per_client[key] = remaining
+            else:
+                del self.per_client[key]
+
+admissions = {name: Admission(policy) for name, policy in POLICIES.items()}
+
+def peer_ip(request: Request):
+    return request.client.host if request.client else "unknown"
+
+def request_client(request: Request):
+    """The client a request is counted against: the user of a valid access token, or the peer IP"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    # Only a verified token names a user; anything else would let a client pick its own bucket
+    subject = token_subject(token) if scheme.lower() == "bearer" and token else None
+    if subject:
+        return "user:" + subject
+    return "ip:" + peer_ip(request)
+
+async def submitted_username(request: Request):
+    """Username or email in a login form or registration body ("" if none); already parsed by FastAPI"""
+    try:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            body = await request.json()
+            username = (body.get("email") or body.get("username")) if isinstance(body, dict) else None
+        else:
+            username = (await request.form()).get("username")
+    except Exception:
+        username = None
+    if not isinstance(username, str):
+        return ""
+    return hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+
+async def request_buckets(policy: Policy, request: Request):
+    """(admission key, [(bucket key, rate, burst)]) for a request under policy"""
+    if policy.ip_rate is None:
+        client = request_client(request)
+        return client, [(f"{policy.name}:{client}", policy.rate, policy.burst)]
+    client = "ip:" + peer_ip(request)
+    username = await submitted_username(request)
+    return client, [
+        (f"{policy.name}:{client}:username:{username}", policy.rate, policy.burst),
+        (f"{policy.name}:{client}", policy.ip_rate, policy.ip_burst)
+    ]
+
+async def take_token(key, rate: float, burst: int):
+    if isinstance(buckets, SqliteBuckets):
+        return await asyncio.to_thread(buckets.take, key, rate, burst)
+    return buckets.take(key, rate, burst)
+
+def pool_saturated():
+    """Whether the database pool is nearly out of connections"""
+    return pool_status().get("saturation", 0.0) >= ADMISSION_POOL_SATURATION
+
+def reject(policy: Policy, reason: str, status_code: int, retry_after: float, detail: str):
+    rate_limit_rejections.inc(route=policy.name, reason=reason)
+    raise HTTPException(
+        status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+def limit(name: str):
+    """Route dependency applying the named policy"""
+    policy = POLICIES[name]
+    admission = admissions[name]
+
+    async def apply_limit(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            yield
+            return
+
+        key, limits = await request_buckets(policy, request)
+        for bucket_key, rate, burst in limits:
+            wait = await take_token(bucket_key, rate, burst)
+            if wait:
+                reject(policy, "rate_limited", 429, wait, "Too many requests; try again later")
+
+        if pool_saturated():
+            reject(policy, "pool_saturated", 503, 1, "Server busy; try again shortly")
+        reason = admission.enter(key)
+        if reason:
+            reject(policy, reason, 503, 1, "Server busy; try again shortly")
+        try:
+            yield
+        finally:
+            admission.leave(key)
+
+    return apply_limit
@@ -0,0 +1,46 @@
+"""Settings for running the API with several worker processes.
+
+Used by gunicorn.conf.py, `python main.py` and the worker benchmark. The
+worker count is WEB_CONCURRENCY if set, otherwise the CPU cores this process
+may use (CPU affinity and the container's cgroup CPU limit both count). Each
+worker has its own event loop and database pool (see app.database.database
+for how the pool is sized per worker).
+"""
+import importlib.util
+import math
+import os
+
+def cgroup_cpu_limit():
+    """Cores allowed by the cgroup v2 CPU quota (e.g. docker --cpus), or None when unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+def available_cores():
+    """CPU cores this process can actually run on"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS, Windows
+        cores = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cores, limit) if limit else cores
+
+def worker_count():
+    """WEB_CONCURRENCY if set, otherwise one worker per available core"""
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    return available_cores()
+
+def event_loop():
+    """uvloop when installed, else asyncio (what uvicorn's "auto" picks)"""
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+def http_protocol():
+    """httptools when installed, else h11 (what uvicorn's "auto" picks)"""
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
@@ -0,0 +1,93 @@
+"""Request coalescing: concurrent lookups of the same key share one backend call.
+
+The first caller for a key runs the lookup; callers that arrive while it is
+in flight wait for it and get the same result (or exception). Nothing is
+cached afterwards, so a caller that arrives once the lookup has finished
+starts a new one. Results are shared between callers: treat them as
+read-only. Coalescing is per worker process.
+"""
+import asyncio
+import os
+import threading
+
+from app.utils.metrics import Counter, register
+
+# Set to "false" to run every lookup separately
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+single_flight_calls = register(Counter(
+    "single_flight_calls_total",
+    "Coalesced lookups by whether the caller ran the backend call (leader) or shared one (coalesced)",
+    ("name", "role")
+))
+
+class _Call:
+    """An in-flight synchronous lookup"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls per key, from threads (do) or coroutines (do_async)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return fn(), sharing one call among threads asking for the same key at once"""
+        if not SINGLE_FLIGHT_ENABLED:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            single_flight_calls.inc(name=self.name, role="coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        single_flight_calls.inc(name=self.name, role="leader")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, fn):
+        """Return await fn(), sharing one call among coroutines asking for the same key at once"""
+        if not SINGLE_FLIGHT_ENABLED:
+            return await fn()
+
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        # A task left over from another event loop (e.g. an earlier test client) can't be awaited here
+        if task is None or task.get_loop() is not loop:
+            single_flight_calls.inc(name=self.name, role="leader")
+            # Runs as its own task so a caller that disconnects doesn't cancel it for the others
+            task = self._tasks[key] = loop.create_task(fn())
+            task.add_done_callback(lambda finished: self._forget(key, finished))
+        else:
+            single_flight_calls.inc(name=self.name, role="coalesced")
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark a failure as seen even if every caller went away before it finished
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+import math
+import os
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models.models import Medicine, StockMovement, StockConsumption, StockAlertEvent, JobWatermark
+from app.utils.background import register_periodic_task
+from app.utils.stock_ledger import ORDER_EVENT_REASONS, pending_stock
+
+# Alert settings
+STOCK_ALERT_INTERVAL_SECONDS = float(os.getenv("STOCK_ALERT_INTERVAL_SECONDS", "60"))
+# Flag medicines projected to run out within this many days
+STOCK_ALERT_HORIZON_DAYS = float(os.getenv("STOCK_ALERT_HORIZON_DAYS", "7"))
+# Clear a flag once cover is back above horizon * this factor, so alerts don't flap
+STOCK_ALERT_RECOVERY_FACTOR = float(os.getenv("STOCK_ALERT_RECOVERY_FACTOR", "1.25"))
+# Ignore medicines selling slower than this (units per day)
+STOCK_ALERT_MIN_DAILY_RATE = float(os.getenv("STOCK_ALERT_MIN_DAILY_RATE", "0.1"))
+# Demand from this many days ago weighs half as much as demand today
+STOCK_CONSUMPTION_HALF_LIFE_DAYS = float(os.getenv("STOCK_CONSUMPTION_HALF_LIFE_DAYS", "3"))
+STOCK_CONSUMPTION_BATCH_SIZE = int(os.getenv("STOCK_CONSUMPTION_BATCH_SIZE", "5000"))
+STOCK_CONSUMPTION_MAX_BATCHES = int(os.getenv("STOCK_CONSUMPTION_MAX_BATCHES", "20"))
+# Movements newer than this may still have uncommitted neighbours with lower IDs
+STOCK_CONSUMPTION_SETTLE_SECONDS = float(os.getenv("STOCK_CONSUMPTION_SETTLE_SECONDS", "30"))
+
+# Decay time constant: decayed_units / DECAY_DAYS is the daily rate
+DECAY_DAYS = STOCK_CONSUMPTION_HALF_LIFE_DAYS / math.log(2)
+# Consumption rows below this many units are dropped
+MIN_DECAYED_UNITS = 0.01
+
+# Alert event kinds
+LOW_STOCK = "low_stock"
+RECOVERED = "recovered"
+
+# Watermark name and advisory lock ID so only one worker evaluates alerts at a time
+STOCK_ALERT_WATERMARK = "stock_alerts"
+STOCK_ALERT_LOCK_ID = 710003
+
+def decay(decayed_units: float, since: datetime, until: datetime):
+    """Age decayed units from one time to a later one"""
+    days = max((until - since).total_seconds(), 0) / 86400
+    return decayed_units * math.exp(-days / DECAY_DAYS)
+
+def daily_rate(consumption: StockConsumption, now: datetime):
+    """Exponentially weighted units consumed per day, as of now"""
+    return decay(consumption.decayed_units, consumption.updated_at, now) / DECAY_DAYS
+
+def project_stockout(stock: int, rate: float):
+    """Days until stock runs out at the given daily rate, or None if it isn't being consumed"""
+    if rate <= 0:
+        return None
+    return max(stock, 0) / rate
+
+def consume_order_events(db: Session, now: datetime):
+    """Fold order events after the watermark into the consumption rates; return events processed"""
+    watermark = db.get(JobWatermark, STOCK_ALERT_WATERMARK)
+    if watermark is None:
+        watermark = JobWatermark(name=STOCK_ALERT_WATERMARK, position=0, updated_at=now)
+        db.add(watermark)
+
+    settled_before = now - timedelta(seconds=STOCK_CONSUMPTION_SETTLE_SECONDS)
+    processed = 0
+    for _ in range(STOCK_CONSUMPTION_MAX_BATCHES):
+        events = db.query(
+            StockMovement.id, StockMovement.medicine_id, StockMovement.quantity, StockMovement.created_at
+        ).filter(
+            StockMovement.id > watermark.position,
+            StockMovement.reason.in_(ORDER_EVENT_REASONS)
+        ).order_by(StockMovement.id).limit(STOCK_CONSUMPTION_BATCH_SIZE).all()
+
+        # Stop at the first unsettled event so later runs don't skip a late commit
+        for index, event in enumerate(events):
+            if event.created_at >= settled_before:
+                events = events[:index]
+                break
+        if not events:
+            break
+
+        consumption = {
+            row.medicine_id: row for row in db.query(StockConsumption).filter(
+                StockConsumption.medicine_id.in_(list({event.medicine_id for event in events}))
+            ).all()
+        }
+        for event in events:
+            row = consumption.get(event.medicine_id)
+            if row is None:
+                row = StockConsumption(medicine_id=event.medicine_id, decayed_units=0.0, updated_at=event.created_at)
+                db.add(row)
+                consumption[event.medicine_id] = row
+            if event.created_at > row.updated_at:
+                row.decayed_units = decay(row.decayed_units, row.updated_at, event.created_at)
+                row.updated_at = event.created_at
+            # Reservations are negative movements; cancellations give demand back
+            row.decayed_units = max(row.decayed_units - event.quantity, 0.0)
+
+        watermark.position = events[-1].id
+        watermark.updated_at = now
+        db.commit()
+        processed += len(events)
+
+        if len(events) < STOCK_CONSUMPTION_BATCH_SIZE:
+            break
+
+    return processed
+
+def low_stock_items(db: Session, now: datetime, alerted_only: bool = False):
+    """(consumption, name, available stock, daily rate, days to stock-out) for medicines with demand"""
+    query = db.query(StockConsumption, Medicine.name, Medicine.stock).join(
+        Medicine, StockConsumption.medicine_id == Medicine.id
+    )
+    if alerted_only:
+        query = query.filter(StockConsumption.alerted_at != None)
+    rows = query.all()
+
+    pending = pending_stock(db, [consumption.medicine_id for consumption, _, _ in rows])
+    items = []
+    for consumption, name, stock in rows:
+        available = stock + pending.get(consumption.medicine_id, 0)
+        rate = daily_rate(consumption, now)
+        items.append((consumption, name, available, rate, project_stockout(available, rate)))
+    return items
+
+def evaluate_stock_alerts(db: Session):
+    """Update consumption rates from new order events, then flag and clear low-stock alerts"""
+    now = datetime.utcnow()
+    events_processed = consume_order_events(db, now)
+
+    events = []
+    pruned = 0
+    for consumption, _, available, rate, days in low_stock_items(db, now):
+        low = days is not None and rate >= STOCK_ALERT_MIN_DAILY_RATE and days <= STOCK_ALERT_HORIZON_DAYS
+        recovered = days is None or rate < STOCK_ALERT_MIN_DAILY_RATE or (
+            days > STOCK_ALERT_HORIZON_DAYS * STOCK_ALERT_RECOVERY_FACTOR
+        )
+
+        if consumption.alerted_at is None and low:
+            consumption.alerted_at = now
+            kind = LOW_STOCK
+        elif consumption.alerted_at is not None and recovered:
+            consumption.alerted_at = None
+            kind = RECOVERED
+        else:
+            kind = None
+
+        if kind:
+            events.append({
+                "medicine_id": consumption.medicine_id,
+                "kind": kind,
+                "stock": available,
+                "daily_rate": rate,
+                "days_to_stockout": days,
+                "created_at": now
+            })
+        elif consumption.alerted_at is None and rate * DECAY_DAYS < MIN_DECAYED_UNITS:
+            # Demand has faded out; the row comes back with the next order
+            db.delete(consumption)
+            pruned += 1
+
+    if events:
+        db.execute(insert(StockAlertEvent), events)
+    db.commit()
+
+    return {
+        "order_events_processed": events_processed,
+        "alerts_raised": sum(1 for event in events if event["kind"] == LOW_STOCK),
+        "alerts_cleared": sum(1 for event in events if event["kind"] == RECOVERED),
+        "consumption_rows_pruned": pruned
+    }
+
+stock_alert_task = register_periodic_task(
+    "stock_alerts", evaluate_stock_alerts, STOCK_ALERT_INTERVAL_SECONDS, STOCK_ALERT_LOCK_ID
+)
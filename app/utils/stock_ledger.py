@@ -0,0 +1,342 @@
+from collections import defaultdict
+from datetime import datetime
+import os
+import random
+
+from sqlalchemy import func, insert, update, case
+from sqlalchemy.orm import Session
+
+from app.models.models import Medicine, OrderItem, StockMovement, StockCounterShard
+from app.utils.analytics import record_order_events
+from app.utils.background import register_periodic_task
+
+# Movement reasons
+RESERVATION = "order_reservation"
+RESTOCK = "restock"
+CANCELLATION = "cancellation"
+ADJUSTMENT = "adjustment"
+MOVEMENT_REASONS = [RESERVATION, RESTOCK, CANCELLATION, ADJUSTMENT]
+# Movements that are sales events for the analytics rollups
+ORDER_EVENT_REASONS = [RESERVATION, CANCELLATION]
+
+# Roll-up settings
+STOCK_ROLLUP_INTERVAL_SECONDS = float(os.getenv("STOCK_ROLLUP_INTERVAL_SECONDS", "30"))
+STOCK_ROLLUP_BATCH_SIZE = int(os.getenv("STOCK_ROLLUP_BATCH_SIZE", "5000"))
+STOCK_ROLLUP_MAX_BATCHES = int(os.getenv("STOCK_ROLLUP_MAX_BATCHES", "20"))
+
+# Hot SKUs (comma-separated medicine IDs) split their available stock over
+# several counter rows, so concurrent checkouts lock one row each
+HOT_SKUS = {int(medicine_id) for medicine_id in os.getenv("STOCK_HOT_SKUS", "").split(",") if medicine_id.strip()}
+STOCK_COUNTER_SHARDS = int(os.getenv("STOCK_COUNTER_SHARDS", "8"))
+
+# Advisory lock ID so only one worker rolls up at a time
+STOCK_ROLLUP_LOCK_ID = 710002
+
+def record_movements(db: Session, movements, applied: bool = False):
+    """Append movements to the ledger in one insert (caller commits)
+
+    Each movement is a dict with medicine_id, quantity and reason, and
+    optionally order_id, created_by and notes. Pass applied=True when the
+    caller has already written the change to Medicine.stock.
+    """
+    if not movements:
+        return
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "order_id": None,
+            "created_by": None,
+            "notes": None,
+            **movement,
+            "created_at": now,
+            "rolled_up_at": now if applied else None
+        }
+        for movement in movements
+    ]
+    db.execute(insert(StockMovement), rows)
+
+def pending_stock(db: Session, medicine_ids):
+    """Net quantity per medicine recorded in the ledger but not yet rolled up"""
+    medicine_ids = list(set(medicine_ids))
+    if not medicine_ids:
+        return {}
+
+    return {
+        medicine_id: quantity or 0
+        for medicine_id, quantity in db.query(
+            StockMovement.medicine_id, func.sum(StockMovement.quantity)
+        ).filter(
+            StockMovement.rolled_up_at == None,
+            StockMovement.medicine_id.in_(medicine_ids)
+        ).group_by(StockMovement.medicine_id).all()
+    }
+
+def lock_shards(db: Session, medicine_ids):
+    """Lock the hot SKUs' counter shards; return {medicine_id: {shard: available}} for those that have them"""
+    hot_ids = sorted(set(medicine_ids) & HOT_SKUS)
+    if not hot_ids:
+        return {}
+
+    shards = defaultdict(dict)
+    for medicine_id, shard, available in db.query(
+        StockCounterShard.medicine_id, StockCounterShard.shard, StockCounterShard.available
+    ).filter(
+        StockCounterShard.medicine_id.in_(hot_ids)
+    ).order_by(StockCounterShard.medicine_id, StockCounterShard.shard).with_for_update().all():
+        shards[medicine_id][shard] = available
+    return dict(shards)
+
+def lock_available_stock(db: Session, medicine_ids):
+    """Lock the medicines' rows (and hot SKUs' shards) until the caller commits; return their available stock
+
+    Stock changes take this lock before reading a balance, so they can't
+    race a checkout for the same units. Medicine rows are locked in ID
+    order, then shards, so overlapping callers can't deadlock. A hot SKU's
+    available stock is the sum of its shards once they exist.
+    """
+    medicine_ids = sorted(set(medicine_ids))
+    if not medicine_ids:
+        return {}
+
+    stored = db.query(Medicine.id, Medicine.stock).filter(
+        Medicine.id.in_(medicine_ids)
+    ).order_by(Medicine.id).with_for_update().all()
+    shards = lock_shards(db, medicine_ids)
+    pending = pending_stock(db, [medicine_id for medicine_id in medicine_ids if medicine_id not in shards])
+
+    available = {}
+    for medicine_id, stock in stored:
+        if medicine_id in shards:
+            available[medicine_id] = sum(shards[medicine_id].values())
+        else:
+            available[medicine_id] = (stock or 0) + pending.get(medicine_id, 0)
+    return available
+
+def spread_over_shards(db: Session, totals):
+    """Set hot SKUs' available stock, split evenly over their shards (caller holds the locks and commits)"""
+    totals = {medicine_id: total for medicine_id, total in totals.items() if medicine_id in HOT_SKUS}
+    if not totals:
+        return
+
+    existing = {
+        medicine_id for (medicine_id,) in db.query(StockCounterShard.medicine_id).filter(
+            StockCounterShard.medicine_id.in_(list(totals))
+        ).distinct()
+    }
+    for medicine_id, total in totals.items():
+        base, extra = divmod(total, STOCK_COUNTER_SHARDS)
+        shares = {shard: base + (1 if shard < extra else 0) for shard in range(STOCK_COUNTER_SHARDS)}
+        if medicine_id in existing:
+            db.execute(
+                update(StockCounterShard)
+                .where(StockCounterShard.medicine_id == medicine_id)
+                .values(available=case(shares, value=StockCounterShard.shard, else_=0))
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            db.execute(insert(StockCounterShard), [
+                {"medicine_id": medicine_id, "shard": shard, "available": available}
+                for shard, available in shares.items()
+            ])
+
+def take_stock(db: Session, quantities):
+    """Lock and take stock for an order; return {medicine_id: available} for medicines that fall short
+
+    Ordinary medicines lock their row. A hot SKU takes the whole quantity
+    from one shard that holds enough, skipping shards other checkouts have
+    locked; only when none will do are all its shards locked, drawn from
+    and evened out. Nothing is taken when any medicine falls short (the
+    caller rolls back). Record the matching reservations with record_movements.
+    """
+    short = {}
+
+    ordinary = [medicine_id for medicine_id in quantities if medicine_id not in HOT_SKUS]
+    available = lock_available_stock(db, ordinary)
+    for medicine_id in ordinary:
+        if available.get(medicine_id, 0) < quantities[medicine_id]:
+            short[medicine_id] = available.get(medicine_id, 0)
+
+    for medicine_id in sorted(set(quantities) & HOT_SKUS):
+        quantity = quantities[medicine_id]
+        shard = db.query(StockCounterShard.shard).filter(
+            StockCounterShard.medicine_id == medicine_id,
+            StockCounterShard.available >= quantity
+        ).order_by(func.random()).limit(1).with_for_update(skip_locked=True).scalar()
+        if shard is not None:
+            db.execute(
+                update(StockCounterShard)
+                .where(StockCounterShard.medicine_id == medicine_id, StockCounterShard.shard == shard)
+                .values(available=StockCounterShard.available - quantity)
+            )
+            continue
+
+        shards = lock_shards(db, [medicine_id]).get(medicine_id)
+        if shards is None:
+            # First checkout of this SKU: split its balance into shards
+            total = lock_available_stock(db, [medicine_id]).get(medicine_id, 0)
+        else:
+            total = sum(shards.values())
+        taken = quantity if total >= quantity else 0
+        if not taken:
+            short[medicine_id] = total
+        spread_over_shards(db, {medicine_id: total - taken})
+
+    return short
+
+def return_to_shards(db: Session, totals):
+    """Add quantities back to one random shard per hot SKU (caller commits)"""
+    for medicine_id in sorted(set(totals) & HOT_SKUS):
+        db.execute(
+            update(StockCounterShard)
+            .where(
+                StockCounterShard.medicine_id == medicine_id,
+                StockCounterShard.shard == random.randrange(STOCK_COUNTER_SHARDS)
+            )
+            .values(available=StockCounterShard.available + totals[medicine_id])
+        )
+
+def release_order_stock(db: Session, order_ids, user_id: int = None, reason: str = CANCELLATION):
+    """Record movements returning the items of the given orders to stock (caller commits)"""
+    if not order_ids:
+        return 0
+
+    items = db.query(OrderItem.order_id, OrderItem.medicine_id, OrderItem.quantity).filter(
+        OrderItem.order_id.in_(list(order_ids))
+    ).all()
+    totals = defaultdict(int)
+    for _, medicine_id, quantity in items:
+        totals[medicine_id] += quantity
+    return_to_shards(db, totals)
+    record_movements(db, [
+        {
+            "medicine_id": medicine_id,
+            "quantity": quantity,
+            "reason": reason,
+            "order_id": order_id,
+            "created_by": user_id
+        }
+        for order_id, medicine_id, quantity in items
+    ])
+    return len(items)
+
+def set_stock(db: Session, medicine: Medicine, stock: int, user_id: int = None, notes: str = None):
+    """Set a medicine's available stock now, recording the difference as an adjustment (caller commits)"""
+    available = lock_available_stock(db, [medicine.id]).get(medicine.id, 0)
+    difference = stock - available
+    if difference == 0:
+        return 0
+
+    # Relative to the locked row, not the possibly stale loaded value
+    medicine.stock = Medicine.stock + difference
+    medicine.version = Medicine.version + 1
+    spread_over_shards(db, {medicine.id: stock})
+    record_movements(db, [{
+        "medicine_id": medicine.id,
+        "quantity": difference,
+        "reason": RESTOCK if difference > 0 else ADJUSTMENT,
+        "created_by": user_id,
+        "notes": notes
+    }], applied=True)
+    return difference
+
+def set_stock_levels(db: Session, targets, user_id: int = None, notes: str = None):
+    """Set many medicines' available stock in one statement, recording each difference (caller commits)
+
+    targets maps medicine IDs to the stock wanted; IDs with no medicine are
+    skipped. Returns {medicine_id: (previous, stock)} for the medicines changed.
+    """
+    available = lock_available_stock(db, targets)
+    changes = {
+        medicine_id: (available[medicine_id], stock)
+        for medicine_id, stock in targets.items()
+        if medicine_id in available and stock != available[medicine_id]
+    }
+    if not changes:
+        return {}
+
+    db.execute(
+        update(Medicine)
+        .where(Medicine.id.in_(list(changes)))
+        .values(
+            stock=Medicine.stock + case(
+                {medicine_id: stock - previous for medicine_id, (previous, stock) in changes.items()},
+                value=Medicine.id
+            ),
+            version=Medicine.version + 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+    spread_over_shards(db, {medicine_id: stock for medicine_id, (_, stock) in changes.items()})
+    record_movements(db, [
+        {
+            "medicine_id": medicine_id,
+            "quantity": stock - previous,
+            "reason": RESTOCK if stock > previous else ADJUSTMENT,
+            "created_by": user_id,
+            "notes": notes
+        }
+        for medicine_id, (previous, stock) in changes.items()
+    ], applied=True)
+    return changes
+
+def roll_up_stock(db: Session):
+    """Fold pending movements into Medicine.stock and the sales rollups in chunks; return rows processed"""
+    movements_rolled_up = 0
+    medicines_updated = set()
+
+    # Shards of SKUs taken out of STOCK_HOT_SKUS stop being updated; drop them
+    # so they are split afresh from the ledger if the SKU is listed again
+    if db.query(StockCounterShard).filter(
+        StockCounterShard.medicine_id.notin_(list(HOT_SKUS))
+    ).delete(synchronize_session=False):
+        db.commit()
+
+    for _ in range(STOCK_ROLLUP_MAX_BATCHES):
+        movements = db.query(
+            StockMovement.id, StockMovement.medicine_id, StockMovement.quantity,
+            StockMovement.reason, StockMovement.order_id
+        ).filter(
+            StockMovement.rolled_up_at == None
+        ).order_by(StockMovement.id).limit(STOCK_ROLLUP_BATCH_SIZE).with_for_update(skip_locked=True).all()
+        if not movements:
+            break
+
+        totals = defaultdict(int)
+        for _, medicine_id, quantity, _, _ in movements:
+            totals[medicine_id] += quantity
+        totals = {medicine_id: quantity for medicine_id, quantity in totals.items() if quantity}
+
+        # Apply every SKU's net change in one statement
+        if totals:
+            db.execute(
+                update(Medicine)
+                .where(Medicine.id.in_(list(totals)))
+                .values(
+                    stock=Medicine.stock + case(totals, value=Medicine.id),
+                    version=Medicine.version + 1
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+        # Order events reach the rollups in the same transaction, so each is counted once
+        record_order_events(db, [
+            (medicine_id, order_id, quantity)
+            for _, medicine_id, quantity, reason, order_id in movements
+            if order_id is not None and reason in ORDER_EVENT_REASONS
+        ])
+
+        db.query(StockMovement).filter(
+            StockMovement.id.in_([movement.id for movement in movements])
+        ).update({"rolled_up_at": datetime.utcnow()}, synchronize_session=False)
+
+        db.commit()
+
+        movements_rolled_up += len(movements)
+        medicines_updated.update(totals)
+
+    return {"movements_rolled_up": movements_rolled_up, "medicines_updated": len(medicines_updated)}
+
+stock_rollup_task = register_periodic_task(
+    "stock_rollup", roll_up_stock, STOCK_ROLLUP_INTERVAL_SECONDS, STOCK_ROLLUP_LOCK_ID
+)
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import os
+
+from sqlalchemy.orm import Session
+
+from app.models.models import Prescription, Cart, CartItem
+from app.utils.background import register_periodic_task
+from app.utils.idempotency import delete_expired_idempotency_keys
+
+# Sweeper settings
+SWEEPER_INTERVAL_SECONDS = float(os.getenv("SWEEPER_INTERVAL_SECONDS", "300"))
+SWEEPER_BATCH_SIZE = int(os.getenv("SWEEPER_BATCH_SIZE", "500"))
+SWEEPER_MAX_BATCHES = int(os.getenv("SWEEPER_MAX_BATCHES", "20"))
+CART_IDLE_TTL_HOURS = float(os.getenv("CART_IDLE_TTL_HOURS", "72"))
+
+# Advisory lock ID so only one worker sweeps at a time
+SWEEPER_LOCK_ID = 710001
+
+def expire_prescriptions(db: Session, now: datetime):
+    """Mark lapsed prescriptions expired and detach them from cart items, in chunks"""
+    prescriptions_expired = 0
+    cart_items_detached = 0
+
+    for _ in range(SWEEPER_MAX_BATCHES):
+        prescription_ids = [
+            prescription_id for (prescription_id,) in db.query(Prescription.id).filter(
+                Prescription.is_expired == False,
+                Prescription.expires_at < now
+            ).order_by(Prescription.id).limit(SWEEPER_BATCH_SIZE).all()
+        ]
+        if not prescription_ids:
+            break
+
+        prescriptions_expired += db.query(Prescription).filter(
+            Prescription.id.in_(prescription_ids)
+        ).update({"is_expired": True}, synchronize_session=False)
+
+        cart_items_detached += db.query(CartItem).filter(
+            CartItem.prescription_id.in_(prescription_ids)
+        ).update({"prescription_id": None}, synchronize_session=False)
+
+        db.commit()
+
+    return prescriptions_expired, cart_items_detached
+
+def delete_idle_carts(db: Session, now: datetime):
+    """Delete carts untouched for longer than the idle TTL, in chunks"""
+    cutoff = now - timedelta(hours=CART_IDLE_TTL_HOURS)
+    carts_deleted = 0
+    cart_items_deleted = 0
+
+    for _ in range(SWEEPER_MAX_BATCHES):
+        cart_ids = [
+            cart_id for (cart_id,) in db.query(Cart.id).filter(
+                Cart.updated_at < cutoff
+            ).order_by(Cart.id).limit(SWEEPER_BATCH_SIZE).with_for_update(skip_locked=True).all()
+        ]
+        if not cart_ids:
+            break
+
+        cart_items_deleted += db.query(CartItem).filter(
+            CartItem.cart_id.in_(cart_ids)
+        ).delete(synchronize_session=False)
+
+        carts_deleted += db.query(Cart).filter(
+            Cart.id.in_(cart_ids)
+        ).delete(synchronize_session=False)
+
+        db.commit()
+
+    return carts_deleted, cart_items_deleted
+
+def sweep(db: Session):
+    """Expire prescriptions, delete idle carts and expired idempotency keys; return rows processed"""
+    now = datetime.utcnow()
+
+    prescriptions_expired, cart_items_detached = expire_prescriptions(db, now)
+    carts_deleted, cart_items_deleted = delete_idle_carts(db, now)
+    idempotency_keys_deleted = delete_expired_idempotency_keys(db, now, SWEEPER_BATCH_SIZE, SWEEPER_MAX_BATCHES)
+
+    return {
+        "prescriptions_expired": prescriptions_expired,
+        "cart_items_detached": cart_items_detached,
+        "carts_deleted": carts_deleted,
+        "cart_items_deleted": cart_items_deleted,
+        "idempotency_keys_deleted": idempotency_keys_deleted
+    }
+
+sweeper_task = register_periodic_task("sweeper", sweep, SWEEPER_INTERVAL_SECONDS, SWEEPER_LOCK_ID)
@@ -0,0 +1,122 @@
+"""Analytics benchmark: report latency as order history grows.
+
+Seeds increasing numbers of orders, rebuilds the sales rollups, then times
+the /analytics endpoints (which read only the rollups) against the ad-hoc
+top-sellers query over order_items joined to orders that they replace.
+
+Usage:
+    python -m benchmarks.bench_analytics --levels 2000 20000 100000 [--requests 100] [--json out.json]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+from sqlalchemy import func, select
+
+from benchmarks import datagen
+from benchmarks.harness import make_client, run_fixed, timed, write_results
+from benchmarks.local_supabase import install_local_supabase
+from benchmarks.run import Fixtures
+from app.database.database import engine, SessionLocal
+from app.models.models import Medicine, Order, OrderItem
+from app.utils.analytics import rebuild_sales_rollups
+from app.utils.order_status import CANCELLED
+
+def ad_hoc_top_sellers(days: int = 7, limit: int = 10):
+    """The query admins ran before the rollups: scan the window's order items"""
+    since = datetime.utcnow() - timedelta(days=days)
+    statement = select(
+        OrderItem.medicine_id, Medicine.name, func.sum(OrderItem.quantity).label("units_sold")
+    ).join(Order, OrderItem.order_id == Order.id).join(Medicine, OrderItem.medicine_id == Medicine.id).where(
+        Order.created_at >= since, Order.status != CANCELLED
+    ).group_by(OrderItem.medicine_id, Medicine.name).order_by(func.sum(OrderItem.quantity).desc()).limit(limit)
+    with engine.connect() as connection:
+        return connection.execute(statement).all()
+
+def time_ad_hoc(repeat: int):
+    """Median milliseconds of the ad-hoc query"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        ad_hoc_top_sellers()
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return round(durations[len(durations) // 2], 2)
+
+def analytics_steps(fixtures: Fixtures):
+    headers = {"Authorization": f"Bearer {fixtures.admin_token}"}
+
+    async def top_sellers(client, rng):
+        return await timed(client.get("/analytics/top-sellers", params={"days": 7}, headers=headers))
+
+    async def categories(client, rng):
+        return await timed(client.get("/analytics/categories", params={"days": 30}, headers=headers))
+
+    async def inventory(client, rng):
+        return await timed(client.get("/analytics/inventory", params={"days": 14}, headers=headers))
+
+    return {"top_sellers": top_sellers, "categories": categories, "inventory": inventory}
+
+async def measure(app, args):
+    fixtures = Fixtures(engine)
+    results = {}
+    async with make_client(app=app) as client:
+        for name, step in analytics_steps(fixtures).items():
+            results[name] = await run_fixed(step, client, args.concurrency, args.requests, warmup=5, seed=args.seed)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[2000, 20000, 100000], help="Order counts to seed")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per endpoint and level")
+    parser.add_argument("--json", help="Write results to this file")
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    import main as app_main
+    install_local_supabase(engine)
+
+    results = {"config": {"database": engine.dialect.name, "medicines": args.medicines}, "levels": []}
+    for orders in args.levels:
+        counts = datagen.generate(
+            users=args.users, categories=args.categories, medicines=args.medicines,
+            prescriptions=args.prescriptions, orders=orders, seed=args.seed
+        )
+
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            rollups = rebuild_sales_rollups(db)
+            rebuild_seconds = round(time.perf_counter() - started, 2)
+        finally:
+            db.close()
+
+        endpoints = asyncio.run(measure(app_main.app, args))
+        level = {
+            "orders": orders,
+            "order_items": counts["order_items"],
+            "rollup_rows": rollups["daily_medicine_sales"],
+            "rebuild_seconds": rebuild_seconds,
+            "ad_hoc_top_sellers_p50_ms": time_ad_hoc(max(5, args.requests // 10)),
+            "endpoints": endpoints
+        }
+        results["levels"].append(level)
+
+        print(
+            f"orders {orders:>8}  rollup rows {level['rollup_rows']:>7}  "
+            f"ad-hoc top sellers p50 {level['ad_hoc_top_sellers_p50_ms']} ms  "
+            + "  ".join(f"{name} p50 {summary['p50_ms']} ms" for name, summary in endpoints.items())
+        )
+
+    if args.json:
+        write_results(args.json, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
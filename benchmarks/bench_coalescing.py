@@ -0,0 +1,105 @@
+"""Coalescing benchmark: backend calls per burst of identical requests, with and without single-flight.
+
+Sends bursts of --burst simultaneous identical requests: GET /medicines/{id}
+for one hot medicine (SQLAlchemy path), and GET /auth/addresses with one
+token, which looks the user up by email before reading their addresses
+(Supabase path; only the user lookup is coalesced). Reports SQL statements
+and Supabase calls per burst, throughput and latency, with coalescing off and on.
+
+Usage:
+    python -m benchmarks.bench_coalescing --burst 50 --bursts 20 [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+from sqlalchemy import event
+
+from benchmarks import datagen
+from benchmarks.harness import make_client, summarize, timed, write_results
+from benchmarks.local_supabase import install_local_supabase
+from benchmarks.run import Fixtures
+from app.database.database import engine
+from app.utils import single_flight
+from app.utils.metrics import external_call_duration
+
+def supabase_calls():
+    """Supabase calls recorded so far"""
+    return sum(
+        count for (service, _), (_, _, count) in external_call_duration._values.items() if service == "supabase"
+    )
+
+async def run_bursts(client, path: str, headers: dict, burst: int, bursts: int):
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(bursts):
+        outcomes = await asyncio.gather(*(timed(client.get(path, headers=headers)) for _ in range(burst)))
+        for succeeded, seconds in outcomes:
+            if succeeded:
+                latencies.append(seconds)
+            else:
+                errors += 1
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+async def run(args):
+    import main
+    install_local_supabase(engine)
+
+    fixtures = Fixtures(engine)
+    headers = fixtures.auth(fixtures.users[0][0])
+    targets = {"medicine": f"/medicines/{fixtures.medicine_ids[0]}", "user": "/auth/addresses"}
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *_: statements.append(1))
+
+    results = {"config": {"burst": args.burst, "bursts": args.bursts, "database": engine.dialect.name}, "results": {}}
+    async with make_client(app=main.app) as client:
+        for target, path in targets.items():
+            for enabled in (False, True):
+                single_flight.SINGLE_FLIGHT_ENABLED = enabled
+                await client.get(path, headers=headers)
+                statements.clear()
+                calls_before = supabase_calls()
+
+                summary = await run_bursts(client, path, headers, args.burst, args.bursts)
+                summary["sql_statements_per_burst"] = round(len(statements) / args.bursts, 1)
+                summary["supabase_calls_per_burst"] = round((supabase_calls() - calls_before) / args.bursts, 1)
+
+                name = f"{target}_{'single_flight' if enabled else 'no_coalescing'}"
+                results["results"][name] = summary
+                print(
+                    f"{name:24} {summary['throughput_rps']:9.1f} req/s  p50 {summary['p50_ms']} ms  "
+                    f"p95 {summary['p95_ms']} ms  SQL/burst {summary['sql_statements_per_burst']}  "
+                    f"Supabase/burst {summary['supabase_calls_per_burst']}  errors {summary['errors']}"
+                )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=50, help="Simultaneous identical requests")
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the existing database")
+    parser.add_argument("--json", help="Write results to this file")
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.skip_seed:
+        counts = datagen.generate(
+            users=args.users, categories=args.categories, medicines=args.medicines,
+            prescriptions=args.prescriptions, orders=args.orders, seed=args.seed
+        )
+        print(f"Seeded {json.dumps(counts)}")
+
+    results = asyncio.run(run(args))
+    if args.json:
+        write_results(args.json, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Serialization benchmark for order responses.
+
+Compares the old response path (full OrderSchema with every OrderItem's
+nested Medicine, encoded with the stdlib json module) against ORJSONResponse
+and the slim OrderSummary used by the order list endpoint.
+
+Usage:
+    python -m benchmarks.bench_serialization [--items 100] [--orders 20] [--repeat 20] [--json out.json]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import orjson
+from pydantic import TypeAdapter
+from typing import List
+
+from app.schemas.order_schemas import Order as OrderSchema, OrderSummary
+
+def make_order(order_id: int, items: int):
+    """Build an ORM-like order with items, full medicines, tracking and address"""
+    now = datetime.utcnow()
+    category = SimpleNamespace(id=1, name="Pain Relief", description="Medicines for pain relief", created_at=now)
+    address = SimpleNamespace(
+        id=1, user_id=1, address_line1="123 Health Street", address_line2=None,
+        city="Bengaluru", state="KA", postal_code="560001", is_default=True
+    )
+    order_items = []
+    for item_id in range(items):
+        medicine = SimpleNamespace(
+            id=item_id, name=f"Medicine {item_id}", description="Lorem ipsum dolor sit amet. " * 40,
+            price=12.5, stock=100, category_id=1, prescription_required=False,
+            manufacturer="Acme Pharma", image_url=None, created_at=now, updated_at=now, category=category
+        )
+        order_items.append(SimpleNamespace(
+            id=item_id, order_id=order_id, medicine_id=item_id, quantity=2,
+            unit_price=12.5, prescription_id=None, medicine=medicine
+        ))
+    tracking_updates = [
+        SimpleNamespace(id=i, order_id=order_id, status=status, location=None, notes=None, timestamp=now, updated_by=1)
+        for i, status in enumerate(["pending", "processing", "out_for_delivery"])
+    ]
+    return SimpleNamespace(
+        id=order_id, user_id=1, address_id=1, total_amount=25.0 * items, status="out_for_delivery",
+        payment_status="completed", payment_method="card", delivery_notes=None, delivery_partner_id=None,
+        created_at=now, updated_at=now, estimated_delivery_time=now + timedelta(minutes=30),
+        actual_delivery_time=None, items=order_items, tracking_updates=tracking_updates, address=address
+    )
+
+def make_summary(order):
+    """Build the order list entry returned without ?expand="""
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "address_id": order.address_id,
+        "total_amount": order.total_amount,
+        "status": order.status,
+        "payment_status": order.payment_status,
+        "payment_method": order.payment_method,
+        "created_at": order.created_at,
+        "estimated_delivery_time": order.estimated_delivery_time,
+        "actual_delivery_time": order.actual_delivery_time,
+        "items_count": len(order.items)
+    }
+
+def time_it(func, repeat: int):
+    """Return the median duration of func in milliseconds and the size of its output"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func()
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return durations[len(durations) // 2], len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100, help="Items per order")
+    parser.add_argument("--orders", type=int, default=20, help="Orders per response")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    orders = [make_order(order_id, args.items) for order_id in range(args.orders)]
+    full_adapter = TypeAdapter(List[OrderSchema])
+    summary_adapter = TypeAdapter(List[OrderSummary])
+
+    # Mirror what FastAPI does: validate into the response model, dump to JSON-able data, render
+    def full_stdlib():
+        content = full_adapter.dump_python(full_adapter.validate_python(orders, from_attributes=True), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def full_orjson():
+        content = full_adapter.dump_python(full_adapter.validate_python(orders, from_attributes=True), mode="json")
+        return orjson.dumps(content)
+
+    def summary_orjson():
+        summaries = [make_summary(order) for order in orders]
+        content = summary_adapter.dump_python(summary_adapter.validate_python(summaries), mode="json", exclude_unset=True)
+        return orjson.dumps(content)
+
+    results = {}
+    for name, func in [("full_stdlib_json", full_stdlib), ("full_orjson", full_orjson), ("summary_orjson", summary_orjson)]:
+        median_ms, size = time_it(func, args.repeat)
+        results[name] = {"median_ms": round(median_ms, 3), "bytes": size}
+        print(f"{name:18} {median_ms:9.2f} ms  {size:>10} bytes")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"items": args.items, "orders": args.orders, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Startup benchmark: how long a cold process takes to serve its first request.
+
+Each run starts a fresh Python process that imports main, runs the app's
+startup (lifespan) and answers GET /, timing each step. Also lists which
+heavy optional modules got imported on the way, so a stray top-level import
+of Supabase, Pillow, passlib or python-jose shows up as a regression.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 10] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.harness import configure_environment
+
+# Modules that should load on first use, not at startup
+LAZY_MODULES = ["supabase", "PIL", "passlib", "jose"]
+
+# Runs in the child process; prints one JSON line of timings
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    status = client.get("/").status_code
+    served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (served - ready) * 1000,
+    "total_ms": (served - started) * 1000,
+    "status": status,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+def run_once():
+    """Time one cold start in a new interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], capture_output=True, text=True, check=True, env=os.environ.copy()
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    configure_environment()
+    runs = [run_once() for _ in range(args.runs)]
+
+    results = {}
+    for step in ("import_ms", "startup_ms", "first_request_ms", "total_ms"):
+        values = [run[step] for run in runs]
+        results[step] = {
+            "median": round(statistics.median(values), 1),
+            "min": round(min(values), 1),
+            "max": round(max(values), 1)
+        }
+        print(f"{step:18} median {results[step]['median']:8.1f} ms   min {results[step]['min']:8.1f}   max {results[step]['max']:8.1f}")
+
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    print(f"lazy modules loaded at startup: {', '.join(loaded) or 'none'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": args.runs, "results": results, "lazy_modules_loaded": loaded}, f, indent=2)
+
+    return 1 if loaded else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
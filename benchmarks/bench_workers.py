@@ -0,0 +1,187 @@
+"""Worker scaling benchmark: throughput of the production server profile at 1..N workers.
+
+Seeds the database once, then for each worker count starts the server the way
+production does (gunicorn -c gunicorn.conf.py with uvicorn workers, or plain
+uvicorn --workers with --server uvicorn) on benchmarks.serve:app, and drives a
+mix of read endpoints from several client processes for a fixed duration.
+Reports requests/s, p50/p95/p99 latency and the speedup over one worker.
+
+The clients share the machine with the server; use --clients to leave cores
+for the workers, or point a load generator on another host at
+`python -m benchmarks.serve` for cleaner numbers.
+
+Usage:
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --duration 15 --json workers.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+import httpx
+
+from benchmarks import datagen
+from benchmarks.harness import make_client, summarize, timed, write_results
+from benchmarks.run import SEARCH_TERMS
+from app.utils.server import available_cores, event_loop, http_protocol
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(server: str, workers: int, port: int):
+    """Start benchmarks.serve:app with this many workers; return the process once it answers"""
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers))
+    if server == "gunicorn":
+        command = [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+            "--workers", str(workers), "--bind", f"127.0.0.1:{port}", "--log-level", "warning",
+            "benchmarks.serve:app"
+        ]
+    else:
+        command = [sys.executable, "-m", "benchmarks.serve", "--port", str(port), "--workers", str(workers)]
+    process = subprocess.Popen(command, env=env)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 60 seconds")
+
+def stop_server(process):
+    """SIGTERM and wait, as a deploy would"""
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+async def drive(base_url: str, medicine_ids, concurrency: int, duration: float, seed: int):
+    """Closed-loop requests from concurrency connections until duration passes; return (latencies, errors)"""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id, client):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            kind = rng.random()
+            if kind < 0.5:
+                request = client.get(f"/medicines/{rng.choice(medicine_ids)}")
+            elif kind < 0.8:
+                request = client.get("/medicines/search", params={"q": rng.choice(SEARCH_TERMS), "limit": 20})
+            else:
+                request = client.get("/categories")
+            succeeded, seconds = await timed(request)
+            if succeeded:
+                latencies.append(seconds)
+            else:
+                errors += 1
+
+    async with make_client(base_url=base_url, max_connections=concurrency) as client:
+        await asyncio.gather(*(worker(worker_id, client) for worker_id in range(concurrency)))
+    return latencies, errors
+
+def client_process(args):
+    base_url, medicine_ids, concurrency, duration, seed = args
+    return asyncio.run(drive(base_url, medicine_ids, concurrency, duration, seed))
+
+def measure(base_url: str, medicine_ids, clients: int, concurrency: int, duration: float, seed: int):
+    """Spread concurrency over client processes and combine their results"""
+    shares = [concurrency // clients + (1 if index < concurrency % clients else 0) for index in range(clients)]
+    jobs = [(base_url, medicine_ids, share, duration, seed + index) for index, share in enumerate(shares) if share]
+    with multiprocessing.Pool(len(jobs)) as pool:
+        started = time.perf_counter()
+        outcomes = pool.map(client_process, jobs)
+        elapsed = time.perf_counter() - started
+    latencies = [seconds for client_latencies, _ in outcomes for seconds in client_latencies]
+    return summarize(latencies, sum(errors for _, errors in outcomes), elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cores = available_cores()
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, max(1, cores // 2), cores}))
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    parser.add_argument("--concurrency", type=int, default=64, help="Open connections across all clients")
+    parser.add_argument("--clients", type=int, default=max(1, min(4, cores // 2)), help="Load generator processes")
+    parser.add_argument("--duration", type=float, default=15, help="Measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds per worker count")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the existing database")
+    parser.add_argument("--json", help="Write results to this file")
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.skip_seed:
+        counts = datagen.generate(
+            users=args.users, categories=args.categories, medicines=args.medicines,
+            prescriptions=args.prescriptions, orders=args.orders, seed=args.seed
+        )
+        print(f"Seeded {json.dumps(counts)}")
+
+    from sqlalchemy import select
+    from app.database.database import engine
+    from app.models.models import Medicine
+    with engine.connect() as connection:
+        medicine_ids = connection.execute(select(Medicine.id).limit(5000)).scalars().all()
+
+    results = {
+        "config": {
+            "server": args.server,
+            "cores": cores,
+            "event_loop": event_loop(),
+            "http": http_protocol(),
+            "database": engine.dialect.name,
+            "concurrency": args.concurrency,
+            "clients": args.clients,
+            "duration": args.duration
+        },
+        "results": {}
+    }
+    print(f"{cores} cores, {args.server} with {event_loop()} / {http_protocol()}, {args.clients} client processes")
+
+    baseline = None
+    for workers in args.workers:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process = start_server(args.server, workers, port)
+        try:
+            if args.warmup:
+                measure(base_url, medicine_ids, args.clients, args.concurrency, args.warmup, args.seed)
+            summary = measure(base_url, medicine_ids, args.clients, args.concurrency, args.duration, args.seed)
+        finally:
+            stop_server(process)
+
+        baseline = baseline or summary["throughput_rps"]
+        summary["speedup"] = round(summary["throughput_rps"] / baseline, 2) if baseline else None
+        results["results"][f"workers_{workers}"] = summary
+        print(
+            f"{workers:3} workers {summary['throughput_rps']:9.1f} req/s  x{summary['speedup']}  "
+            f"p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms  "
+            f"errors {summary['errors']}"
+        )
+
+    if args.json:
+        write_results(args.json, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
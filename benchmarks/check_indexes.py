@@ -0,0 +1,150 @@
+"""Check that the hot queries are served by indexes, using the database's EXPLAIN output.
+
+Each query below mirrors a lookup the API makes on every request of its kind.
+A query passes when every table it reads is accessed through an index, and,
+for queries with ORDER BY, when the index also provides the order (no sort
+step). Exits non-zero if any query fails, so it can gate a deploy or CI run.
+
+On PostgreSQL sequential scans are disabled for the check, so small tables
+report whether a usable index exists rather than what the planner prefers
+at their current size.
+
+Usage (against a database migrated with `alembic upgrade head`):
+    DATABASE_URL=postgresql://... python -m benchmarks.check_indexes
+    python -m benchmarks.check_indexes --seed   # fresh local SQLite database with synthetic data
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+from sqlalchemy import select, text
+
+from benchmarks import datagen
+from app.database.database import engine
+from app.models.models import (
+    Address, Medicine, Prescription, PrescriptionMedicine, CartItem, Order, OrderItem, OrderTracking
+)
+
+# (name, statement, tables that must be read through an index, whether the index must provide the order)
+HOT_QUERIES = [
+    (
+        "user orders, newest first",
+        select(Order.id).where(Order.user_id == 1).order_by(Order.created_at.desc()).limit(20),
+        ["orders"], True
+    ),
+    (
+        "order tracking timeline",
+        select(OrderTracking.id).where(OrderTracking.order_id == 1).order_by(OrderTracking.timestamp.desc()),
+        ["order_tracking"], True
+    ),
+    (
+        "cart item for medicine",
+        select(CartItem.id).where(CartItem.cart_id == 1, CartItem.medicine_id == 1),
+        ["cart_items"], False
+    ),
+    ("cart items", select(CartItem.id).where(CartItem.cart_id == 1), ["cart_items"], False),
+    ("order items", select(OrderItem.id).where(OrderItem.order_id.in_([1, 2, 3])), ["order_items"], False),
+    ("medicine sales", select(OrderItem.id).where(OrderItem.medicine_id == 1), ["order_items"], False),
+    ("delivery partner orders", select(Order.id).where(Order.delivery_partner_id == 2), ["orders"], False),
+    ("user prescriptions", select(Prescription.id).where(Prescription.user_id == 1), ["prescriptions"], False),
+    (
+        "prescription medicines",
+        select(PrescriptionMedicine.id).where(PrescriptionMedicine.prescription_id == 1),
+        ["prescription_medicines"], False
+    ),
+    ("category medicines", select(Medicine.id).where(Medicine.category_id == 1), ["medicines"], False),
+    ("user addresses", select(Address.id).where(Address.user_id == 1), ["addresses"], False),
+]
+
+def compile_statement(statement):
+    return str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+
+def explain_sqlite(connection, sql, tables, ordered):
+    """(indexes used per table, problems) from EXPLAIN QUERY PLAN"""
+    details = [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    used = {}
+    problems = []
+    for detail in details:
+        words = detail.split()
+        if len(words) >= 2 and words[0] in ("SCAN", "SEARCH") and words[1] in tables:
+            if " INDEX " in detail:
+                used[words[1]] = detail.split(" INDEX ", 1)[1].split(" ")[0]
+            elif "INTEGER PRIMARY KEY" in detail:
+                used[words[1]] = "primary key"
+            else:
+                problems.append(f"full scan of {words[1]}")
+        if ordered and "TEMP B-TREE FOR ORDER BY" in detail:
+            problems.append("sorts instead of reading in index order")
+    return used, problems
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+def explain_postgresql(connection, sql, tables, ordered):
+    """(indexes used per table, problems) from EXPLAIN (FORMAT JSON)"""
+    with connection.begin():
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    used = {}
+    problems = []
+    for node in plan_nodes(plan[0]["Plan"]):
+        table = node.get("Relation Name")
+        if node["Node Type"] in ("Index Scan", "Index Only Scan") and table in tables:
+            used[table] = node["Index Name"]
+        elif node["Node Type"] == "Bitmap Heap Scan" and table in tables:
+            # The index is named on the bitmap index scan beneath the heap scan
+            used[table] = next(
+                child["Index Name"] for child in plan_nodes(node) if child["Node Type"] == "Bitmap Index Scan"
+            )
+        elif node["Node Type"] == "Seq Scan" and table in tables:
+            problems.append(f"full scan of {table}")
+        if ordered and node["Node Type"] in ("Sort", "Incremental Sort"):
+            problems.append("sorts instead of reading in index order")
+    return used, problems
+
+def check_indexes():
+    """Explain every hot query; return one result per query"""
+    explain = explain_postgresql if engine.dialect.name == "postgresql" else explain_sqlite
+    results = []
+    with engine.connect() as connection:
+        for name, statement, tables, ordered in HOT_QUERIES:
+            used, problems = explain(connection, compile_statement(statement), tables, ordered)
+            for table in tables:
+                if table not in used and f"full scan of {table}" not in problems:
+                    problems.append(f"no index used on {table}")
+            results.append({"query": name, "passed": not problems, "indexes": used, "problems": problems})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="Create and fill the database with benchmarks.datagen first")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if args.seed:
+        datagen.generate(users=50, medicines=500, prescriptions=50, orders=500)
+
+    results = check_indexes()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            status = "ok  " if result["passed"] else "FAIL"
+            detail = ", ".join(f"{table}: {index}" for table, index in result["indexes"].items())
+            if result["problems"]:
+                detail = "; ".join(result["problems"])
+            print(f"{status} {result['query']:28} {detail}")
+
+    return 0 if all(result["passed"] for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Fast synthetic data generator for benchmarks.
+
+Fills the database with users (each with one address), categories,
+medicines, verified prescriptions and orders with items and tracking, using
+multi-row inserts in large chunks. Every generated user's password is
+BENCH_PASSWORD.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.datagen --users 1000 --medicines 5000 --orders 20000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from app.database.database import Base, engine as default_engine
+from app.models.models import (
+    User, Address, Category, Medicine, Prescription, PrescriptionMedicine,
+    Order, OrderItem, OrderTracking
+)
+from app.utils.auth import get_password_hash
+
+BENCH_PASSWORD = "benchpass"
+CHUNK_SIZE = 5000
+
+WORDS = [
+    "para", "ceto", "amoxi", "cillin", "ibu", "profen", "met", "formin", "cetiri", "zine",
+    "lorat", "adine", "omepra", "zole", "vita", "min", "zinc", "cal", "cium", "aspi", "rin"
+]
+
+def insert_chunks(connection, table, rows):
+    """Insert rows with executemany in fixed-size chunks"""
+    for start in range(0, len(rows), CHUNK_SIZE):
+        connection.execute(insert(table), rows[start:start + CHUNK_SIZE])
+
+def medicine_name(rng):
+    return "".join(rng.choice(WORDS) for _ in range(2)).capitalize() + f" {rng.choice([100, 250, 500, 650])}mg"
+
+def generate(
+    bind=default_engine,
+    users=200,
+    categories=10,
+    medicines=2000,
+    prescriptions=200,
+    orders=2000,
+    seed=42,
+    reset=True
+):
+    """Create tables and fill them with synthetic data; return the row counts"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    if reset:
+        Base.metadata.drop_all(bind)
+    Base.metadata.create_all(bind)
+
+    # One bcrypt hash shared by every user keeps generation fast
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+
+    user_rows = [
+        {
+            "id": user_id, "email": f"user{user_id}@bench.local", "phone": f"9{user_id:09d}",
+            "hashed_password": hashed_password, "full_name": f"Bench User {user_id}",
+            "is_active": True, "is_pharmacy_admin": user_id == 1, "is_delivery_partner": user_id == 2,
+            "created_at": now, "updated_at": now
+        }
+        for user_id in range(1, users + 1)
+    ]
+    address_rows = [
+        {
+            "id": user_id, "user_id": user_id, "address_line1": f"{user_id} Bench Street",
+            "city": "Bengaluru", "state": "KA", "postal_code": "560001", "is_default": True
+        }
+        for user_id in range(1, users + 1)
+    ]
+    category_rows = [
+        {"id": category_id, "name": f"Category {category_id}", "description": f"Benchmark category {category_id}"}
+        for category_id in range(1, categories + 1)
+    ]
+    medicine_rows = [
+        {
+            "id": medicine_id, "name": medicine_name(rng), "description": "Synthetic benchmark medicine. " * 5,
+            "price": round(rng.uniform(1, 500), 2), "stock": 1000000,
+            "category_id": rng.randint(1, categories), "prescription_required": rng.random() < 0.2,
+            "manufacturer": rng.choice(["Acme", "Medico", "HealthCorp", "CurePharma"]),
+            "created_at": now, "updated_at": now
+        }
+        for medicine_id in range(1, medicines + 1)
+    ]
+
+    prescription_rows = []
+    prescription_medicine_rows = []
+    for prescription_id in range(1, prescriptions + 1):
+        prescription_rows.append({
+            "id": prescription_id, "user_id": rng.randint(1, users), "image_path": "uploads/prescriptions/bench.png",
+            "is_verified": True, "verified_by": 1, "created_at": now - timedelta(days=1),
+            "verified_at": now - timedelta(hours=12), "expires_at": now + timedelta(days=30), "is_expired": False
+        })
+        for _ in range(rng.randint(1, 3)):
+            prescription_medicine_rows.append({
+                "prescription_id": prescription_id, "medicine_id": rng.randint(1, medicines),
+                "dosage": "1-0-1", "quantity": rng.randint(5, 30)
+            })
+
+    order_rows = []
+    order_item_rows = []
+    tracking_rows = []
+    statuses = ["pending", "processing", "out_for_delivery", "delivered"]
+    for order_id in range(1, orders + 1):
+        user_id = rng.randint(1, users)
+        created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        status_index = rng.randint(0, len(statuses) - 1)
+        total = 0.0
+        for _ in range(rng.randint(1, 5)):
+            medicine = medicine_rows[rng.randint(0, medicines - 1)]
+            quantity = rng.randint(1, 3)
+            total += medicine["price"] * quantity
+            order_item_rows.append({
+                "order_id": order_id, "medicine_id": medicine["id"],
+                "quantity": quantity, "unit_price": medicine["price"]
+            })
+        order_rows.append({
+            "id": order_id, "user_id": user_id, "address_id": user_id, "subtotal_amount": round(total, 2), "total_amount": round(total, 2),
+            "status": statuses[status_index], "payment_status": "completed", "payment_method": "card",
+            "created_at": created_at, "updated_at": created_at,
+            "estimated_delivery_time": created_at + timedelta(minutes=30)
+        })
+        for step in range(status_index + 1):
+            tracking_rows.append({
+                "order_id": order_id, "status": statuses[step], "updated_by": 1,
+                "timestamp": created_at + timedelta(minutes=5 * step)
+            })
+
+    with bind.begin() as connection:
+        for model, rows in [
+            (User, user_rows), (Address, address_rows), (Category, category_rows),
+            (Medicine, medicine_rows), (Prescription, prescription_rows),
+            (PrescriptionMedicine, prescription_medicine_rows), (Order, order_rows),
+            (OrderItem, order_item_rows), (OrderTracking, tracking_rows)
+        ]:
+            insert_chunks(connection, model.__table__, rows)
+
+        # Explicit IDs bypass PostgreSQL sequences; move them past the generated rows
+        if bind.dialect.name == "postgresql":
+            for model in [User, Address, Category, Medicine, Prescription, Order]:
+                table = model.__tablename__
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                ))
+
+    return {
+        "users": len(user_rows),
+        "categories": len(category_rows),
+        "medicines": len(medicine_rows),
+        "prescriptions": len(prescription_rows),
+        "prescription_medicines": len(prescription_medicine_rows),
+        "orders": len(order_rows),
+        "order_items": len(order_item_rows),
+        "order_tracking": len(tracking_rows)
+    }
+
+def add_arguments(parser):
+    """Dataset size options shared by the benchmark scripts"""
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--medicines", type=int, default=2000)
+    parser.add_argument("--prescriptions", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(
+        users=args.users, categories=args.categories, medicines=args.medicines,
+        prescriptions=args.prescriptions, orders=args.orders, seed=args.seed
+    )
+    print(f"Generated {counts} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Shared pieces for driving the API at fixed concurrency and reporting latencies."""
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+def configure_environment(database_url: str = "sqlite:///benchmarks.db"):
+    """Point the app at a local database and placeholder Supabase settings; call before importing app modules"""
+    os.environ.setdefault("DATABASE_URL", database_url)
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "local.bench.key")
+    os.environ.setdefault("BACKGROUND_TASKS_ENABLED", "false")
+    # Benchmarks drive a few clients far past any per-client limit
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+def percentile(sorted_values, fraction: float):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, errors: int, elapsed: float):
+    """Throughput and latency percentiles (milliseconds) for one run"""
+    latencies = sorted(latencies)
+    completed = len(latencies)
+    return {
+        "requests": completed + errors,
+        "errors": errors,
+        "error_rate": round(errors / (completed + errors), 4) if completed + errors else 0.0,
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / completed * 1000, 2) if completed else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if completed else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if completed else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if completed else None
+    }
+
+async def timed(request):
+    """Await an httpx request; return (succeeded, seconds)"""
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        return False, time.perf_counter() - started
+    return response.status_code < 400, time.perf_counter() - started
+
+async def run_fixed(step, client, concurrency: int, requests: int, warmup: int = 0, seed: int = 0):
+    """Run step(client, rng) requests times across concurrency workers; step returns (succeeded, seconds)"""
+    for i in range(warmup):
+        await step(client, random.Random(seed - i - 1))
+
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker(worker_id):
+        nonlocal errors, remaining
+        rng = random.Random(seed * 1000 + worker_id)
+        while remaining > 0:
+            remaining -= 1
+            succeeded, duration = await step(client, rng)
+            if succeeded:
+                latencies.append(duration)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+def make_client(app=None, base_url: str = None, timeout: float = 30.0, max_connections: int = 100):
+    """HTTP client for a running server, or an in-process client for the ASGI app"""
+    if base_url:
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        return httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=timeout)
+
+def write_results(path: str, results: dict):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+
+def compare_results(baseline_path: str, results: dict, keys=("throughput_rps", "p50_ms", "p95_ms", "p99_ms")):
+    """Print the change of each metric against a previous JSON result file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    for name, current in results["results"].items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        changes = []
+        for key in keys:
+            if previous.get(key) and current.get(key) is not None:
+                change = (current[key] - previous[key]) / previous[key] * 100
+                changes.append(f"{key} {previous[key]} -> {current[key]} ({change:+.1f}%)")
+        print(f"{name:14} " + ", ".join(changes))
@@ -0,0 +1,342 @@
+"""Scenario load tests: saturation curves and error rates for realistic sessions.
+
+Three scenarios run side by side, each with its own virtual users (VUs):
+
+- customer: browse -> search -> add to cart -> upload prescription -> checkout -> track
+- pharmacist: claim queued prescriptions -> verify each (reads queue stats when idle)
+- delivery: advance orders pending -> processing -> out_for_delivery -> delivered in bulk
+
+Orders placed by customers feed the delivery loop and uploaded prescriptions
+feed the pharmacist loop. For every load level the VUs are split by --mix,
+run closed-loop for --duration seconds, and sessions/s, requests/s, latency
+percentiles and error rates are reported per scenario. Supabase calls go to
+the local stand-in.
+
+Usage:
+    python -m benchmarks.loadtest --levels 1 4 16 32 --duration 20 --json curve.json
+    python -m benchmarks.loadtest --base-url http://localhost:8000 --skip-seed --mix customer=6,delivery=2
+"""
+import argparse
+import asyncio
+import json
+import random
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+import httpx
+from sqlalchemy import select
+
+from benchmarks import datagen
+from benchmarks.harness import make_client, summarize, write_results
+from benchmarks.local_supabase import install_local_supabase
+from benchmarks.run import Fixtures, SEARCH_TERMS
+from app.database.database import engine
+from app.models.models import Order
+from app.utils.order_status import PENDING, PROCESSING, OUT_FOR_DELIVERY, DELIVERED
+
+SCENARIOS = ["customer", "pharmacist", "delivery"]
+
+# Status each delivery step moves an order to
+NEXT_STATUS = {PENDING: PROCESSING, PROCESSING: OUT_FOR_DELIVERY, OUT_FOR_DELIVERY: DELIVERED}
+
+def tiny_png():
+    """Smallest valid PNG (one white pixel), built without PIL"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    pixels = zlib.compress(b"\x00\xff\xff\xff")
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", pixels) + chunk(b"IEND", b"")
+
+PRESCRIPTION_IMAGE = tiny_png()
+
+def parse_mix(value: str):
+    """Parse "customer=8,pharmacist=1,delivery=1" into VU weights"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}'")
+        mix[name] = float(weight or 1)
+    return mix
+
+def split_users(total: int, mix: dict):
+    """Share total VUs between scenarios by weight, adding up to total; scenarios left with none are skipped"""
+    weights = {name: weight for name, weight in mix.items() if weight > 0}
+    weight_sum = sum(weights.values())
+    exact = {name: total * weight / weight_sum for name, weight in weights.items()}
+    users = {name: int(share) for name, share in exact.items()}
+    # The VUs lost to rounding down go to the scenarios with the largest remainders
+    by_remainder = sorted(exact, key=lambda name: exact[name] - users[name], reverse=True)
+    for name in by_remainder[:total - sum(users.values())]:
+        users[name] += 1
+    return {name: count for name, count in users.items() if count}
+
+class ScenarioStats:
+    """Per-step request latencies and whole-session outcomes for one scenario"""
+
+    def __init__(self):
+        self.steps = {}
+        self.session_latencies = []
+        self.failed_sessions = 0
+
+    def record(self, step: str, succeeded: bool, seconds: float):
+        step_stats = self.steps.setdefault(step, {"latencies": [], "errors": 0})
+        if succeeded:
+            step_stats["latencies"].append(seconds)
+        else:
+            step_stats["errors"] += 1
+
+    def summary(self, users: int, elapsed: float):
+        all_latencies = [seconds for step in self.steps.values() for seconds in step["latencies"]]
+        all_errors = sum(step["errors"] for step in self.steps.values())
+        requests = summarize(all_latencies, all_errors, elapsed)
+        sessions = summarize(self.session_latencies, self.failed_sessions, elapsed)
+        return {
+            "users": users,
+            "sessions": sessions["requests"],
+            "sessions_per_second": sessions["throughput_rps"],
+            "session_error_rate": sessions["error_rate"],
+            "session_p50_ms": sessions["p50_ms"],
+            "session_p95_ms": sessions["p95_ms"],
+            "requests": requests["requests"],
+            "requests_per_second": requests["throughput_rps"],
+            "error_rate": requests["error_rate"],
+            "p50_ms": requests["p50_ms"],
+            "p95_ms": requests["p95_ms"],
+            "p99_ms": requests["p99_ms"],
+            "steps": {
+                name: summarize(step["latencies"], step["errors"], elapsed)
+                for name, step in self.steps.items()
+            }
+        }
+
+class SessionFailed(Exception):
+    """A step failed, so the rest of the session cannot run"""
+
+class LoadTest:
+    """Scenario definitions sharing fixtures and the work queues between scenarios"""
+
+    def __init__(self, fixtures: Fixtures, think_seconds: float = 0.0, delivery_batch: int = 20):
+        self.fixtures = fixtures
+        self.think_seconds = think_seconds
+        self.delivery_batch = delivery_batch
+        self.admin_headers = {"Authorization": f"Bearer {fixtures.admin_token}"}
+        self.partner_headers = {"Authorization": f"Bearer {fixtures.partner_token}"}
+        self.address_ids = {user_id: address_id for user_id, _, address_id in fixtures.users}
+
+        # Open orders waiting for the delivery loop, as (order_id, status)
+        with engine.connect() as connection:
+            open_orders = connection.execute(
+                select(Order.id, Order.status).where(Order.status.in_(list(NEXT_STATUS))).limit(5000)
+            ).all()
+        self.open_orders = deque((order_id, order_status) for order_id, order_status in open_orders)
+
+    async def call(self, stats: ScenarioStats, step: str, request):
+        """Send one timed request; raise SessionFailed on errors"""
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            stats.record(step, False, time.perf_counter() - started)
+            raise SessionFailed(step)
+        succeeded = response.status_code < 400
+        stats.record(step, succeeded, time.perf_counter() - started)
+        if not succeeded:
+            raise SessionFailed(step)
+        return response
+
+    async def think(self, rng):
+        if self.think_seconds:
+            await asyncio.sleep(rng.uniform(0, self.think_seconds))
+
+    async def customer(self, client, stats, rng, user_id):
+        """Browse, search, fill the cart, upload a prescription, check out and track the order"""
+        address_id = self.address_ids[user_id]
+        headers = self.fixtures.auth(user_id)
+
+        await self.call(stats, "browse", client.get("/medicines", params={"skip": rng.randint(0, 500), "limit": 20}))
+        await self.think(rng)
+        await self.call(stats, "search", client.get(
+            "/medicines/search", params={"q": rng.choice(SEARCH_TERMS), "limit": 20}
+        ))
+        await self.think(rng)
+        for medicine_id in rng.sample(self.fixtures.medicine_ids, rng.randint(1, 3)):
+            await self.call(stats, "add_to_cart", client.post(
+                "/cart/items", json={"medicine_id": medicine_id, "quantity": rng.randint(1, 2)}, headers=headers
+            ))
+        await self.call(stats, "view_cart", client.get("/cart", headers=headers))
+        await self.think(rng)
+        await self.call(stats, "upload_prescription", client.post(
+            "/prescriptions/upload",
+            files={"prescription_file": ("prescription.png", PRESCRIPTION_IMAGE, "image/png")},
+            headers=headers
+        ))
+        await self.think(rng)
+        response = await self.call(stats, "checkout", client.post(
+            "/orders", json={"address_id": address_id, "payment_method": "card"}, headers=headers
+        ))
+        order_id = response.json()["id"]
+        self.open_orders.append((order_id, PENDING))
+        await self.think(rng)
+        await self.call(stats, "track", client.get(f"/orders/{order_id}/track", headers=headers))
+
+    async def pharmacist(self, client, stats, rng, user_id):
+        """Claim a batch of prescriptions and verify each one"""
+        response = await self.call(stats, "claim", client.post(
+            "/prescriptions/queue/claim", params={"batch_size": 5}, headers=self.admin_headers
+        ))
+        prescriptions = response.json()
+        if not prescriptions:
+            await self.call(stats, "queue_stats", client.get("/prescriptions/queue/stats", headers=self.admin_headers))
+            # Idle pharmacists poll instead of spinning on an empty queue
+            await asyncio.sleep(0.05)
+            return
+
+        for prescription in prescriptions:
+            await self.think(rng)
+            await self.call(stats, "verify", client.put(
+                f"/prescriptions/{prescription['id']}/verify",
+                json={"is_verified": True, "verified_by": self.fixtures.admin_id},
+                headers=self.admin_headers
+            ))
+
+    async def delivery(self, client, stats, rng, user_id):
+        """Move a batch of open orders one status forward, grouped by current status"""
+        batch = []
+        while self.open_orders and len(batch) < self.delivery_batch:
+            batch.append(self.open_orders.popleft())
+        if not batch:
+            await asyncio.sleep(0.05)
+            return
+
+        by_status = {}
+        for order_id, order_status in batch:
+            by_status.setdefault(order_status, []).append(order_id)
+
+        for order_status, order_ids in by_status.items():
+            next_status = NEXT_STATUS[order_status]
+            response = await self.call(stats, f"to_{next_status}", client.patch(
+                "/orders/status",
+                json={"order_ids": order_ids, "status": next_status, "notes": "load test"},
+                headers=self.partner_headers
+            ))
+            # Delivered orders leave the loop; the rest come back for their next step
+            for result in response.json():
+                if result["success"] and next_status != DELIVERED:
+                    self.open_orders.append((result["order_id"], next_status))
+            await self.think(rng)
+
+        await self.call(stats, "track", client.get(f"/orders/{batch[0][0]}/track", headers=self.partner_headers))
+
+async def run_level(load_test: LoadTest, client, users: dict, duration: float, seed: int):
+    """Run every scenario closed-loop with the given VU counts for duration seconds"""
+    stats = {name: ScenarioStats() for name in users}
+    customers = [user_id for user_id, _, _ in load_test.fixtures.users]
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(name, index):
+        scenario = getattr(load_test, name)
+        rng = random.Random(seed * 10000 + SCENARIOS.index(name) * 1000 + index)
+        # Each customer VU owns a distinct account so carts are not shared
+        user_id = customers[index % len(customers)]
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await scenario(client, stats[name], rng, user_id)
+            except SessionFailed:
+                stats[name].failed_sessions += 1
+            else:
+                stats[name].session_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        virtual_user(name, index) for name, count in users.items() for index in range(count)
+    ))
+    elapsed = time.perf_counter() - started
+    return {name: stats[name].summary(users[name], elapsed) for name in users}
+
+def saturation_point(curve):
+    """Level with the highest session throughput for a scenario"""
+    best = max(curve, key=lambda point: point["sessions_per_second"])
+    return best["users"]
+
+async def run(args):
+    app = None
+    if not args.base_url:
+        import main
+        install_local_supabase(engine)
+        app = main.app
+
+    load_test = LoadTest(Fixtures(engine), think_seconds=args.think_ms / 1000, delivery_batch=args.delivery_batch)
+    results = {
+        "config": {
+            "mode": "http" if args.base_url else "in-process",
+            "database": engine.dialect.name,
+            "levels": args.levels,
+            "duration_seconds": args.duration,
+            "mix": args.mix,
+            "think_ms": args.think_ms
+        },
+        "levels": []
+    }
+
+    print(f"{'total':>5} {'scenario':10} {'vus':>4} {'sess/s':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    async with make_client(app=app, base_url=args.base_url, timeout=args.timeout) as client:
+        for level in args.levels:
+            users = split_users(level, args.mix)
+            scenarios = await run_level(load_test, client, users, args.duration, args.seed)
+            results["levels"].append({"total_users": level, "scenarios": scenarios})
+            for name, summary in scenarios.items():
+                print(
+                    f"{level:5} {name:10} {summary['users']:4} {summary['sessions_per_second']:8.2f} "
+                    f"{summary['requests_per_second']:8.1f} {summary['p50_ms'] or 0:8.1f} "
+                    f"{summary['p95_ms'] or 0:8.1f} {summary['p99_ms'] or 0:8.1f} {summary['error_rate']:7.2%}"
+                )
+
+    results["saturation"] = {}
+    for name in args.mix:
+        curve = [level["scenarios"][name] for level in results["levels"] if name in level["scenarios"]]
+        if curve:
+            results["saturation"][name] = saturation_point(curve)
+    print("Peak session throughput at VUs: " + ", ".join(
+        f"{name}={users}" for name, users in results["saturation"].items()
+    ))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Load a running server over HTTP instead of in-process")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Total VUs per step")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("customer=8,pharmacist=1,delivery=1"))
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Maximum random pause between steps")
+    parser.add_argument("--delivery-batch", type=int, default=20, help="Orders advanced per delivery step")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the existing database")
+    parser.add_argument("--json", help="Write the curve to this file")
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.skip_seed:
+        counts = datagen.generate(
+            users=args.users, categories=args.categories, medicines=args.medicines,
+            prescriptions=args.prescriptions, orders=args.orders, seed=args.seed
+        )
+        print(f"Seeded {json.dumps(counts)}")
+
+    results = asyncio.run(run(args))
+
+    if args.json:
+        write_results(args.json, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
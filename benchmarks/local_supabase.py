@@ -0,0 +1,182 @@
+"""Local stand-in for the Supabase client, backed by the SQLAlchemy database.
+
+Implements the subset of the supabase-py query builder the app uses
+(table().select/insert/upsert/update/delete with eq/neq/gt/gte/lt/lte/in_ filters,
+order, limit and range) so benchmarks and load tests run without a Supabase
+project. An async variant stands in for the async PostgREST client. Install
+both with install_local_supabase() before sending requests.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import func, select, insert, update, delete
+
+from app.database.database import Base
+from app.models import models  # registers the tables
+
+class LocalQuery:
+    """One PostgREST-style request against a local table"""
+
+    def __init__(self, engine, table):
+        self.engine = engine
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.values = None
+        self.filters = []
+        self.order_by = []
+        self.offset = None
+        self.row_limit = None
+
+    # Operations
+    def select(self, columns="*", count=None):
+        self.operation = "select"
+        self.columns = columns
+        return self
+
+    def insert(self, values):
+        self.operation = "insert"
+        self.values = values
+        return self
+
+    def upsert(self, values, on_conflict="id", default_to_null=True, **kwargs):
+        self.operation = "upsert"
+        self.values = values
+        self.conflict_column = on_conflict
+        return self
+
+    def update(self, values):
+        self.operation = "update"
+        self.values = values
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    # Filters
+    def eq(self, column, value):
+        self.filters.append(self.table.c[column] == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(self.table.c[column] != value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(self.table.c[column] > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(self.table.c[column] >= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(self.table.c[column] < value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(self.table.c[column] <= value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(self.table.c[column].in_(list(values)))
+        return self
+
+    # Modifiers
+    def order(self, column, desc=False):
+        self.order_by.append(self.table.c[column].desc() if desc else self.table.c[column])
+        return self
+
+    def limit(self, size):
+        self.row_limit = size
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def execute(self):
+        with self.engine.begin() as connection:
+            if self.operation == "select":
+                data = self._select(connection)
+            elif self.operation == "insert":
+                rows = self.values if isinstance(self.values, list) else [self.values]
+                data = [
+                    dict(connection.execute(insert(self.table).values(**row).returning(self.table)).mappings().one())
+                    for row in rows
+                ]
+            elif self.operation == "upsert":
+                # All rows in one transaction, as PostgREST does
+                data = [self._upsert_row(connection, row) for row in (
+                    self.values if isinstance(self.values, list) else [self.values]
+                )]
+            elif self.operation == "update":
+                data = [dict(row) for row in connection.execute(
+                    update(self.table).where(*self.filters).values(**self.values).returning(self.table)
+                ).mappings()]
+            else:
+                data = [dict(row) for row in connection.execute(
+                    delete(self.table).where(*self.filters).returning(self.table)
+                ).mappings()]
+        return SimpleNamespace(data=data, count=None)
+
+    def _upsert_row(self, connection, row):
+        column = self.table.c[self.conflict_column]
+        if row.get(self.conflict_column) is not None:
+            updated = connection.execute(
+                update(self.table).where(column == row[self.conflict_column]).values(**row).returning(self.table)
+            ).mappings().first()
+            if updated is not None:
+                return dict(updated)
+        values = {key: value for key, value in row.items() if value is not None or key != self.conflict_column}
+        return dict(connection.execute(insert(self.table).values(**values).returning(self.table)).mappings().one())
+
+    def _select(self, connection):
+        if self.columns.strip() == "count":
+            count = connection.execute(select(func.count()).select_from(self.table).where(*self.filters)).scalar()
+            return [{"count": count}]
+
+        if self.columns.strip() == "*":
+            columns = [self.table]
+        else:
+            columns = [self.table.c[name.strip()] for name in self.columns.split(",")]
+
+        statement = select(*columns).where(*self.filters).order_by(*self.order_by)
+        if self.offset is not None:
+            statement = statement.offset(self.offset)
+        if self.row_limit is not None:
+            statement = statement.limit(self.row_limit)
+        return [dict(row) for row in connection.execute(statement).mappings()]
+
+class AsyncLocalQuery(LocalQuery):
+    """LocalQuery whose execute() is awaited, like the async PostgREST client's"""
+
+    async def execute(self):
+        return await asyncio.to_thread(super().execute)
+
+class LocalSupabase:
+    """Drop-in for supabase.Client using the app's own tables"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def table(self, name):
+        return LocalQuery(self.engine, Base.metadata.tables[name])
+
+class AsyncLocalSupabase(LocalSupabase):
+    """Drop-in for the async PostgREST client using the app's own tables"""
+
+    def table(self, name):
+        return AsyncLocalQuery(self.engine, Base.metadata.tables[name])
+
+def install_local_supabase(engine):
+    """Route SupabaseService, AsyncSupabaseService and get_client() calls to the local database"""
+    from app.database import supabase_client
+
+    local = LocalSupabase(engine)
+    supabase_client.supabase = local
+    supabase_client.async_supabase = AsyncLocalSupabase(engine)
+    supabase_client._async_loop = None
+    return local
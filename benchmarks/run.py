@@ -0,0 +1,160 @@
+"""Endpoint benchmarks: throughput and p50/p95/p99 latency at fixed concurrency.
+
+Seeds the database with benchmarks.datagen, then drives each endpoint either
+in-process (ASGI, no network) or over HTTP against a server started with
+`python -m benchmarks.serve`. Supabase calls go to the local stand-in.
+
+Usage:
+    python -m benchmarks.run --concurrency 16 --requests 500 --json results.json
+    python -m benchmarks.run --base-url http://localhost:8000 --skip-seed --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+from sqlalchemy import select
+
+from benchmarks import datagen
+from benchmarks.harness import make_client, run_fixed, timed, write_results, compare_results
+from benchmarks.local_supabase import install_local_supabase
+from app.database.database import engine
+from app.models.models import User, Address, Medicine, Order
+from app.utils.auth import create_access_token
+
+SEARCH_TERMS = ["para", "cillin", "vita", "zole", "mg", "500", "Acme", "zinc"]
+
+class Fixtures:
+    """IDs and tokens the benchmark requests are built from"""
+
+    def __init__(self, bind):
+        with bind.connect() as connection:
+            self.users = connection.execute(
+                select(User.id, User.email, Address.id).join(Address, Address.user_id == User.id)
+                .where(User.is_pharmacy_admin == False, User.is_delivery_partner == False)
+            ).all()
+            self.medicine_ids = connection.execute(
+                select(Medicine.id).where(Medicine.prescription_required == False).limit(5000)
+            ).scalars().all()
+            self.orders = connection.execute(select(Order.id, Order.user_id).limit(5000)).all()
+            admin = connection.execute(select(User.id, User.email).where(User.is_pharmacy_admin == True)).first()
+            partner = connection.execute(select(User.id, User.email).where(User.is_delivery_partner == True)).first()
+        self.emails = {user_id: email for user_id, email, _ in self.users}
+        self.tokens = {user_id: create_access_token({"sub": email}) for user_id, email, _ in self.users}
+        self.admin_id = admin.id if admin else None
+        self.admin_token = create_access_token({"sub": admin.email}) if admin else None
+        self.partner_token = create_access_token({"sub": partner.email}) if partner else None
+
+    def auth(self, user_id):
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+def endpoint_steps(fixtures: Fixtures):
+    """Benchmark step per endpoint; each returns (succeeded, seconds) for the measured request"""
+
+    async def search(client, rng):
+        return await timed(client.get("/medicines/search", params={"q": rng.choice(SEARCH_TERMS), "limit": 20}))
+
+    async def cart(client, rng):
+        user_id, _, _ = rng.choice(fixtures.users)
+        return await timed(client.get("/cart", headers=fixtures.auth(user_id)))
+
+    async def create_order(client, rng):
+        user_id, _, address_id = rng.choice(fixtures.users)
+        headers = fixtures.auth(user_id)
+        # Filling the cart is setup, not part of the measurement
+        for medicine_id in rng.sample(fixtures.medicine_ids, 2):
+            await client.post("/cart/items", json={"medicine_id": medicine_id, "quantity": 1}, headers=headers)
+        return await timed(client.post(
+            "/orders", json={"address_id": address_id, "payment_method": "card"}, headers=headers
+        ))
+
+    async def track(client, rng):
+        order_id, user_id = rng.choice(fixtures.orders)
+        if user_id not in fixtures.tokens:
+            return await timed(client.get(
+                f"/orders/{order_id}/track", headers={"Authorization": f"Bearer {fixtures.admin_token}"}
+            ))
+        return await timed(client.get(f"/orders/{order_id}/track", headers=fixtures.auth(user_id)))
+
+    async def login(client, rng):
+        user_id, email, _ = rng.choice(fixtures.users)
+        return await timed(client.post(
+            "/auth/login", data={"username": email, "password": datagen.BENCH_PASSWORD}
+        ))
+
+    return {
+        "search": search,
+        "cart": cart,
+        "create_order": create_order,
+        "track": track,
+        "login": login
+    }
+
+async def run(args):
+    app = None
+    if not args.base_url:
+        import main
+        install_local_supabase(engine)
+        app = main.app
+
+    fixtures = Fixtures(engine)
+    steps = endpoint_steps(fixtures)
+    selected = args.endpoints or list(steps)
+
+    results = {
+        "config": {
+            "mode": "http" if args.base_url else "in-process",
+            "database": engine.dialect.name,
+            "concurrency": args.concurrency,
+            "requests": args.requests
+        },
+        "results": {}
+    }
+
+    async with make_client(app=app, base_url=args.base_url) as client:
+        for name in selected:
+            summary = await run_fixed(
+                steps[name], client, args.concurrency, args.requests, warmup=args.warmup, seed=args.seed
+            )
+            results["results"][name] = summary
+            print(
+                f"{name:14} {summary['throughput_rps']:9.1f} req/s  "
+                f"p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms  "
+                f"errors {summary['errors']}"
+            )
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Benchmark a running server over HTTP instead of in-process")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--endpoints", nargs="*", choices=["search", "cart", "create_order", "track", "login"])
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the existing database")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Compare against a previous --json result")
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.skip_seed:
+        counts = datagen.generate(
+            users=args.users, categories=args.categories, medicines=args.medicines,
+            prescriptions=args.prescriptions, orders=args.orders, seed=args.seed
+        )
+        print(f"Seeded {json.dumps(counts)}")
+
+    results = asyncio.run(run(args))
+
+    if args.json:
+        write_results(args.json, results)
+    if args.compare:
+        compare_results(args.compare, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
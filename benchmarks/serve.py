@@ -0,0 +1,32 @@
+"""Serve the API for HTTP benchmarks, with Supabase calls going to the local database.
+
+Usage:
+    python -m benchmarks.serve [--port 8000] [--workers 1]
+"""
+import argparse
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+from app.database.database import engine
+from benchmarks.local_supabase import install_local_supabase
+
+import main
+
+install_local_supabase(engine)
+app = main.app
+
+def run():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    uvicorn.run("benchmarks.serve:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,39 @@
+"""Gunicorn settings for production: gunicorn -c gunicorn.conf.py main:app
+
+Runs worker_count() uvicorn workers (uvloop and httptools are used when
+installed). Every setting can be overridden on the command line.
+"""
+import os
+
+from app.utils.server import worker_count, event_loop, http_protocol
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = worker_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Workers import the app after forking, so each opens its own database pool and Supabase client
+preload_app = False
+
+# Seconds a worker gets after SIGTERM to finish requests and background jobs (see BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS)
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+# Workers that stop responding for this long are restarted
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Restart each worker after this many requests to bound memory growth; jitter staggers the restarts
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+# Peers whose X-Forwarded-For / X-Forwarded-Proto are trusted: set to the platform load balancer's
+# addresses. Anyone can send these headers, so trusting every peer would let clients pick their own IP.
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+def on_starting(server):
+    # Workers size their database pools by the worker count (app.database.database), including a -w override
+    os.environ["WEB_CONCURRENCY"] = str(server.cfg.workers)
+
+def when_ready(server):
+    server.log.info(
+        "Serving with %s workers, %s event loop, %s HTTP parser", server.cfg.workers, event_loop(), http_protocol()
+    )
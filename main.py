@@ -1,73 +1,140 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 import os
 from dotenv import load_dotenv
 
 # Import routers
-from app.routers import auth, medicines, categories, prescriptions, cart, orders, delivery
+from app.routers import auth, medicines, categories, prescriptions, cart, orders, delivery, analytics
+
+# Import Supabase client (created on first use)
+from app.database.supabase_client import close_supabase, close_async_supabase
+
+# Import instrumentation
+from app.database.database import engine
+from app.database.replicas import LastWriteMiddleware, replicas
+from app.utils.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.utils.query_debug import QUERY_DEBUG, QueryDebugMiddleware, install_query_counter
+from app.utils.health import liveness, readiness
 
-# Import Supabase client
-from app.database.supabase_client import db_service
+# Import background jobs
+from app.utils.background import start_background_tasks, stop_background_tasks
+from app.utils import sweeper, stock_ledger, stock_alerts, order_archive
 
 # Load environment variables
 load_dotenv()
 
-# Create FastAPI instance
-app = FastAPI(
-    title="Quick Commerce Medicine Delivery API",
-    description="API for a medicine delivery platform with quick commerce features using Supabase",
-    version="1.0.0"
-)
-
-# Get frontend URL from environment variable or use default for development
-frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[frontend_url],  # Only allow the frontend URL
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
-    expose_headers=["*"]
-)
-
-# Include routers
-app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
-app.include_router(medicines.router, prefix="/medicines", tags=["Medicines"])
-app.include_router(categories.router, prefix="/categories", tags=["Categories"])
-app.include_router(prescriptions.router, prefix="/prescriptions", tags=["Prescriptions"])
-app.include_router(cart.router, prefix="/cart", tags=["Shopping Cart"])
-app.include_router(orders.router, prefix="/orders", tags=["Orders"])
-app.include_router(delivery.router, prefix="/delivery", tags=["Delivery"])
-
-@app.get("/")
-async def root():
-    return {
-        "message": "Welcome to Quick Commerce Medicine Delivery API",
-        "database": "Supabase",
-        "status": "Connected",
-        "project_url": os.getenv("SUPABASE_URL")
-    }
-
-@app.get("/health")
-async def health_check():
-    """Health check endpoint to verify database connectivity"""
+# Record SQL time once per process, however many apps are created
+instrument_engine(engine)
+for replica in replicas:
+    instrument_engine(replica.engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background jobs on startup; stop them and release connections on shutdown"""
+    start_background_tasks()
     try:
-        # Test database connection
-        response = db_service.get_client().table("users").select("count").execute()
-        return {
-            "status": "healthy",
-            "database": "connected",
-            "supabase_project": os.getenv("SUPABASE_URL")
-        }
-    except Exception as e:
+        yield
+    finally:
+        await stop_background_tasks()
+        close_supabase()
+        await close_async_supabase()
+        engine.dispose()
+        for replica in replicas:
+            replica.engine.dispose()
+
+def create_app() -> FastAPI:
+    """Build the application (also served directly with uvicorn --factory main:create_app)"""
+    # Create FastAPI instance
+    app = FastAPI(
+        title="Quick Commerce Medicine Delivery API",
+        description="API for a medicine delivery platform with quick commerce features using Supabase",
+        version="1.0.0",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
+    )
+
+    # Get frontend URL from environment variable or use default for development
+    frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[frontend_url],  # Only allow the frontend URL
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["*"],
+        expose_headers=["*"]
+    )
+
+    # Hand clients that wrote their commit time, so any worker keeps their reads on the primary
+    app.add_middleware(LastWriteMiddleware)
+
+    # Record per-route latency, SQL and Supabase time
+    app.add_middleware(MetricsMiddleware)
+
+    # Development mode: report N+1 patterns and requests over the query budget
+    if QUERY_DEBUG:
+        install_query_counter()
+        app.add_middleware(QueryDebugMiddleware)
+
+    # Include routers
+    app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
+    app.include_router(medicines.router, prefix="/medicines", tags=["Medicines"])
+    app.include_router(categories.router, prefix="/categories", tags=["Categories"])
+    app.include_router(prescriptions.router, prefix="/prescriptions", tags=["Prescriptions"])
+    app.include_router(cart.router, prefix="/cart", tags=["Shopping Cart"])
+    app.include_router(orders.router, prefix="/orders", tags=["Orders"])
+    app.include_router(delivery.router, prefix="/delivery", tags=["Delivery"])
+    app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
+
+    @app.get("/")
+    async def root():
         return {
-            "status": "unhealthy",
-            "error": str(e),
-            "database": "disconnected"
+            "message": "Welcome to Quick Commerce Medicine Delivery API",
+            "database": "Supabase",
+            "status": "Connected",
+            "project_url": os.getenv("SUPABASE_URL")
         }
 
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics"""
+        return render_metrics()
+
+    @app.get("/health/live")
+    async def liveness_check():
+        """Liveness probe: the worker is serving requests (no dependency checks)"""
+        return liveness()
+
+    @app.get("/health/ready")
+    async def readiness_check():
+        """Readiness probe: database, Supabase, connection pool and background jobs (cached pings)"""
+        ready, report = await readiness()
+        return ORJSONResponse(report, status_code=200 if ready else 503)
+
+    @app.get("/health")
+    async def health_check():
+        """Same as /health/ready"""
+        return await readiness_check()
+
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    from app.utils.server import worker_count
+
+    # One worker per core; run `uvicorn main:app --reload` while developing
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=worker_count(),
+        loop="auto",
+        http="auto",
+        proxy_headers=True
+    )
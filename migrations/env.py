@@ -0,0 +1,52 @@
+from logging.config import fileConfig
+import re
+
+from alembic import context
+
+from app.database.database import engine, Base, DATABASE_URL
+import app.models.models  # noqa: F401 - registers the models on Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Monthly partitions of the archive tables are created by the archival job, not by migrations
+ARCHIVE_PARTITION = re.compile(r"^archived_order(s|_items)_y\d{4}m\d{2}$")
+
+def include_name(name, type_, parent_names):
+    """Leave archive partitions out of autogenerate comparisons"""
+    return not (type_ == "table" and ARCHIVE_PARTITION.match(name))
+
+def run_migrations_offline():
+    """Emit the migration SQL without connecting (alembic upgrade head --sql)"""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    """Run migrations against the application's database"""
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            # SQLite can't ALTER most constraints; batch mode recreates the table instead
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,168 @@
+"""Order workflow, stock ledger and analytics tables
+
+Schema the application gained before migrations were introduced, on top of
+the baseline: the prescription review lease and expiry columns with the
+unverified-queue index, the medicine version counter, and the tables for
+job watermarks, idempotency keys, the stock ledger and its counters, the
+sales rollups and low-stock alerts.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-19 12:37:20.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0001a'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('medicines', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+    with op.batch_alter_table('prescriptions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_expired', sa.Boolean(), server_default=sa.false(), nullable=True))
+        batch_op.add_column(sa.Column('verified_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('lease_owner_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key('fk_prescriptions_lease_owner_id_users', 'users', ['lease_owner_id'], ['id'])
+    op.create_index('ix_prescriptions_unverified_created_at', 'prescriptions', ['created_at'], unique=False, postgresql_where=sa.text('is_verified = false'), sqlite_where=sa.text('is_verified = 0'))
+
+    op.create_table('job_watermarks',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    op.create_table('daily_category_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('units_sold', sa.Integer(), nullable=False),
+    sa.Column('units_cancelled', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('day', 'category_id')
+    )
+    op.create_index(op.f('ix_daily_category_sales_category_id'), 'daily_category_sales', ['category_id'], unique=False)
+
+    op.create_table('idempotency_keys',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('request_hash', sa.String(), nullable=False),
+    sa.Column('response_status', sa.Integer(), nullable=True),
+    sa.Column('response_body', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_id_key')
+    )
+    op.create_index(op.f('ix_idempotency_keys_expires_at'), 'idempotency_keys', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_idempotency_keys_id'), 'idempotency_keys', ['id'], unique=False)
+
+    op.create_table('daily_medicine_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('medicine_id', sa.Integer(), nullable=False),
+    sa.Column('units_sold', sa.Integer(), nullable=False),
+    sa.Column('units_cancelled', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['medicine_id'], ['medicines.id'], ),
+    sa.PrimaryKeyConstraint('day', 'medicine_id')
+    )
+    op.create_index(op.f('ix_daily_medicine_sales_medicine_id'), 'daily_medicine_sales', ['medicine_id'], unique=False)
+
+    op.create_table('stock_alert_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('medicine_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('stock', sa.Integer(), nullable=False),
+    sa.Column('daily_rate', sa.Float(), nullable=False),
+    sa.Column('days_to_stockout', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['medicine_id'], ['medicines.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_alert_events_id'), 'stock_alert_events', ['id'], unique=False)
+    op.create_index(op.f('ix_stock_alert_events_medicine_id'), 'stock_alert_events', ['medicine_id'], unique=False)
+
+    op.create_table('stock_consumption',
+    sa.Column('medicine_id', sa.Integer(), nullable=False),
+    sa.Column('decayed_units', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('alerted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['medicine_id'], ['medicines.id'], ),
+    sa.PrimaryKeyConstraint('medicine_id')
+    )
+    op.create_index(op.f('ix_stock_consumption_alerted_at'), 'stock_consumption', ['alerted_at'], unique=False)
+
+    op.create_table('stock_counter_shards',
+    sa.Column('medicine_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('pending', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.ForeignKeyConstraint(['medicine_id'], ['medicines.id'], ),
+    sa.PrimaryKeyConstraint('medicine_id', 'shard')
+    )
+
+    op.create_table('stock_movements',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('medicine_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('sharded', sa.Boolean(), server_default=sa.false(), nullable=True),
+    sa.Column('rolled_up_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['medicine_id'], ['medicines.id'], ),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_movements_id'), 'stock_movements', ['id'], unique=False)
+    op.create_index('ix_stock_movements_medicine_id_created_at', 'stock_movements', ['medicine_id', 'created_at'], unique=False)
+    op.create_index('ix_stock_movements_pending', 'stock_movements', ['medicine_id'], unique=False, postgresql_where=sa.text('rolled_up_at IS NULL'), sqlite_where=sa.text('rolled_up_at IS NULL'))
+
+def downgrade():
+    op.drop_index('ix_stock_movements_pending', table_name='stock_movements', postgresql_where=sa.text('rolled_up_at IS NULL'), sqlite_where=sa.text('rolled_up_at IS NULL'))
+    op.drop_index('ix_stock_movements_medicine_id_created_at', table_name='stock_movements')
+    op.drop_index(op.f('ix_stock_movements_id'), table_name='stock_movements')
+    op.drop_table('stock_movements')
+
+    op.drop_table('stock_counter_shards')
+
+    op.drop_index(op.f('ix_stock_consumption_alerted_at'), table_name='stock_consumption')
+    op.drop_table('stock_consumption')
+
+    op.drop_index(op.f('ix_stock_alert_events_medicine_id'), table_name='stock_alert_events')
+    op.drop_index(op.f('ix_stock_alert_events_id'), table_name='stock_alert_events')
+    op.drop_table('stock_alert_events')
+
+    op.drop_index(op.f('ix_daily_medicine_sales_medicine_id'), table_name='daily_medicine_sales')
+    op.drop_table('daily_medicine_sales')
+
+    op.drop_index(op.f('ix_idempotency_keys_id'), table_name='idempotency_keys')
+    op.drop_index(op.f('ix_idempotency_keys_expires_at'), table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
+
+    op.drop_index(op.f('ix_daily_category_sales_category_id'), table_name='daily_category_sales')
+    op.drop_table('daily_category_sales')
+
+    op.drop_table('job_watermarks')
+
+    op.drop_index('ix_prescriptions_unverified_created_at', table_name='prescriptions', postgresql_where=sa.text('is_verified = false'), sqlite_where=sa.text('is_verified = 0'))
+    with op.batch_alter_table('prescriptions', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_prescriptions_lease_owner_id_users', type_='foreignkey')
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('lease_owner_id')
+        batch_op.drop_column('verified_at')
+        batch_op.drop_column('is_expired')
+
+    with op.batch_alter_table('medicines', schema=None) as batch_op:
+        batch_op.drop_column('version')
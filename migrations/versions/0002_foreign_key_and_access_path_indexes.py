@@ -0,0 +1,86 @@
+"""Foreign key and access path indexes
+
+Indexes every foreign key the API filters or joins on, plus composite
+indexes in the order the hot queries read: a user's orders newest first,
+an order's tracking timeline latest first, and one cart row per medicine.
+On PostgreSQL the indexes are built CONCURRENTLY so writes continue while
+they build.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-19 12:37:30.097239
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001a'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_addresses_user_id', 'addresses', ['user_id']),
+    ('ix_medicines_category_id', 'medicines', ['category_id']),
+    ('ix_prescriptions_user_id', 'prescriptions', ['user_id']),
+    ('ix_prescription_medicines_prescription_id', 'prescription_medicines', ['prescription_id']),
+    ('ix_orders_delivery_partner_id', 'orders', ['delivery_partner_id']),
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', sa.literal_column('created_at DESC')]),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_order_items_medicine_id', 'order_items', ['medicine_id']),
+    ('ix_order_tracking_order_id_timestamp', 'order_tracking', ['order_id', sa.literal_column('timestamp DESC')]),
+]
+
+def merge_duplicate_cart_items():
+    """Fold repeated (cart, medicine) rows into the oldest one so the unique constraint can be added"""
+    op.execute(
+        "UPDATE cart_items SET quantity = ("
+        "SELECT SUM(duplicate.quantity) FROM cart_items AS duplicate "
+        "WHERE duplicate.cart_id = cart_items.cart_id AND duplicate.medicine_id = cart_items.medicine_id"
+        ") WHERE id IN ("
+        "SELECT MIN(id) FROM cart_items WHERE cart_id IS NOT NULL AND medicine_id IS NOT NULL "
+        "GROUP BY cart_id, medicine_id HAVING COUNT(*) > 1"
+        ")"
+    )
+    op.execute(
+        "DELETE FROM cart_items WHERE cart_id IS NOT NULL AND medicine_id IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM cart_items WHERE cart_id IS NOT NULL AND medicine_id IS NOT NULL "
+        "GROUP BY cart_id, medicine_id"
+        ")"
+    )
+
+def upgrade():
+    merge_duplicate_cart_items()
+
+    if op.get_context().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+            op.create_index(
+                'uq_cart_items_cart_id_medicine_id', 'cart_items', ['cart_id', 'medicine_id'],
+                unique=True, postgresql_concurrently=True
+            )
+        op.execute(
+            "ALTER TABLE cart_items ADD CONSTRAINT uq_cart_items_cart_id_medicine_id "
+            "UNIQUE USING INDEX uq_cart_items_cart_id_medicine_id"
+        )
+        return
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    # SQLite can't add a constraint in place; batch mode rebuilds the table
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_cart_items_cart_id_medicine_id', ['cart_id', 'medicine_id'])
+
+def downgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        op.drop_constraint('uq_cart_items_cart_id_medicine_id', 'cart_items', type_='unique')
+    else:
+        with op.batch_alter_table('cart_items', schema=None) as batch_op:
+            batch_op.drop_constraint('uq_cart_items_cart_id_medicine_id', type_='unique')
+
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
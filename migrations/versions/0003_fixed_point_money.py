@@ -0,0 +1,63 @@
+"""Fixed point money
+
+Stores prices, order amounts and rollup revenue as NUMERIC instead of
+FLOAT, rounding existing values to the cent, and adds the subtotal,
+discount and tax columns that make up an order's total. Existing orders
+get their total as the subtotal with no discount or tax.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 12:41:35.823194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# (table, column, numeric precision, nullable)
+MONEY_COLUMNS = [
+    ('medicines', 'price', 12, True),
+    ('order_items', 'unit_price', 12, True),
+    ('orders', 'total_amount', 12, True),
+    ('daily_medicine_sales', 'revenue', 14, False),
+    ('daily_category_sales', 'revenue', 14, False),
+]
+
+BREAKDOWN_COLUMNS = ['subtotal_amount', 'discount_amount', 'tax_amount']
+
+def upgrade():
+    postgresql = op.get_context().dialect.name == 'postgresql'
+
+    for table, column, precision, nullable in MONEY_COLUMNS:
+        extra = {'postgresql_using': f'round({column}::numeric, 2)'} if postgresql else {}
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                column, existing_type=sa.Float(), type_=sa.Numeric(precision=precision, scale=2),
+                existing_nullable=nullable, **extra
+            )
+        if not postgresql:
+            # SQLite keeps the stored float, so round it here
+            op.execute(f"UPDATE {table} SET {column} = ROUND({column}, 2)")
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        for column in BREAKDOWN_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Numeric(precision=12, scale=2), server_default=sa.text('0'), nullable=False))
+
+    op.execute("UPDATE orders SET subtotal_amount = total_amount WHERE total_amount IS NOT NULL")
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        for column in reversed(BREAKDOWN_COLUMNS):
+            batch_op.drop_column(column)
+
+    for table, column, precision, nullable in reversed(MONEY_COLUMNS):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                column, existing_type=sa.Numeric(precision=precision, scale=2), type_=sa.Float(),
+                existing_nullable=nullable
+            )
@@ -0,0 +1,86 @@
+"""Order archive
+
+Adds the cold tier for old delivered and cancelled orders: archived_orders
+(tracking timeline stored compressed per order) and archived_order_items.
+On PostgreSQL both are range-partitioned by month of order creation; the
+archival job creates each month's partitions as it needs them.
+
+stock_movements.order_id stops being a foreign key, since ledger rows
+outlive the orders they refer to once those are archived.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:46:51.737569
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# Names the unnamed SQLite foreign key so batch mode can drop it
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+def upgrade():
+    op.create_table('archived_orders',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('address_id', sa.Integer(), nullable=True),
+    sa.Column('subtotal_amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('discount_amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('tax_amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('payment_status', sa.String(), nullable=True),
+    sa.Column('payment_method', sa.String(), nullable=True),
+    sa.Column('delivery_partner_id', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('estimated_delivery_time', sa.DateTime(), nullable=True),
+    sa.Column('actual_delivery_time', sa.DateTime(), nullable=True),
+    sa.Column('delivery_notes', sa.Text(), nullable=True),
+    sa.Column('tracking', sa.LargeBinary(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_index('ix_archived_orders_user_id_created_at', 'archived_orders', ['user_id', sa.literal_column('created_at DESC')], unique=False)
+
+    op.create_table('archived_order_items',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('order_created_at', sa.DateTime(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('medicine_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=True),
+    sa.Column('unit_price', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('prescription_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'order_created_at'),
+    postgresql_partition_by='RANGE (order_created_at)'
+    )
+    op.create_index(op.f('ix_archived_order_items_order_id'), 'archived_order_items', ['order_id'], unique=False)
+
+    if op.get_context().dialect.name == 'postgresql':
+        op.drop_constraint('stock_movements_order_id_fkey', 'stock_movements', type_='foreignkey')
+    else:
+        with op.batch_alter_table('stock_movements', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint('fk_stock_movements_order_id_orders', type_='foreignkey')
+
+def downgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        # NOT VALID: ledger rows of archived orders no longer have an order to point to
+        op.execute(
+            "ALTER TABLE stock_movements ADD CONSTRAINT stock_movements_order_id_fkey "
+            "FOREIGN KEY (order_id) REFERENCES orders (id) NOT VALID"
+        )
+    else:
+        with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+            batch_op.create_foreign_key('fk_stock_movements_order_id_orders', 'orders', ['order_id'], ['id'])
+
+    op.drop_index(op.f('ix_archived_order_items_order_id'), table_name='archived_order_items')
+    op.drop_table('archived_order_items')
+    op.drop_index('ix_archived_orders_user_id_created_at', table_name='archived_orders')
+    op.drop_table('archived_orders')
@@ -0,0 +1,42 @@
+"""Sharded available stock
+
+Hot SKUs now split their available stock over their counter shards, so a
+checkout locks one shard row instead of the medicine row: the shards'
+pending column becomes available, and stock_movements.sharded goes away
+since every movement not yet rolled up counts towards the pending balance.
+Existing shard rows are dropped; each hot SKU is split afresh from its
+rolled-up stock and the ledger on its next checkout.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 14:02:17.418360
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("DELETE FROM stock_counter_shards")
+
+    with op.batch_alter_table('stock_counter_shards', schema=None) as batch_op:
+        batch_op.drop_column('pending')
+        batch_op.add_column(sa.Column('available', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.drop_column('sharded')
+
+def downgrade():
+    op.execute("DELETE FROM stock_counter_shards")
+
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sharded', sa.Boolean(), server_default=sa.false(), nullable=True))
+
+    with op.batch_alter_table('stock_counter_shards', schema=None) as batch_op:
+        batch_op.drop_column('available')
+        batch_op.add_column(sa.Column('pending', sa.Integer(), server_default=sa.text('0'), nullable=False))
@@ -0,0 +1,44 @@
+"""Prescription review queue index
+
+Narrows ix_prescriptions_unverified_created_at to the review queue:
+prescriptions that are unverified and have no reviewer. Rejected
+prescriptions (unverified with verified_by set) drop out of the index, so
+it grows with the backlog instead of with history. On PostgreSQL the
+index is rebuilt CONCURRENTLY so writes continue meanwhile.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 14:21:48.603517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_prescriptions_unverified_created_at'
+
+def replace_index(postgresql_where, sqlite_where):
+    """Drop the queue index and build it again with the given predicate"""
+    if op.get_context().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with op.get_context().autocommit_block():
+            op.drop_index(INDEX_NAME, table_name='prescriptions', postgresql_concurrently=True)
+            op.create_index(
+                INDEX_NAME, 'prescriptions', ['created_at'], unique=False,
+                postgresql_where=sa.text(postgresql_where), postgresql_concurrently=True
+            )
+        return
+
+    op.drop_index(INDEX_NAME, table_name='prescriptions')
+    op.create_index(INDEX_NAME, 'prescriptions', ['created_at'], unique=False, sqlite_where=sa.text(sqlite_where))
+
+def upgrade():
+    replace_index('is_verified = false AND verified_by IS NULL', 'is_verified = 0 AND verified_by IS NULL')
+
+def downgrade():
+    replace_index('is_verified = false', 'is_verified = 0')
@@ -6,7 +6,11 @@ setup(
     packages=find_packages(),
     install_requires=[
         "fastapi==0.104.1",
+        "orjson==3.9.10",
         "uvicorn==0.23.2",
+        "gunicorn==21.2.0",
+        "uvloop==0.19.0; sys_platform != 'win32'",
+        "httptools==0.6.1",
         "sqlalchemy==2.0.23",
         "psycopg2-binary==2.9.9",
         "pydantic==2.4.2",